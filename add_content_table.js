@@ -3,6 +3,36 @@
 
 const fs = require('fs');
 const path = require('path');
+const crypto = require('crypto');
+
+/**
+ * Writes content to filePath only if it changed (same size and hash are
+ * skipped), through a temporary file renamed over the target (as
+ * output_utils.write_if_changed does for the Python stages)
+ * @returns {boolean} true if the file was written
+ */
+function writeIfChanged(filePath, content) {
+  const data = Buffer.from(content, 'utf8');
+  try {
+    if (fs.statSync(filePath).size === data.length) {
+      const hash = (buffer) => crypto.createHash('sha256').update(buffer).digest('hex');
+      if (hash(fs.readFileSync(filePath)) === hash(data)) {
+        return false;
+      }
+    }
+  } catch (error) {
+    if (error.code !== 'ENOENT') throw error;
+  }
+  const tmpPath = path.join(path.dirname(filePath), `.${path.basename(filePath)}.${process.pid}.tmp`);
+  try {
+    fs.writeFileSync(tmpPath, data);
+    fs.renameSync(tmpPath, filePath);
+  } catch (error) {
+    fs.rmSync(tmpPath, { force: true });
+    throw error;
+  }
+  return true;
+}
 
 /**
  * Displays help information about how to use the script
@@ -23,6 +53,7 @@ Options:
   -o, --output   Specify output filename (default: <input>_withcontent.html)
   -c, --css      Specify CSS file to style the table of contents
                  Example: -c styles.css
+  --stdio        Worker mode: JSON requests/responses, one per line
 
 Examples:
   node add_content_table.js document.html
@@ -39,232 +70,250 @@ Note:
 }
 
 /**
- * Adds a table of contents to an HTML file using regex (no dependencies)
- * @param {string} filePath - Path to the HTML file
+ * Returns the HTML with ids on the headings, the table of contents and the
+ * TOC styles inserted, or null when there are no headings (in memory)
+ * @param {string} htmlContent - HTML document
  * @param {number} maxDepth - Maximum heading level to include (2=h2, 3=h3, etc.)
- * @param {string} outputPath - Path for the output file (optional)
- * @param {string} cssPath - Path to CSS file for styling (optional)
+ * @param {string} cssText - CSS to embed for the table of contents (optional)
  */
-function addTableOfContents(filePath, maxDepth = 2, outputPath = null, cssPath = null) {
-  console.time('toc');
-  try {
-    // Check if file exists
-    if (!fs.existsSync(filePath)) {
-      console.error(`File not found: ${filePath}`);
-      return;
+function buildTableOfContents(htmlContent, maxDepth = 2, cssText = null) {
+  // Create regex pattern for finding heading tags
+  const headingPattern = new RegExp(`<h([2-${Math.min(maxDepth, 6)}])\\b([^>]*)>(.*?)</h\\1>`, 'gi');
+
+  // Find all matching headings
+  const headings = [];
+  let match;
+
+  while ((match = headingPattern.exec(htmlContent)) !== null) {
+    const level = parseInt(match[1]);
+    const attributes = match[2];
+    const content = match[3];
+    const fullTag = match[0];
+
+    // Extract id attribute if it exists
+    let id = '';
+    const idMatch = attributes.match(/id=["']([^"']*)["']/i);
+    if (idMatch) {
+      id = idMatch[1];
     }
 
-    // Read file content
-    const htmlContent = fs.readFileSync(filePath, 'utf8');
+    // Extract text content (remove any HTML tags)
+    const text = content.replace(/<[^>]*>/g, '');
+
+    headings.push({
+      level,
+      id,
+      text,
+      fullTag,
+      start: match.index,
+      end: match.index + fullTag.length
+    });
+  }
 
-    // Create regex pattern for finding heading tags
-    const headingPattern = new RegExp(`<h([2-${Math.min(maxDepth, 6)}])\\b([^>]*)>(.*?)</h\\1>`, 'gi');
+  if (headings.length === 0) {
+    return null;
+  }
 
-    // Find all matching headings
-    const headings = [];
-    let match;
+  // Assign ids to headings that don't have them
+  let modifiedHtml = htmlContent;
+  let offset = 0;
 
-    while ((match = headingPattern.exec(htmlContent)) !== null) {
-      const level = parseInt(match[1]);
-      const attributes = match[2];
-      const content = match[3];
-      const fullTag = match[0];
+  for (let i = 0; i < headings.length; i++) {
+    const heading = headings[i];
 
-      // Extract id attribute if it exists
-      let id = '';
-      const idMatch = attributes.match(/id=["']([^"']*)["']/i);
-      if (idMatch) {
-        id = idMatch[1];
-      }
+    if (!heading.id) {
+      heading.id = `heading-${i}`;
+
+      // Create new tag with ID
+      const oldTag = heading.fullTag;
+      const tagStart = `<h${heading.level}`;
+      const newTag = `${tagStart} id="${heading.id}"${heading.fullTag.substring(tagStart.length)}`;
 
-      // Extract text content (remove any HTML tags)
-      const text = content.replace(/<[^>]*>/g, '');
-
-      headings.push({
-        level,
-        id,
-        text,
-        fullTag,
-        start: match.index,
-        end: match.index + fullTag.length
-      });
+      // Replace tag in HTML
+      const startPos = heading.start + offset;
+      modifiedHtml = modifiedHtml.substring(0, startPos) +
+        newTag +
+        modifiedHtml.substring(startPos + oldTag.length);
+
+      // Adjust offset for next replacements
+      offset += (newTag.length - oldTag.length);
     }
+  }
 
-    if (headings.length === 0) {
-      console.log('No headings found in the document to create a table of contents');
-      // Determinar el nombre del archivo de salida
-      let outputFilePath;
-      if (outputPath) {
-        outputFilePath = outputPath;
-      } else {
-        const dirname = path.dirname(filePath);
-        const basename = path.basename(filePath, '.html');
-        outputFilePath = path.join(dirname, `${basename}_withcontent.html`);
-      }
+  // Create hierarchical TOC HTML
+  let tocHtml = '<div id="table-of-contents" class="toc">\n' +
+    '  <h2 id="contents-header">Tabla de contenidos</h2>\n';
 
-      // Escribir el archivo de salida (mismo contenido que el de entrada)
-      fs.writeFileSync(outputFilePath, htmlContent);
-      console.log(`No headings found. Original content written to: ${outputFilePath}`);
+  // Function to create nested TOC structure
+  function createTocStructure(headings, minLevel, indentLevel = 0) {
+    if (headings.length === 0) return '';
 
-      return;
-    }
+    // Create indentation based on the depth
+    const indent = '  '.repeat(indentLevel);
+    const itemIndent = '  '.repeat(indentLevel + 1);
 
-    // Assign ids to headings that don't have them
-    let modifiedHtml = htmlContent;
-    let offset = 0;
+    let result = `${indent}<ul class="toc">\n`;
+    let i = 0;
 
-    for (let i = 0; i < headings.length; i++) {
-      const heading = headings[i];
+    while (i < headings.length) {
+      const currentHeading = headings[i];
+      const currentLevel = currentHeading.level;
 
-      if (!heading.id) {
-        heading.id = `heading-${i}`;
+      if (currentLevel < minLevel) {
+        // We've moved back up the hierarchy
+        break;
+      }
 
-        // Create new tag with ID
-        const oldTag = heading.fullTag;
-        const tagStart = `<h${heading.level}`;
-        const newTag = `${tagStart} id="${heading.id}"${heading.fullTag.substring(tagStart.length)}`;
+      if (currentLevel === minLevel) {
+        // Same level heading - add to current list
+        result += `${itemIndent}<li class="toc"><a class="toc" href="#${currentHeading.id}">${currentHeading.text}</a>`;
 
-        // Replace tag in HTML
-        const startPos = heading.start + offset;
-        modifiedHtml = modifiedHtml.substring(0, startPos) +
-          newTag +
-          modifiedHtml.substring(startPos + oldTag.length);
+        // Get subheadings
+        const subHeadings = [];
+        let j = i + 1;
+        while (j < headings.length && headings[j].level > currentLevel) {
+          subHeadings.push(headings[j]);
+          j++;
+        }
 
-        // Adjust offset for next replacements
-        offset += (newTag.length - oldTag.length);
+        // If we have subheadings, nest them
+        if (subHeadings.length > 0) {
+          result += '\n' + createTocStructure(subHeadings, minLevel + 1, indentLevel + 1);
+          result += `${itemIndent}`;
+        }
+
+        result += '</li>\n';
+        i = j; // Skip the subheadings we've processed
+      } else {
+        // We should never reach here, but just in case
+        i++;
       }
     }
 
-    // Create hierarchical TOC HTML
-    let tocHtml = '<div id="table-of-contents" class="toc">\n' +
-      '  <h2 id="contents-header">Tabla de contenidos</h2>\n';
+    result += `${indent}</ul>\n`;
+    return result;
+  }
 
-    // Function to create nested TOC structure
-    function createTocStructure(headings, minLevel, indentLevel = 0) {
-      if (headings.length === 0) return '';
+  // Find the minimum heading level (usually 2)
+  const minLevel = headings.length === 0 ?
+    2 : // Valor predeterminado si no hay encabezados
+    headings.reduce((min, h) => Math.min(min, h.level), Number.MAX_SAFE_INTEGER);
+  tocHtml += createTocStructure(headings, minLevel);
+  tocHtml += '</div>\n\n';
+
+  // Handle CSS styling
+  const cssContent = cssText != null ? `<style type="text/css">\n${cssText}\n</style>\n` : '';
+
+  // Find insertion points for TOC and CSS
+  let tocInsertPosition = 0;
+  let cssInsertPosition = 0;
+
+  // Look for the first h1 for TOC insertion
+  const h1Match = /<h1\b[^>]*>.*?<\/h1>/i.exec(modifiedHtml);
+  if (h1Match) {
+    tocInsertPosition = h1Match.index + h1Match[0].length;
+  } else {
+    // Try to find the body tag opening
+    const bodyMatch = /<body\b[^>]*>/i.exec(modifiedHtml);
+    if (bodyMatch) {
+      tocInsertPosition = bodyMatch.index + bodyMatch[0].length;
+    }
+  }
 
-      // Create indentation based on the depth
-      const indent = '  '.repeat(indentLevel);
-      const itemIndent = '  '.repeat(indentLevel + 1);
+  // Find head tag for CSS insertion
+  if (cssContent) {
+    const headEndMatch = /<\/head>/i.exec(modifiedHtml);
+    if (headEndMatch) {
+      cssInsertPosition = headEndMatch.index;
+    } else {
+      // If no head tag, try to find html opening and create a head tag
+      const htmlMatch = /<html\b[^>]*>/i.exec(modifiedHtml);
+      if (htmlMatch) {
+        cssInsertPosition = htmlMatch.index + htmlMatch[0].length;
+        // Insert a head tag if none exists
+        modifiedHtml = modifiedHtml.slice(0, cssInsertPosition) +
+          '\n<head>\n</head>\n' +
+          modifiedHtml.slice(cssInsertPosition);
+        cssInsertPosition += 8; // Position right after <head>
+      } else {
+        // Just insert at the beginning of the file and hope for the best
+        cssInsertPosition = 0;
+        modifiedHtml = '<head>\n</head>\n' + modifiedHtml;
+        cssInsertPosition = 7; // Position right after <head>
+      }
+    }
+  }
 
-      let result = `${indent}<ul class="toc">\n`;
-      let i = 0;
+  // Insert CSS at the determined position
+  if (cssContent) {
+    modifiedHtml = modifiedHtml.slice(0, cssInsertPosition) +
+      cssContent +
+      modifiedHtml.slice(cssInsertPosition);
 
-      while (i < headings.length) {
-        const currentHeading = headings[i];
-        const currentLevel = currentHeading.level;
+    // Adjust tocInsertPosition if it's after cssInsertPosition
+    if (tocInsertPosition > cssInsertPosition) {
+      tocInsertPosition += cssContent.length;
+    }
+  }
 
-        if (currentLevel < minLevel) {
-          // We've moved back up the hierarchy
-          break;
-        }
+  // Insert TOC at the determined position
+  modifiedHtml = modifiedHtml.slice(0, tocInsertPosition) +
+    '\n\n' + tocHtml +
+    modifiedHtml.slice(tocInsertPosition);
 
-        if (currentLevel === minLevel) {
-          // Same level heading - add to current list
-          result += `${itemIndent}<li class="toc"><a class="toc" href="#${currentHeading.id}">${currentHeading.text}</a>`;
-
-          // Get subheadings
-          const subHeadings = [];
-          let j = i + 1;
-          while (j < headings.length && headings[j].level > currentLevel) {
-            subHeadings.push(headings[j]);
-            j++;
-          }
-
-          // If we have subheadings, nest them
-          if (subHeadings.length > 0) {
-            result += '\n' + createTocStructure(subHeadings, minLevel + 1, indentLevel + 1);
-            result += `${itemIndent}`;
-          }
-
-          result += '</li>\n';
-          i = j; // Skip the subheadings we've processed
-        } else {
-          // We should never reach here, but just in case
-          i++;
-        }
-      }
+  return modifiedHtml;
+}
 
-      result += `${indent}</ul>\n`;
-      return result;
+/**
+ * Adds a table of contents to an HTML file using regex (no dependencies)
+ * @param {string} filePath - Path to the HTML file
+ * @param {number} maxDepth - Maximum heading level to include (2=h2, 3=h3, etc.)
+ * @param {string} outputPath - Path for the output file (optional)
+ * @param {string} cssPath - Path to CSS file for styling (optional)
+ */
+function addTableOfContents(filePath, maxDepth = 2, outputPath = null, cssPath = null) {
+  console.time('toc');
+  try {
+    // Check if file exists
+    if (!fs.existsSync(filePath)) {
+      console.error(`File not found: ${filePath}`);
+      return;
     }
 
-    // Find the minimum heading level (usually 2)
-    const minLevel = headings.length === 0 ?
-      2 : // Valor predeterminado si no hay encabezados
-      headings.reduce((min, h) => Math.min(min, h.level), Number.MAX_SAFE_INTEGER);
-    tocHtml += createTocStructure(headings, minLevel);
-    tocHtml += '</div>\n\n';
+    // Read file content
+    const htmlContent = fs.readFileSync(filePath, 'utf8');
 
-    // Handle CSS styling
-    let cssContent = '';
+    // Read CSS file to embed it
+    let cssText = null;
     if (cssPath) {
       if (!fs.existsSync(cssPath)) {
         console.warn(`CSS file not found: ${cssPath}. Continuing without CSS styling.`);
       } else {
-        // Read CSS file and prepare to inline it
-        cssContent = fs.readFileSync(cssPath, 'utf8');
-        cssContent = `<style type="text/css">\n${cssContent}\n</style>\n`;
+        cssText = fs.readFileSync(cssPath, 'utf8');
       }
     }
 
-    // Find insertion points for TOC and CSS
-    let tocInsertPosition = 0;
-    let cssInsertPosition = 0;
+    const modifiedHtml = buildTableOfContents(htmlContent, maxDepth, cssText);
 
-    // Look for the first h1 for TOC insertion
-    const h1Match = /<h1\b[^>]*>.*?<\/h1>/i.exec(modifiedHtml);
-    if (h1Match) {
-      tocInsertPosition = h1Match.index + h1Match[0].length;
-    } else {
-      // Try to find the body tag opening
-      const bodyMatch = /<body\b[^>]*>/i.exec(modifiedHtml);
-      if (bodyMatch) {
-        tocInsertPosition = bodyMatch.index + bodyMatch[0].length;
-      }
-    }
-
-    // Find head tag for CSS insertion
-    if (cssContent) {
-      const headEndMatch = /<\/head>/i.exec(modifiedHtml);
-      if (headEndMatch) {
-        cssInsertPosition = headEndMatch.index;
+    if (modifiedHtml === null) {
+      console.log('No headings found in the document to create a table of contents');
+      // Determinar el nombre del archivo de salida
+      let outputFilePath;
+      if (outputPath) {
+        outputFilePath = outputPath;
       } else {
-        // If no head tag, try to find html opening and create a head tag
-        const htmlMatch = /<html\b[^>]*>/i.exec(modifiedHtml);
-        if (htmlMatch) {
-          cssInsertPosition = htmlMatch.index + htmlMatch[0].length;
-          // Insert a head tag if none exists
-          modifiedHtml = modifiedHtml.slice(0, cssInsertPosition) +
-            '\n<head>\n</head>\n' +
-            modifiedHtml.slice(cssInsertPosition);
-          cssInsertPosition += 8; // Position right after <head>
-        } else {
-          // Just insert at the beginning of the file and hope for the best
-          cssInsertPosition = 0;
-          modifiedHtml = '<head>\n</head>\n' + modifiedHtml;
-          cssInsertPosition = 7; // Position right after <head>
-        }
+        const dirname = path.dirname(filePath);
+        const basename = path.basename(filePath, '.html');
+        outputFilePath = path.join(dirname, `${basename}_withcontent.html`);
       }
-    }
 
-    // Insert CSS at the determined position
-    if (cssContent) {
-      modifiedHtml = modifiedHtml.slice(0, cssInsertPosition) +
-        cssContent +
-        modifiedHtml.slice(cssInsertPosition);
+      // Escribir el archivo de salida (mismo contenido que el de entrada)
+      writeIfChanged(outputFilePath, htmlContent);
+      console.log(`No headings found. Original content written to: ${outputFilePath}`);
 
-      // Adjust tocInsertPosition if it's after cssInsertPosition
-      if (tocInsertPosition > cssInsertPosition) {
-        tocInsertPosition += cssContent.length;
-      }
+      return;
     }
 
-    // Insert TOC at the determined position
-    modifiedHtml = modifiedHtml.slice(0, tocInsertPosition) +
-      '\n\n' + tocHtml +
-      modifiedHtml.slice(tocInsertPosition);
-
     // Determine output filename
     let outputFilePath;
     if (outputPath) {
@@ -275,7 +324,7 @@ function addTableOfContents(filePath, maxDepth = 2, outputPath = null, cssPath =
       outputFilePath = path.join(dirname, `${basename}_withcontent.html`);
     }
 
-    fs.writeFileSync(outputFilePath, modifiedHtml);
+    writeIfChanged(outputFilePath, modifiedHtml);
     console.log(`Table of contents added successfully. Output file: ${outputFilePath}`);
     if (cssPath && fs.existsSync(cssPath)) {
       console.log(`CSS styling embedded from: ${cssPath}`);
@@ -289,10 +338,36 @@ function addTableOfContents(filePath, maxDepth = 2, outputPath = null, cssPath =
   console.timeEnd('toc');
 }
 
+/**
+ * Persistent worker mode used by pipeline.py: reads one JSON request per line
+ * ({html, depth, css}) from stdin and writes one JSON response per line
+ * ({html} or {error}) to stdout, so node starts only once
+ */
+function serveStdio() {
+  const readline = require('readline');
+  const rl = readline.createInterface({ input: process.stdin, terminal: false });
+  rl.on('line', (line) => {
+    let response;
+    try {
+      const request = JSON.parse(line);
+      const html = buildTableOfContents(request.html, request.depth || 2, request.css);
+      response = { html: html === null ? request.html : html };
+    } catch (error) {
+      response = { error: error.message };
+    }
+    process.stdout.write(JSON.stringify(response) + '\n');
+  });
+}
+
 // CLI Execution
 if (require.main === module) {
   const args = process.argv.slice(2);
 
+  if (args.includes('--stdio')) {
+    serveStdio();
+    return;
+  }
+
   if (args.length === 0 || args.includes('-h') || args.includes('--help')) {
     showHelp();
     process.exit(args.length === 0 ? 1 : 0);
@@ -340,4 +415,4 @@ if (require.main === module) {
   addTableOfContents(filePath, maxDepth, outputPath, cssPath);
 }
 
-module.exports = { addTableOfContents };
\ No newline at end of file
+module.exports = { addTableOfContents, buildTableOfContents };
\ No newline at end of file
@@ -1,47 +1,71 @@
 #!/usr/bin/env python3
 """
 Convert Mermaid code blocks in HTML to inline SVG graphs.
+
+Diagrams are rendered in the browser by the vendored Mermaid bundle, loaded
+lazily by the loader from mermaid_runtime.py.
 """
 import os
-import re
 import sys
 import argparse
 from bs4 import BeautifulSoup, Tag
 
+from css_cascade import inline_styles
+from mermaid_runtime import LOADER_ID as MERMAID_LOADER_ID, install_mermaid_asset, mermaid_loader_script
+from output_utils import write_if_changed
+
+# Keywords used to recognize Mermaid code in plain <pre> tags
+MERMAID_KEYWORDS = ('graph ', 'flowchart ', 'sequenceDiagram', 'classDiagram')
+
+def classify_mermaid_candidate(element):
+    """
+    Return how an element was recognized as a Mermaid block, or None.
+
+    - 'mermaid': <div class="mermaid"> (new md2html.py format)
+    - 'language-mermaid': <pre> or <div> with a language-mermaid class (legacy support)
+    - 'keyword': <pre> whose text looks like Mermaid code
+    """
+    classes = element.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+
+    if element.name == 'div':
+        if 'mermaid' in classes:
+            return 'mermaid'
+        if any('language-mermaid' in c for c in classes):
+            return 'language-mermaid'
+        return None
+
+    if any('language-mermaid' in c for c in classes):
+        return 'language-mermaid'
+    code = element.text.strip()
+    if any(keyword in code for keyword in MERMAID_KEYWORDS):
+        return 'keyword'
+    return None
+
 def find_mermaid_blocks(soup, verbose=False):
-    """Find all Mermaid code blocks in the HTML."""
+    """
+    Find all Mermaid code blocks in the HTML with a single traversal.
+
+    Blocks are deduplicated by node identity: a candidate nested inside an
+    already selected block (e.g. the <pre> of a language-mermaid div) is skipped.
+    """
     mermaid_blocks = []
-    
-    # Method 1: Find divs with class "mermaid" (new md2html.py format)
-    for div in soup.find_all('div', class_='mermaid'):
-        mermaid_blocks.append(div)
-        if verbose:
-            print(f"Found Mermaid div: {div.get_text()[:50]}...")
-    
-    # Method 2: Find pre tags with language-mermaid class (legacy support)
-    for pre in soup.find_all('pre', class_=lambda c: c and 'language-mermaid' in c):
-        mermaid_blocks.append(pre)
+    selected = set()
+
+    for element in soup.find_all(['div', 'pre']):
+        if selected and any(id(parent) in selected for parent in element.parents):
+            continue
+
+        kind = classify_mermaid_candidate(element)
+        if not kind:
+            continue
+
+        mermaid_blocks.append(element)
+        selected.add(id(element))
         if verbose:
-            print(f"Found Mermaid pre: {pre.get_text()[:50]}...")
-    
-    # Method 3: Find divs with language-mermaid class that contain pre tags
-    for div in soup.find_all('div', class_=lambda c: c and 'language-mermaid' in c):
-        if div not in mermaid_blocks:  # Avoid duplicates
-            mermaid_blocks.append(div)
-            if verbose:
-                print(f"Found Mermaid div with language class: {div.get_text()[:50]}...")
-    
-    # Method 4: Find any pre tags that look like they contain Mermaid code
-    for pre in soup.find_all('pre'):
-        if pre in mermaid_blocks:
-            continue  # Skip if already found
-            
-        code = pre.text.strip()
-        if any(keyword in code for keyword in ['graph ', 'flowchart ', 'sequenceDiagram', 'classDiagram']):
-            mermaid_blocks.append(pre)
-            if verbose:
-                print(f"Found Mermaid-like pre: {code[:50]}...")
-    
+            print(f"Found Mermaid {element.name} ({kind}): {element.get_text().strip()[:50]}...")
+
     return mermaid_blocks
 
 def extract_mermaid_code(element):
@@ -79,63 +103,23 @@ def create_mermaid_div(code):
     return div
 
 def convert_to_inline_styles(soup):
-    """Convert all CSS styles to inline styles."""
-    # Process all style tags
+    """
+    Convert all CSS styles to inline styles.
+
+    Elements are indexed once and each selector is matched against the
+    candidates of its rightmost compound (see css_cascade), so the cost no
+    longer grows as (number of rules) x (number of elements).
+    """
+    css_texts = []
     for style in soup.find_all('style'):
         if not style.string:
             continue
-            
-        # Very simple CSS parser
-        css_text = style.string
-        rules = re.findall(r'([^{]+){([^}]+)}', css_text)
-        
-        for selector, style_block in rules:
-            selector = selector.strip()
-            styles = {}
-            
-            # Extract properties
-            for prop in style_block.split(';'):
-                prop = prop.strip()
-                if not prop:
-                    continue
-                parts = prop.split(':', 1)
-                if len(parts) == 2:
-                    styles[parts[0].strip()] = parts[1].strip()
-            
-            # Apply styles to matching elements
-            try:
-                if selector.startswith('.'):
-                    # Class selector
-                    class_name = selector[1:]
-                    elements = soup.find_all(class_=lambda c: c and class_name in c.split())
-                elif selector.startswith('#'):
-                    # ID selector
-                    id_name = selector[1:]
-                    elements = [soup.find(id=id_name)] if soup.find(id=id_name) else []
-                else:
-                    # Tag or complex selector
-                    elements = soup.select(selector)
-                
-                for element in elements:
-                    if not element:
-                        continue
-                        
-                    existing_style = element.get('style', '')
-                    style_parts = []
-                    
-                    if existing_style:
-                        style_parts.append(existing_style.rstrip(';'))
-                    
-                    for prop, value in styles.items():
-                        style_parts.append(f"{prop}: {value}")
-                    
-                    element['style'] = '; '.join(style_parts)
-            except Exception as e:
-                print(f"Error applying style for selector '{selector}': {e}")
-        
+        css_texts.append(style.string)
         # Remove the style tag
         style.decompose()
 
+    inline_styles(soup, css_texts)
+
 def main():
     parser = argparse.ArgumentParser(description='Convert Mermaid code blocks in HTML to inline SVG graphs')
     parser.add_argument('input_file', help='Input HTML file')
@@ -191,8 +175,7 @@ def main():
             print("No Mermaid blocks found. Creating copy of input file...")
         
         # Write the original content to output file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        write_if_changed(output_file, html_content)
         
         print(f"Output file saved to: {output_file}")
         return
@@ -242,67 +225,24 @@ def main():
             soup.append(html)
     
     # Check if Mermaid script already exists
-    existing_script = soup.find('script', src=lambda x: x and 'mermaid' in x)
+    existing_script = (soup.find('script', id=MERMAID_LOADER_ID) or
+                       soup.find('script', src=lambda x: x and 'mermaid' in x))
     
     if not existing_script:
         if args.verbose:
-            print("Adding Mermaid.js script...")
-        # Add Mermaid.js script at the end of the body
-        script = soup.new_tag('script')
-        script['src'] = 'https://cdn.jsdelivr.net/npm/mermaid/dist/mermaid.min.js'
+            print("Adding lazy Mermaid loader...")
+        # Copy the vendored Mermaid bundle next to the output file and add the
+        # loader that renders each diagram when it gets close to the viewport
+        mermaid_src = install_mermaid_asset(output_dir or '.')
+        script = soup.new_tag('script', id=MERMAID_LOADER_ID)
+        script.string = mermaid_loader_script(mermaid_src)
         soup.body.append(script)
-        
-        # Add initialization script
-        init_script = soup.new_tag('script')
-        init_script.string = """
-        document.addEventListener('DOMContentLoaded', function () {
-            // Función para reemplazar caracteres escapados
-            function unescapeHTML(html) {
-                return html
-                    .replace(/<pre class="mermaid">/g, "")
-                    .replace(/<\/pre>/g, "")
-                    .replace(/&lt;/g, '<')
-                    .replace(/&gt;/g, '>')
-                    .replace(/&amp;/g, '&')
-                    .replace(/&quot;/g, '"');
-            }
-
-            // Buscar todos los divs con clase mermaid
-            const mermaidDivs = document.querySelectorAll('div.mermaid');
-            console.log('Found', mermaidDivs.length, 'Mermaid divs');
-
-            // Procesar cada div
-            mermaidDivs.forEach(function (div, index) {
-                // Obtener el contenido actual y desescaparlo
-                const escapedContent = div.innerHTML;
-                const unescapedContent = unescapeHTML(escapedContent);
-
-                // Reemplazar el contenido
-                div.innerHTML = unescapedContent;
-                console.log('Processed Mermaid div', index + 1, ':', unescapedContent.substring(0, 50));
-            });
-
-            // Inicializar Mermaid después de hacer los reemplazos
-            mermaid.initialize({
-                startOnLoad: true,
-                theme: 'default',
-                fontFamily: 'Arial, sans-serif',
-                securityLevel: 'loose',
-                flowchart: {
-                    htmlLabels: true,
-                    curve: 'basis'
-                }
-            });
-        });
-        """
-        soup.body.append(init_script)
     else:
         if args.verbose:
             print("Mermaid script already exists in the document.")
     
     # Write output file
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(str(soup))
+    write_if_changed(output_file, str(soup))
     
     print(f"Converted file saved to: {output_file}")
 
@@ -0,0 +1,1115 @@
+#!/usr/bin/env python3
+"""
+bench.py - Benchmarks for the notes processing pipeline
+
+Usage:
+    python bench.py <benchmark> [options]
+
+Benchmarks:
+    mermaid     Mermaid block detection in add_graphs.py on a page with many <pre> blocks
+    serve       Load test of the serve.py preview server with concurrent local clients
+    search      Size, build time and query latency of the search index (search_index.py)
+    render      Cold md2html.sh runs vs warm requests to render_server.py
+    sections    Markdown conversion after a one-section edit with the section cache (md2html.py)
+    highlight   DOM nodes and bytes of code blocks with the compact Pygments formatter
+    stream      Peak memory of the streaming conversion (pipeline.py --stream) on a synthetic note
+    critical    Critical CSS split (inline_css.py --css-mode critical): bytes and first-screen check
+    batch       Per-block highlight() calls vs shared lexers and formatters (batch_highlight.py)
+    draft       Warm render time of the draft profile (pipeline.py --draft) vs the full pipeline
+    defer       Live DOM nodes with the bodies of long collapsed code blocks in <template> (--defer-code)
+    svg         Bytes saved by svg_optimize.py on the ```svg blocks of the notes and an editor-style drawing,
+                and in the final page of each CSS mode
+    precache    Precache manifest update time and bytes the service worker re-fetches after an edit (precache.py)
+    dynamic     Static CSS mode: the :hover/:focus rules that a style attribute would make dead (inline_css.py)
+    static      Static CSS mode: page weight against the other modes, and the same computed styles
+                with only the declarations that change the rendering
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from bs4 import BeautifulSoup
+
+
+def _timed(func, *args, repeat=3, **kwargs):
+    """Run func several times and return (best_seconds, last_result)."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+# --- mermaid -----------------------------------------------------------------
+
+def _legacy_find_mermaid_blocks(soup):
+    """Four-pass detection with list membership (Tag.__eq__), as it was before."""
+    mermaid_blocks = []
+    for div in soup.find_all('div', class_='mermaid'):
+        mermaid_blocks.append(div)
+    for pre in soup.find_all('pre', class_=lambda c: c and 'language-mermaid' in c):
+        mermaid_blocks.append(pre)
+    for div in soup.find_all('div', class_=lambda c: c and 'language-mermaid' in c):
+        if div not in mermaid_blocks:
+            mermaid_blocks.append(div)
+    for pre in soup.find_all('pre'):
+        if pre in mermaid_blocks:
+            continue
+        code = pre.text.strip()
+        if any(keyword in code for keyword in ['graph ', 'flowchart ', 'sequenceDiagram', 'classDiagram']):
+            mermaid_blocks.append(pre)
+    return mermaid_blocks
+
+
+def _mermaid_page(blocks):
+    """Build a page with the given number of <pre> blocks (1 in 10 is Mermaid-like)."""
+    parts = ['<html><head><title>bench</title></head><body>']
+    for i in range(blocks):
+        if i % 10 == 0:
+            parts.append(f'<pre>graph TD\n  A{i} --> B{i}\n  B{i} --> C{i}</pre>')
+        else:
+            spans = ''.join(f'<span class="n">var{i}_{j}</span><span class="o">=</span>'
+                            f'<span class="mi">{j}</span>\n' for j in range(8))
+            parts.append(f'<div class="highlight language-js"><pre><span></span>{spans}</pre></div>')
+    parts.append('<div class="mermaid">\nsequenceDiagram\n  A->>B: hola\n</div>')
+    parts.append('</body></html>')
+    return ''.join(parts)
+
+
+def bench_mermaid(args):
+    from add_graphs import find_mermaid_blocks
+
+    html = _mermaid_page(args.blocks)
+    soup = BeautifulSoup(html, 'html.parser')
+    print(f"Page: {args.blocks} <pre> blocks, {len(html) / 1024:.0f} KB")
+
+    new_time, found = _timed(find_mermaid_blocks, soup, repeat=args.repeat)
+    print(f"  single traversal : {new_time * 1000:9.1f} ms  ({len(found)} blocks)")
+
+    if not args.skip_legacy:
+        old_time, old_found = _timed(_legacy_find_mermaid_blocks, soup, repeat=1)
+        print(f"  legacy (4 passes): {old_time * 1000:9.1f} ms  ({len(old_found)} blocks)")
+        print(f"  speedup          : {old_time / new_time:9.1f}x")
+
+
+# --- serve -------------------------------------------------------------------
+
+async def _http_client(port, paths, requests, latencies, errors, headers=''):
+    """One keep-alive client issuing sequential GET requests."""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for i in range(requests):
+            path = paths[i % len(paths)]
+            start = time.perf_counter()
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\n{headers}\r\n'.encode('latin-1'))
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            status = int(head.split(b' ', 2)[1])
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            if length:
+                await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if status not in (200, 304):
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def _serve_load_test(args):
+    from urllib.parse import quote
+    from serve import NotesServer
+
+    server_state = NotesServer(args.root, live_reload=True)
+    server = await server_state.start('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    root = server_state.root
+    pages = sorted(root.rglob('*_final.html'))[:args.pages]
+    if not pages:
+        print(f"No *_final.html pages found under {root}")
+        server.close()
+        return
+    paths = ['/' + quote(p.relative_to(root).as_posix()) for p in pages]
+    extra = 'Accept-Encoding: gzip\r\n' if args.gzip else ''
+
+    print(f"Server: {root} ({len(paths)} pages), {args.clients} clients x {args.requests} requests"
+          f"{', gzip' if args.gzip else ''}")
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_http_client(port, paths[i % len(paths):] + paths[:i % len(paths)],
+                                        args.requests, latencies, errors, extra)
+                           for i in range(args.clients)))
+    elapsed = time.perf_counter() - start
+    server_state.stop()
+    server.close()
+    await server.wait_closed()
+
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"  requests   : {len(latencies)} in {elapsed:.2f} s ({len(latencies) / elapsed:.0f} req/s)")
+    print(f"  latency    : mean {statistics.mean(latencies) * 1000:.2f} ms, p50 {p(0.5):.2f} ms, "
+          f"p95 {p(0.95):.2f} ms, p99 {p(0.99):.2f} ms")
+    print(f"  errors     : {len(errors)}")
+
+
+def bench_serve(args):
+    asyncio.run(_serve_load_test(args))
+
+
+# --- search ------------------------------------------------------------------
+
+SEARCH_QUERIES = ['relaciones cypher', 'useEffect dependencias', 'interfaces genéricas typescript',
+                  'insertar documentos mongodb', 'asociaciones sequelize', 'componentes react props',
+                  'grafo dirigido', 'clases herencia', 'rutas anidadas', 'consultas']
+
+
+def bench_search(args):
+    import shutil
+    import tempfile
+    from pathlib import Path
+    from search_index import HEADING_WEIGHTS, build_index, extract_document, IndexReader
+
+    source = Path(args.root)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Copia de las páginas para poder simular la edición de una nota
+        root = Path(tmp) / 'notes'
+        pages = sorted(source.rglob('*_final.html'))
+        for page in pages:
+            target = root / page.relative_to(source)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(page, target)
+        index_dir = Path(tmp) / 'search'
+
+        start = time.perf_counter()
+        build_index(root, index_dir, verbose=False)
+        full_time = time.perf_counter() - start
+
+        edited = max(root.rglob('*_final.html'), key=lambda p: p.stat().st_size)
+        edited.write_text(edited.read_text(encoding='utf-8').replace('</body>', '<p>nota editada</p></body>'),
+                          encoding='utf-8')
+        start = time.perf_counter()
+        stats = build_index(root, index_dir, verbose=False)
+        incremental_time = time.perf_counter() - start
+
+        shards = sorted(index_dir.glob('terms-*.json'), key=lambda p: p.stat().st_size)
+        shard_sizes = [p.stat().st_size for p in shards]
+        docs_size = (index_dir / 'docs.json').stat().st_size
+        state_size = (index_dir / 'state.json').stat().st_size
+        pages_size = sum(p.stat().st_size for p in pages)
+
+        print(f"Pages: {len(pages)} ({pages_size / 1024:.0f} KB of HTML)")
+        print(f"  full build        : {full_time:.2f} s")
+        print(f"  incremental build : {incremental_time * 1000:.0f} ms "
+              f"(1 page edited, {stats['shards_written']} shards rewritten)")
+        print(f"  shards            : {len(shards)}, total {sum(shard_sizes) / 1024:.0f} KB, "
+              f"median {shard_sizes[len(shard_sizes) // 2] / 1024:.1f} KB, max {shard_sizes[-1] / 1024:.1f} KB")
+        print(f"  docs.json         : {docs_size / 1024:.0f} KB (downloaded by the browser)")
+        print(f"  state.json        : {state_size / 1024:.0f} KB (build only)")
+
+        # Cada encabezado con id abre su sección (también los que empiezan con <code>)
+        headings = missed = 0
+        for page in pages:
+            html = page.read_text(encoding='utf-8')
+            anchors = {anchor for anchor, _ in extract_document(html)[1]}
+            ids = {h['id'] for h in BeautifulSoup(html, 'html.parser').find_all(list(HEADING_WEIGHTS), id=True)
+                   if h.get_text(strip=True) and not h.find_parent(id='table-of-contents')}
+            headings += len(ids)
+            missed += len(ids - anchors)
+        print(f"  sections          : {headings - missed} of {headings} headings open their section")
+
+        cold, warm, downloaded = [], [], []
+        for query in SEARCH_QUERIES:
+            reader = IndexReader(index_dir)
+            start = time.perf_counter()
+            reader.search(query)
+            cold.append(time.perf_counter() - start)
+            downloaded.append(sum((index_dir / f'terms-{p}.json').stat().st_size
+                                  for p in reader.shards if (index_dir / f'terms-{p}.json').exists()))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                reader.search(query)
+            warm.append((time.perf_counter() - start) / args.repeat)
+
+        print(f"  query (cold)      : mean {statistics.mean(cold) * 1000:.2f} ms, max {max(cold) * 1000:.2f} ms")
+        print(f"  query (warm)      : mean {statistics.mean(warm) * 1000:.3f} ms, max {max(warm) * 1000:.3f} ms")
+        print(f"  shards per query  : mean {statistics.mean(downloaded) / 1024:.1f} KB loaded")
+    if missed:
+        sys.exit(1)
+
+
+# --- render ------------------------------------------------------------------
+
+def _start_render_server(workers):
+    """Run a RenderServer on an event loop in a background thread; returns (port, stop)."""
+    import threading
+    from render_server import RenderServer
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    server_state = RenderServer(workers)
+    server = asyncio.run_coroutine_threadsafe(server_state.start('127.0.0.1', 0), loop).result()
+
+    def stop():
+        server.close()
+        server_state.stop()
+        loop.call_soon_threadsafe(loop.stop)
+
+    return server.sockets[0].getsockname()[1], stop
+
+
+def bench_render(args):
+    import shutil
+    import tempfile
+    import subprocess
+    from pathlib import Path
+    from concurrent.futures import ThreadPoolExecutor
+    from render_client import connect, render
+
+    source = Path(args.input)
+    with tempfile.TemporaryDirectory() as tmp:
+        md_path = Path(tmp) / source.name
+        shutil.copyfile(source, md_path)
+        print(f"Note: {source} ({source.stat().st_size / 1024:.0f} KB)")
+
+        cold = []
+        for _ in range(args.cold):
+            start = time.perf_counter()
+            subprocess.run(['bash', 'md2html.sh', str(md_path)], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            cold.append(time.perf_counter() - start)
+        print(f"  md2html.sh (cold)    : mean {statistics.mean(cold) * 1000:7.0f} ms, "
+              f"min {min(cold) * 1000:7.0f} ms  ({len(cold)} runs)")
+
+        start = time.perf_counter()
+        port, stop = _start_render_server(args.workers)
+        print(f"  server startup       : {(time.perf_counter() - start) * 1000:7.0f} ms  ({args.workers} workers)")
+        try:
+            def client_run(requests):
+                connection = connect(port=port)
+                latencies = []
+                try:
+                    for _ in range(requests):
+                        t0 = time.perf_counter()
+                        render(connection, path=str(md_path))
+                        latencies.append(time.perf_counter() - t0)
+                finally:
+                    connection.close()
+                return latencies
+
+            warm = client_run(args.requests)
+            print(f"  render_server (warm) : mean {statistics.mean(warm) * 1000:7.0f} ms, "
+                  f"min {min(warm) * 1000:7.0f} ms  ({len(warm)} sequential requests)")
+            print(f"  speedup              : {statistics.mean(cold) / statistics.mean(warm):7.1f}x")
+
+            snippet = '## Snippet\n\n```js\nconst a = 1;\n```\n'
+            connection = connect(port=port)
+            snippet_time, _ = _timed(render, connection, markdown=snippet, repeat=args.requests)
+            connection.close()
+            print(f"  snippet (warm)       : best {snippet_time * 1000:7.1f} ms")
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.clients) as pool:
+                results = list(pool.map(client_run, [args.requests] * args.clients))
+            elapsed = time.perf_counter() - start
+            latencies = sorted(t for r in results for t in r)
+            print(f"  concurrent           : {args.clients} clients x {args.requests} requests, "
+                  f"{len(latencies) / elapsed:.1f} renders/s, "
+                  f"p95 {latencies[int(0.95 * (len(latencies) - 1))] * 1000:.0f} ms")
+        finally:
+            stop()
+
+
+# --- sections ----------------------------------------------------------------
+
+def bench_sections(args):
+    import io
+    import contextlib
+    from pathlib import Path
+    from md2html import render_markdown, split_sections, SectionCache
+
+    source = Path(args.input).read_text(encoding='utf-8')
+    sections, _ = split_sections(source)
+    # Editar un carácter de la sección del medio
+    middle = len(sections) // 2
+    edited_sections = list(sections)
+    edited_sections[middle] = edited_sections[middle].replace(' ', '  ', 1)
+    edited = '\n'.join(edited_sections)
+    print(f"Note: {args.input} ({len(source.splitlines())} lines, {len(sections)} sections)")
+
+    def run(md_content, cache):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return render_markdown(md_content, 'bench', None, 'default', None, cache)
+
+    full_time, reference = _timed(run, edited, None, repeat=args.repeat)
+    print(f"  full conversion       : {full_time * 1000:7.1f} ms")
+
+    def incremental():
+        cache = SectionCache()
+        run(source, cache)
+        cache.entries, cache.used = cache.used, {}
+        cache.hits = cache.misses = 0
+        start = time.perf_counter()
+        html = run(edited, cache)
+        return time.perf_counter() - start, html, cache
+
+    best = None
+    for _ in range(args.repeat):
+        elapsed, html, cache = incremental()
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"  one section edited    : {best * 1000:7.1f} ms  ({cache.misses} re-rendered, {cache.hits} from cache)")
+    print(f"  speedup               : {full_time / best:7.1f}x")
+    print(f"  identical output      : {html == reference}")
+
+
+# --- highlight ---------------------------------------------------------------
+
+def _code_block_stats(soup):
+    """(elements, text nodes) inside the highlighted code blocks."""
+    elements = texts = 0
+    for block in soup.select('div.highlight'):
+        for node in block.descendants:
+            if getattr(node, 'name', None):
+                elements += 1
+            elif str(node):
+                texts += 1
+    return elements, texts
+
+
+def _char_styles(soup, css):
+    """Resolved style of every character of the code blocks (whitespace: visible props only)."""
+    from css_cascade import resolve_styles
+    from compact_highlight import INVISIBLE_ON_WHITESPACE, INVISIBLE_VALUES
+
+    resolved = {id(el): props for el, props in resolve_styles(soup, [css], warn=lambda _: None)}
+    styles = []
+    for pre in soup.select('div.highlight pre'):
+        for text in pre.find_all(string=True):
+            span = text.parent if text.parent.name == 'span' else None
+            props = resolved.get(id(span), {}) if span is not None else {}
+            visible = {p: v for p, v in props.items()
+                       if p not in INVISIBLE_ON_WHITESPACE and v[0].lower() not in INVISIBLE_VALUES}
+            styles.extend((ch, tuple(sorted((visible if ch.isspace() else props).items())))
+                          for ch in str(text))
+    return styles
+
+
+def bench_highlight(args):
+    from pathlib import Path
+    from pipeline import Pipeline
+
+    standard = Pipeline(quiet=True, compact_highlight=False, css_mode='textarea')
+    compact = Pipeline(quiet=True, compact_highlight=True, css_mode='textarea')
+    print(f"{'Page':<32} {'nodes':>8} {'compact':>8} {'%':>5} {'KB':>8} {'compact':>8} {'%':>5}  same")
+    totals = [0, 0, 0, 0]
+    try:
+        for path in args.inputs:
+            md_content = Path(path).read_text(encoding='utf-8')
+            pages = [p.render(md_content, Path(path).stem) for p in (standard, compact)]
+            soups = [BeautifulSoup(page, 'html.parser') for page in pages]
+            nodes = [sum(_code_block_stats(soup)) for soup in soups]
+            sizes = [len(page.encode('utf-8')) for page in pages]
+            same = '-'
+            if not args.skip_check:
+                css = soups[0].find('textarea', id='css-editor').string or ''
+                same = 'yes' if _char_styles(soups[0], css) == _char_styles(soups[1], css) else 'NO'
+            name = Path(path).name
+            print(f"{name[:32]:<32} {nodes[0]:>8} {nodes[1]:>8} {100 * nodes[1] / max(nodes[0], 1):>5.0f} "
+                  f"{sizes[0] / 1024:>8.1f} {sizes[1] / 1024:>8.1f} {100 * sizes[1] / sizes[0]:>5.0f}  {same}")
+            for i, value in enumerate((nodes[0], nodes[1], sizes[0], sizes[1])):
+                totals[i] += value
+    finally:
+        standard.close()
+        compact.close()
+    print(f"{'Total':<32} {totals[0]:>8} {totals[1]:>8} {100 * totals[1] / max(totals[0], 1):>5.0f} "
+          f"{totals[2] / 1024:>8.1f} {totals[3] / 1024:>8.1f} {100 * totals[3] / max(totals[2], 1):>5.0f}")
+
+
+# --- stream ------------------------------------------------------------------
+
+STREAM_CHILD = """
+import io, sys, time, resource, contextlib
+from pathlib import Path
+mode, md_path, output = sys.argv[1:4]
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    from pipeline import Pipeline, SYNTAX_CSS
+    from md2html import render_markdown
+    from collapsible import collapse_html
+    from output_utils import write_if_changed, write_chunks_if_changed
+    if mode == 'stream':
+        write_chunks_if_changed(output, Pipeline(skip_toc=True).stream_file(md_path, Path(output).parent))
+    elif mode == 'full':
+        md_content = Path(md_path).read_text(encoding='utf-8')
+        html = render_markdown(md_content, Path(md_path).stem, SYNTAX_CSS, output_dir=Path(output).parent)
+        write_if_changed(output, collapse_html(html))
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, time.perf_counter() - start)
+"""
+
+
+def _synthetic_note(path, sources, size):
+    """Concatenate the source notes (headings renamed per copy) until the file reaches size bytes."""
+    import re
+    from pathlib import Path
+
+    heading = re.compile(r'^(#{1,6} .*?)\s*$', re.MULTILINE)
+    texts = [Path(source).read_text(encoding='utf-8') for source in sources]
+    written = copy = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        while written < size:
+            for text in texts:
+                chunk = heading.sub(lambda m: f'{m.group(1)} ({copy})', text).rstrip('\n') + '\n\n'
+                f.write(chunk)
+                written += len(chunk.encode('utf-8'))
+                copy += 1
+    return written
+
+
+def bench_stream(args):
+    import tempfile
+    import subprocess
+    from pathlib import Path
+
+    def run(mode, md_path):
+        output = md_path.with_suffix('.html')
+        result = subprocess.run([sys.executable, '-c', STREAM_CHILD, mode, str(md_path), str(output)],
+                                check=True, capture_output=True, text=True)
+        peak_kb, seconds = result.stdout.split()
+        return int(peak_kb) / 1024, float(seconds), output.stat().st_size if output.exists() else 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline, _, _ = run('idle', Path(tmp) / 'idle.md')
+        print(f"Interpreter with the pipeline imported: {baseline:.0f} MB peak RSS")
+        print(f"{'Mode':<8} {'Note MB':>8} {'HTML MB':>8} {'Peak MB':>8} {'Above base':>11} {'Time s':>8}")
+        runs = [('stream', args.size)] + [('full', size) for size in args.full_size]
+        if args.full_size:
+            runs.append(('stream', max(args.full_size)))
+        for mode, size in runs:
+            md_path = Path(tmp) / f'synthetic-{size:g}.md'
+            if not md_path.exists():
+                _synthetic_note(md_path, args.inputs, int(size * 1024 * 1024))
+            peak, seconds, html_size = run(mode, md_path)
+            print(f"{mode:<8} {md_path.stat().st_size / 2**20:>8.1f} {html_size / 2**20:>8.1f} {peak:>8.0f} "
+                  f"{peak - baseline:>11.0f} {seconds:>8.1f}")
+
+
+# --- critical ----------------------------------------------------------------
+
+def _missing_first_screen_rules(soup, css):
+    """Rules of css that style the first screen of soup but are not in its critical <style>."""
+    import soupsieve as sv
+    from css_cascade import parse_css_rules
+    from critical_css import CRITICAL_STYLE_ID, first_screen_elements, static_selector
+
+    critical = {(selector, tuple(declarations)) for selector, declarations
+                in parse_css_rules(soup.find('style', id=CRITICAL_STYLE_ID).string or '')}
+    first_screen = {id(element) for element in first_screen_elements(soup)}
+    missing = []
+    for selector, declarations in parse_css_rules(css):
+        if (selector, tuple(declarations)) in critical:
+            continue
+        try:
+            matched = sv.select(static_selector(selector), soup)
+        except Exception:
+            matched = []
+        if any(id(element) in first_screen for element in matched):
+            missing.append(selector)
+    return missing
+
+
+def bench_critical(args):
+    from pathlib import Path
+    from pipeline import Pipeline
+    from critical_css import CRITICAL_STYLE_ID, DEFERRED_CSS_ID
+
+    textarea = Pipeline(quiet=True, css_mode='textarea')
+    critical = Pipeline(quiet=True, css_mode='critical')
+    print(f"{'Page':<32} {'CSS KB':>7} {'critical':>9} {'deferred':>9} {'%':>4} {'page KB':>8} {'critical':>9}  check")
+    failed = 0
+    try:
+        for path in args.inputs:
+            md_content = Path(path).read_text(encoding='utf-8')
+            pages = [p.render(md_content, Path(path).stem) for p in (textarea, critical)]
+            soups = [BeautifulSoup(page, 'html.parser') for page in pages]
+            css = soups[0].find('textarea', id='css-editor').string or ''
+            critical_css = soups[1].find('style', id=CRITICAL_STYLE_ID).string or ''
+            deferred_css = soups[1].find('script', id=DEFERRED_CSS_ID).string or ''
+            missing = _missing_first_screen_rules(soups[1], css)
+            failed += bool(missing)
+            sizes = [len(text.encode('utf-8')) / 1024 for text in (css, critical_css, deferred_css) + tuple(pages)]
+            name = Path(path).name
+            print(f"{name[:32]:<32} {sizes[0]:>7.1f} {sizes[1]:>9.1f} {sizes[2]:>9.1f} "
+                  f"{100 * sizes[1] / max(sizes[0], 1e-9):>4.0f} {sizes[3]:>8.1f} {sizes[4]:>9.1f}  "
+                  f"{'ok' if not missing else 'MISSING ' + ', '.join(missing[:3])}")
+    finally:
+        textarea.close()
+        critical.close()
+    if failed:
+        sys.exit(1)
+
+
+# --- batch -------------------------------------------------------------------
+
+def _fenced_blocks(md_content):
+    """(language, code) of the fenced blocks that md2html.py highlights."""
+    import re
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+    from md2html import EnhancedSyntaxPreprocessor
+
+    blocks = []
+    for m in re.finditer(EnhancedSyntaxPreprocessor.FENCED_BLOCK_RE, md_content, re.MULTILINE):
+        lang, code = m.group(1) or 'text', m.group(2)
+        if not code.strip() or lang.lower() in ('svg', 'mermaid'):
+            continue
+        try:
+            get_lexer_by_name(lang)
+        except ClassNotFound:
+            continue
+        blocks.append((lang, code))
+    return blocks
+
+
+def bench_batch(args):
+    import io
+    import contextlib
+    from pathlib import Path
+    from pygments import highlight
+    from pygments.lexers import get_lexer_by_name
+    from batch_highlight import BatchHighlighter
+    from compact_highlight import CompactHtmlFormatter
+    from md2html import _prepare_rendering
+
+    # El mismo formatter que md2html.py con el estilo por defecto
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, head_styles, _, _ = _prepare_rendering('default', None, True)
+    page_css = '\n'.join(line for line in head_styles if line.strip() not in ('<style>', '</style>'))
+
+    def make_formatter(cssclass):
+        return CompactHtmlFormatter(css_texts=(page_css,), cssclass=cssclass, style='default')
+
+    def per_block(blocks):
+        return [highlight(code, get_lexer_by_name(lang), make_formatter(f'highlight language-{lang}'))
+                for lang, code in blocks]
+
+    def batched(blocks):
+        highlighter = BatchHighlighter(make_formatter)
+        for lang, code in blocks:
+            highlighter.add(lang, code, f'highlight language-{lang}')
+        return highlighter.run()
+
+    pages = [(Path(path).name, _fenced_blocks(Path(path).read_text(encoding='utf-8'))) for path in args.inputs]
+    # Muchos fragmentos cortos: los bloques de hasta --max-lines líneas de todas las notas, repetidos
+    short = [block for _, blocks in pages for block in blocks if block[1].count('\n') <= args.max_lines]
+    if short:
+        pages.append((f'{args.snippets} short snippets', (short * (args.snippets // len(short) + 1))[:args.snippets]))
+
+    print(f"{'Page':<32} {'blocks':>7} {'lexers':>7} {'per-block ms':>13} {'batched ms':>11} {'speedup':>8}  same")
+    failed = 0
+    for name, blocks in pages:
+        if not blocks:
+            continue
+        single_time, expected = _timed(per_block, blocks, repeat=args.repeat)
+        batch_time, results = _timed(batched, blocks, repeat=args.repeat)
+        same = results == expected
+        failed += not same
+        lexers = len({type(get_lexer_by_name(lang)) for lang, _ in blocks})
+        print(f"{name[:32]:<32} {len(blocks):>7} {lexers:>7} {single_time * 1000:>13.1f} {batch_time * 1000:>11.1f} "
+              f"{single_time / batch_time:>7.1f}x  {'yes' if same else 'NO'}")
+    if failed:
+        sys.exit(1)
+
+
+# --- draft -------------------------------------------------------------------
+
+def bench_draft(args):
+    import tempfile
+    from pathlib import Path
+    from pipeline import Pipeline
+
+    full = Pipeline(quiet=True)
+    draft = Pipeline(quiet=True, draft=True)
+    print(f"{'Page':<32} {'full ms':>8} {'draft ms':>9} {'speedup':>8} {'full KB':>8} {'draft KB':>9}  target")
+    slow = 0
+    try:
+        with tempfile.TemporaryDirectory() as output_dir:
+            for path in args.inputs:
+                md_content = Path(path).read_text(encoding='utf-8')
+                times, sizes = [], []
+                for pipeline in (full, draft):
+                    # Proceso caliente: la primera vuelta no se cuenta (_timed se queda con la mejor)
+                    pipeline.render(md_content, Path(path).stem, output_dir)
+                    elapsed, html = _timed(pipeline.render, md_content, Path(path).stem, output_dir,
+                                           repeat=args.repeat)
+                    times.append(elapsed)
+                    sizes.append(len(html.encode('utf-8')) / 1024)
+                slow += times[1] * 1000 >= args.target
+                name = Path(path).name
+                print(f"{name[:32]:<32} {times[0] * 1000:>8.1f} {times[1] * 1000:>9.1f} {times[0] / times[1]:>7.1f}x "
+                      f"{sizes[0]:>8.1f} {sizes[1]:>9.1f}  {'ok' if times[1] * 1000 < args.target else 'SLOW'}")
+    finally:
+        full.close()
+        draft.close()
+    if slow:
+        sys.exit(1)
+
+
+# --- defer -------------------------------------------------------------------
+
+def _dom_nodes(soup):
+    """(live, inert) element and text nodes; the inert ones are the content of <template> elements."""
+    inert = sum(1 for template in soup.find_all('template') for _ in template.descendants)
+    return sum(1 for _ in soup.descendants) - inert, inert
+
+
+def _deferred_blocks_match(soup, reference):
+    """Every <template> body is a code block of the reference page and starts with the lines left visible."""
+    from bs4 import NavigableString
+    from bs4.element import TemplateString
+    from collapsible import DEFERRED_CODE_CLASS
+
+    blocks = {container.find('pre').get_text()
+              for container in reference.find_all('div', class_='collapsible-container')}
+    for template in soup.find_all('template', class_=DEFERRED_CODE_CLASS):
+        # El texto dentro de <template> es TemplateString: get_text() lo omite por defecto
+        full = template.find('pre').get_text(types=(NavigableString, TemplateString))
+        visible = template.find_previous_sibling('pre').get_text()
+        if full not in blocks or not full.startswith(visible):
+            return False
+    return True
+
+
+def _indexed_once(html, reference_html):
+    """The search index of the deferred page never scores a term above the page without <template>."""
+    from search_index import extract_document
+
+    terms, reference = extract_document(html)[2], extract_document(reference_html)[2]
+    return all(sum(scores.values()) <= sum(reference.get(term, {}).values()) for term, scores in terms.items())
+
+
+def bench_defer(args):
+    from pathlib import Path
+    from pipeline import Pipeline
+    from collapsible import DEFAULT_DEFER_LINES, DEFERRED_CODE_CLASS
+
+    eager = Pipeline(quiet=True)
+    deferred = Pipeline(quiet=True, defer_lines=args.lines or DEFAULT_DEFER_LINES)
+    print(f"{'Page':<32} {'blocks':>7} {'live nodes':>11} {'deferred':>9} {'%':>5} {'in template':>12} "
+          f"{'KB':>8} {'deferred':>9}  same")
+    totals = [0, 0, 0, 0]
+    failed = 0
+    try:
+        for path in args.inputs:
+            md_content = Path(path).read_text(encoding='utf-8')
+            pages = [p.render(md_content, Path(path).stem) for p in (eager, deferred)]
+            soups = [BeautifulSoup(page, 'html.parser') for page in pages]
+            (before, _), (after, inert) = _dom_nodes(soups[0]), _dom_nodes(soups[1])
+            sizes = [len(page.encode('utf-8')) / 1024 for page in pages]
+            # Los bloques coinciden y el índice de búsqueda no cuenta dos veces las líneas visibles
+            same = _deferred_blocks_match(soups[1], soups[0]) and _indexed_once(pages[1], pages[0])
+            failed += not same
+            blocks = len(soups[1].find_all('template', class_=DEFERRED_CODE_CLASS))
+            name = Path(path).name
+            print(f"{name[:32]:<32} {blocks:>7} {before:>11} {after:>9} {100 * after / max(before, 1):>5.0f} "
+                  f"{inert:>12} {sizes[0]:>8.1f} {sizes[1]:>9.1f}  {'yes' if same else 'NO'}")
+            for i, value in enumerate((before, after, sizes[0], sizes[1])):
+                totals[i] += value
+    finally:
+        eager.close()
+        deferred.close()
+    print(f"{'Total':<32} {'':>7} {totals[0]:>11} {totals[1]:>9} {100 * totals[1] / max(totals[0], 1):>5.0f} "
+          f"{'':>12} {totals[2]:>8.1f} {totals[3]:>9.1f}")
+    if failed:
+        sys.exit(1)
+
+
+def _editor_svg(shapes):
+    """Synthetic drawing as a vector editor saves it: metadata, nested groups, long floats, repeated styles."""
+    import random
+    rng = random.Random(49)
+    parts = ['<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n<!-- Created with Inkscape -->\n'
+             '<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape" '
+             'xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd" width="210mm" height="120mm" '
+             'viewBox="0 0 210.00001 120.00000" inkscape:version="1.2">\n'
+             '  <sodipodi:namedview id="base" pagecolor="#ffffff" inkscape:zoom="0.7"/>\n'
+             '  <metadata id="metadata1"><title>dibujo</title></metadata>\n'
+             '  <g inkscape:label="Capa 1" inkscape:groupmode="layer" id="layer1">\n']
+    styles = ['fill:#4a90d9;fill-opacity:1;stroke:#1f3a5f;stroke-width:0.26458334;stroke-opacity:1',
+              'fill:none;stroke:#333333;stroke-width:0.52916667;stroke-linecap:round;stroke-opacity:1',
+              'font-size:4.23333px;line-height:1.25;font-family:sans-serif;fill:#000000;stroke-width:0.26458']
+    for i in range(shapes):
+        x, y = rng.uniform(0, 200), rng.uniform(0, 110)
+        parts.append(f'    <g id="g{i}"><g>\n'
+                     f'      <rect style="{styles[0]}" id="rect{i}" width="{rng.uniform(5, 30)!r}" '
+                     f'height="{rng.uniform(5, 20)!r}" x="{x!r}" y="{y!r}" />\n'
+                     f'      <path style="{styles[1]}" d="M {x!r},{y!r} L {x + rng.uniform(1, 9)!r},'
+                     f'{y + rng.uniform(1, 9)!r}" id="path{i}" inkscape:connector-curvature="0" />\n'
+                     f'      <text style="{styles[2]}" x="{x!r}" y="{y - 1.5!r}" id="text{i}">n{i}</text>\n'
+                     f'    </g></g>\n')
+    parts.append('  </g>\n</svg>\n')
+    return ''.join(parts)
+
+
+def bench_svg(args):
+    import re
+    from pathlib import Path
+    from svg_optimize import DEFAULT_PRECISION, SvgCache, SvgOptimizer, equivalent, optimize_svg, rewrite_svg
+
+    precision = args.precision or DEFAULT_PRECISION
+    fence = re.compile(r'^```svg[^\n]*\n(.*?)^```', re.MULTILINE | re.DOTALL)
+    blocks = []
+    for note in sorted(Path(args.root).rglob('*.md')):
+        for i, match in enumerate(fence.finditer(note.read_text(encoding='utf-8')), 1):
+            blocks.append((f'{note.name} #{i}', match.group(1).strip()))
+    blocks.append((f'editor drawing ({args.shapes} shapes)', _editor_svg(args.shapes)))
+
+    print(f"{'SVG':<36} {'bytes':>8} {'optimized':>10} {'%':>5} {'cold ms':>8}  same")
+    totals = [0, 0]
+    failed = 0
+    for name, markup in blocks:
+        seconds, (optimized, reason) = _timed(optimize_svg, markup, precision, repeat=args.repeat)
+        before, after = len(markup.encode('utf-8')), len(optimized.encode('utf-8'))
+        # Equivalencia verificada aparte (optimize_svg ya la exige, salvo que devuelva el original)
+        same = reason is not None or equivalent(markup, optimized, rewrite_svg(markup, precision)[1])
+        failed += not same
+        totals[0] += before
+        totals[1] += after
+        print(f"{name[:36]:<36} {before:>8} {after:>10} {100 * (before - after) / max(before, 1):>5.0f} "
+              f"{seconds * 1000:>8.1f}  {'yes' if same else 'NO'}{f' (original: {reason})' if reason else ''}")
+    print(f"{'Total':<36} {totals[0]:>8} {totals[1]:>10} {100 * (totals[0] - totals[1]) / max(totals[0], 1):>5.0f}")
+
+    # Segunda build: todo sale de la caché por contenido
+    optimizer = SvgOptimizer(SvgCache(), precision)
+    for _, markup in blocks:
+        optimizer.optimize(markup)
+    seconds, _ = _timed(lambda: [optimizer.optimize(markup) for _, markup in blocks], repeat=args.repeat)
+    print(f"Cached: {len(blocks)} SVG in {seconds * 1000:.2f} ms ({optimizer.cache.hits} cache hits)")
+
+    # Lo que queda en la página final: inline_css.py resuelve (o no) los estilos después del optimizador
+    from pipeline import Pipeline
+    from svg_optimize import inline_svg_bytes
+    document = ''.join(f'## {name}\n\n```svg\n{markup}\n```\n\n' for name, markup in blocks)
+    print(f"{'Final page':<36} {'bytes':>8} {'optimized':>10} {'%':>5}")
+    for css_mode in ('static', 'critical', 'textarea'):
+        final = [inline_svg_bytes(Pipeline(quiet=True, skip_toc=True, css_mode=css_mode,
+                                           optimize_svg=optimize).render(document, 'svg'))
+                 for optimize in (False, True)]
+        failed += final[1] >= final[0]
+        print(f"{css_mode + ' CSS':<36} {final[0]:>8} {final[1]:>10} "
+              f"{100 * (final[0] - final[1]) / max(final[0], 1):>5.0f}")
+    if failed:
+        sys.exit(1)
+
+
+def bench_precache(args):
+    import json
+    import shutil
+    import tempfile
+    from pathlib import Path
+    from precache import MANIFEST_FILE, find_entries, update_manifest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp) / 'site'
+        # Solo lo que va al manifiesto: las páginas ya generadas y sus recursos
+        for path in find_entries(args.root):
+            target = root / path.relative_to(args.root)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, target)
+        if not root.exists():
+            print(f"No generated pages under {args.root} (run build.py first)")
+            sys.exit(1)
+
+        start = time.perf_counter()
+        cold = update_manifest(root, verbose=False)
+        cold_seconds = time.perf_counter() - start
+        warm_seconds, warm = _timed(update_manifest, root, verbose=False, repeat=args.repeat)
+
+        pages = sorted(root.rglob('*_final.html'))
+        edited = pages[:args.edits]
+        for page in edited:
+            with open(page, 'a', encoding='utf-8') as f:
+                f.write('<!-- bench -->\n')
+        start = time.perf_counter()
+        after = update_manifest(root, verbose=False)
+        edit_seconds = time.perf_counter() - start
+        entries = json.loads((root / MANIFEST_FILE).read_text(encoding='utf-8'))['entries']
+        refetched = sum(page.stat().st_size for page in edited)
+
+    print(f"Entries: {cold['entries']} ({cold['bytes'] / (1024 * 1024):.1f} MB, {len(entries)} in the manifest)")
+    print(f"Manifest update: cold {cold_seconds * 1000:.1f} ms ({cold['hashed']} hashed), "
+          f"unchanged {warm_seconds * 1000:.1f} ms ({warm['hashed']} hashed), "
+          f"after editing {len(edited)} pages {edit_seconds * 1000:.1f} ms ({after['hashed']} hashed)")
+    print(f"Service worker after the edit: {after['changed']} entries re-fetched, "
+          f"{refetched / 1024:.1f} KB of {after['bytes'] / 1024:.1f} KB "
+          f"({100 * refetched / max(after['bytes'], 1):.1f}%)")
+    if after['changed'] != len(edited) or warm['hashed']:
+        sys.exit(1)
+
+
+def _dead_dynamic_declarations(html):
+    """Declarations of <style id="dynamic-css"> that lose against the style attribute of an element they match."""
+    import json
+    from collapsible import RUNTIME_PROTOTYPES, RUNTIME_STYLES_ID
+    from critical_css import static_selector
+    from css_cascade import (ElementIndex, PSEUDO_ELEMENT_RE, iter_css_blocks, match_selector, parse_declarations,
+                             split_top_level)
+    from inline_css import DYNAMIC_STYLE_ID, shadows
+
+    soup = BeautifulSoup(html, 'html.parser')
+    style = soup.find('style', id=DYNAMIC_STYLE_ID)
+    if style is None:
+        return []
+    # Los botones que collapsible.py crea al cargar, con el style que les pone el script (runtime-styles)
+    runtime = soup.find('script', id=RUNTIME_STYLES_ID)
+    if runtime is not None:
+        styles = json.loads(runtime.string.replace('<\\/', '</'))
+        for state, markup in RUNTIME_PROTOTYPES.items():
+            prototype = BeautifulSoup(markup, 'html.parser').div
+            for child in prototype.find_all(True, recursive=False):
+                if child.get('class') and child['class'][0] in styles.get(state, {}):
+                    child['style'] = styles[state][child['class'][0]]
+            soup.body.append(prototype)
+
+    index = ElementIndex(soup)
+    dead = set()
+    for prelude, block in iter_css_blocks(style.string or ''):
+        declarations = parse_declarations(block)
+        for selector in split_top_level(prelude, ','):
+            selector = ' '.join(selector.split())
+            if not selector or PSEUDO_ELEMENT_RE.search(selector):
+                continue
+            for element in match_selector(index, static_selector(selector)):
+                inline = parse_declarations(element.get('style', ''))
+                for prop, _, important in declarations:
+                    # Gana el atributo si no es !important la regla, o si también lo es el atributo
+                    if any(shadows(prop, [other]) and (not important or inline_important)
+                           for other, _, inline_important in inline):
+                        dead.add(f'{selector} {{{prop}}}')
+    return sorted(dead)
+
+
+def bench_dynamic(args):
+    from pathlib import Path
+    from pipeline import Pipeline
+    from inline_css import DYNAMIC_STYLE_ID
+
+    pipeline = Pipeline(quiet=True)
+    print(f"{'Page':<32} {'rules':>6} {'dead':>5}  examples")
+    failed = 0
+    try:
+        for path in args.inputs:
+            page = pipeline.render(Path(path).read_text(encoding='utf-8'), Path(path).stem)
+            style = BeautifulSoup(page, 'html.parser').find('style', id=DYNAMIC_STYLE_ID)
+            rules = (style.string or '').count('{') if style is not None else 0
+            dead = _dead_dynamic_declarations(page)
+            failed += bool(dead)
+            print(f"{Path(path).name[:32]:<32} {rules:>6} {len(dead):>5}  {', '.join(dead[:3])}")
+    finally:
+        pipeline.close()
+    if failed:
+        sys.exit(1)
+
+
+def _computed_styles(soup):
+    """
+    Style of every element as a browser would compute it from the style
+    attributes alone: declared, else inherited from the parent, else 'ua' for
+    what the browser sets on the element and 'initial' for the rest (values
+    equal to the initial value count as 'initial').
+    """
+    from css_cascade import parse_declarations
+    from inline_css import FORM_TAGS, INHERITED_INITIAL, INHERITED_PROPERTIES, INITIAL_VALUES, UA_INHERITED
+
+    computed = {}
+    styles = []
+    for element in soup.find_all(True):
+        declared = {prop: ' '.join(value.split()).lower()
+                    for prop, value, _ in parse_declarations(element.get('style', ''))}
+        parent = computed.get(id(element.parent), {})
+        style = {}
+        for prop in INHERITED_PROPERTIES | set(declared) | set(parent):
+            if prop in declared:
+                value = declared[prop]
+            elif element.name in FORM_TAGS or prop in UA_INHERITED.get(element.name, ()):
+                value = 'ua'
+            elif prop in INHERITED_PROPERTIES:
+                value = parent.get(prop, 'initial')
+            else:
+                continue
+            if value in INHERITED_INITIAL.get(prop, ()) or value in INITIAL_VALUES.get(prop, ()):
+                value = 'initial'
+            style[prop] = value
+        computed[id(element)] = style
+        styles.append((element, style))
+    return styles
+
+
+def bench_static(args):
+    import copy
+    from pathlib import Path
+    from pipeline import Pipeline
+    from inline_css import apply_static_styles
+
+    modes = ('static', 'critical', 'textarea')
+    pipelines = {mode: Pipeline(quiet=True, css_mode=mode) for mode in modes}
+    print(f"{'Page':<32} {'static KB':>9} {'full KB':>8} {'critical':>9} {'textarea':>9}  same")
+    failed = 0
+    try:
+        for path in args.inputs:
+            md_content = Path(path).read_text(encoding='utf-8')
+            pages = {mode: pipeline.render(md_content, Path(path).stem) for mode, pipeline in pipelines.items()}
+            # La misma página antes de resolver la cascada: el cuerpo y el CSS de la versión textarea
+            soup = BeautifulSoup(pages['textarea'], 'html.parser')
+            editor = soup.find('textarea', id='css-editor')
+            css = editor.string or ''
+            editor.decompose()
+            full, minimal = copy.copy(soup), copy.copy(soup)
+            apply_static_styles(full, css, minimal=False)
+            apply_static_styles(minimal, css)
+            different = [f"<{element.name}> {prop}"
+                         for (element, a), (_, b) in zip(_computed_styles(full), _computed_styles(minimal))
+                         for prop in set(a) | set(b) if a.get(prop, 'initial') != b.get(prop, 'initial')]
+            failed += bool(different)
+            kb = lambda html: len(str(html).encode('utf-8')) / 1024
+            print(f"{Path(path).name[:32]:<32} {kb(pages['static']):>9.1f} {kb(full.prettify()):>8.1f} "
+                  f"{kb(pages['critical']):>9.1f} {kb(pages['textarea']):>9.1f}  "
+                  f"{'yes' if not different else 'NO ' + ', '.join(sorted(set(different))[:3])}")
+    finally:
+        for pipeline in pipelines.values():
+            pipeline.close()
+    if failed:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks for the notes processing pipeline.')
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    p = subparsers.add_parser('mermaid', help='Mermaid block detection (add_graphs.py)')
+    p.add_argument('-n', '--blocks', type=int, default=1000, help='Number of <pre> blocks (default: 1000)')
+    p.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions, best time is reported (default: 3)')
+    p.add_argument('--skip-legacy', action='store_true', help='Do not time the previous implementation')
+    p.set_defaults(func=bench_mermaid)
+
+    p = subparsers.add_parser('serve', help='Load test of the preview server (serve.py)')
+    p.add_argument('root', nargs='?', default='notes', help='Directory to serve (default: notes)')
+    p.add_argument('-c', '--clients', type=int, default=50, help='Concurrent clients (default: 50)')
+    p.add_argument('-n', '--requests', type=int, default=100, help='Requests per client (default: 100)')
+    p.add_argument('--pages', type=int, default=20, help='Distinct pages requested (default: 20)')
+    p.add_argument('--gzip', action='store_true', help='Send Accept-Encoding: gzip')
+    p.set_defaults(func=bench_serve)
+
+    p = subparsers.add_parser('search', help='Search index size and query latency (search_index.py)')
+    p.add_argument('root', nargs='?', default='notes', help='Directory with the rendered notes (default: notes)')
+    p.add_argument('-r', '--repeat', type=int, default=100, help='Warm query repetitions (default: 100)')
+    p.set_defaults(func=bench_search)
+
+    p = subparsers.add_parser('render', help='Cold md2html.sh vs warm render_server.py requests')
+    p.add_argument('input', nargs='?', default='notes/Prog3/react/reactrouter.md',
+                   help='Markdown note to render (default: notes/Prog3/react/reactrouter.md)')
+    p.add_argument('--cold', type=int, default=3, help='md2html.sh runs (default: 3)')
+    p.add_argument('-n', '--requests', type=int, default=10, help='Requests per client (default: 10)')
+    p.add_argument('-c', '--clients', type=int, default=4, help='Concurrent clients (default: 4)')
+    p.add_argument('-w', '--workers', type=int, default=4, help='Server worker processes (default: 4)')
+    p.set_defaults(func=bench_render)
+
+    p = subparsers.add_parser('sections', help='Section cache after a one-section edit (md2html.py)')
+    p.add_argument('input', nargs='?', default='notes/Prog3/react/reactrouter.md',
+                   help='Markdown note (default: notes/Prog3/react/reactrouter.md)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='Repetitions, best time is reported (default: 5)')
+    p.set_defaults(func=bench_sections)
+
+    p = subparsers.add_parser('highlight', help='Compact Pygments formatter: DOM nodes and bytes per page')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md'],
+                   help='Markdown notes to render (default: three reference notes)')
+    p.add_argument('--skip-check', action='store_true', help='Do not compare the resolved style of every character')
+    p.set_defaults(func=bench_highlight)
+
+    p = subparsers.add_parser('stream', help='Peak memory of the streaming conversion (pipeline.py --stream)')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md'],
+                   help='Notes concatenated into the synthetic note (default: three reference notes)')
+    p.add_argument('-s', '--size', type=float, default=100, help='Synthetic note size in MB (default: 100)')
+    p.add_argument('--full-size', type=float, nargs='*', default=[2],
+                   help='Sizes in MB for the in-memory conversion, which needs the whole document '
+                        '(default: 2; none to skip)')
+    p.set_defaults(func=bench_stream)
+
+    p = subparsers.add_parser('critical', help='Critical CSS split: bytes and first-screen check (inline_css.py)')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md', 'notes/Prog4/apuntes_typescript_parte_1.md'],
+                   help='Markdown notes to render (default: four reference notes)')
+    p.set_defaults(func=bench_critical)
+
+    p = subparsers.add_parser('batch', help='Per-block vs batched highlighting of code blocks (batch_highlight.py)')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md', 'notes/Prog4/apuntes_typescript_parte_1.md'],
+                   help='Markdown notes whose code blocks are highlighted (default: four reference notes)')
+    p.add_argument('-n', '--snippets', type=int, default=2000,
+                   help='Short snippets in the synthetic page (default: 2000)')
+    p.add_argument('--max-lines', type=int, default=5, help='Lines of a short snippet (default: 5)')
+    p.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions, best time is reported (default: 3)')
+    p.set_defaults(func=bench_batch)
+
+    p = subparsers.add_parser('draft', help='Draft profile vs full pipeline, warm render time per note (pipeline.py)')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md', 'notes/Prog4/apuntes_typescript_parte_1.md',
+                                                 'notes/BdDII/grafos/Parte4-Modelado.md'],
+                   help='Markdown notes to render (default: five reference notes, the largest included)')
+    p.add_argument('-r', '--repeat', type=int, default=5, help='Repetitions, best time is reported (default: 5)')
+    p.add_argument('--target', type=float, default=100, help='Draft time target in ms (default: 100)')
+    p.set_defaults(func=bench_draft)
+
+    p = subparsers.add_parser('defer', help='Live DOM nodes with deferred code block bodies (collapsible.py)')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md', 'notes/Prog4/apuntes_typescript_parte_1.md',
+                                                 'notes/BdDII/grafos/Parte4-Modelado.md'],
+                   help='Markdown notes to render (default: five reference notes)')
+    p.add_argument('-l', '--lines', type=int,
+                   help='Defer the collapsed blocks with more than this many lines (default: as --defer-code)')
+    p.set_defaults(func=bench_defer)
+
+    p = subparsers.add_parser('svg', help='Bytes saved by the inline SVG optimizer (svg_optimize.py)')
+    p.add_argument('root', nargs='?', default='notes', help='Directory with the Markdown notes (default: notes)')
+    p.add_argument('--shapes', type=int, default=200,
+                   help='Shapes of the synthetic editor-style drawing (default: 200)')
+    p.add_argument('-p', '--precision', type=int,
+                   help='Significant digits relative to the drawing size (default: as svg_optimize.py)')
+    p.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions, best time is reported (default: 3)')
+    p.set_defaults(func=bench_svg)
+
+    p = subparsers.add_parser('precache', help='Precache manifest updates and service worker re-fetches (precache.py)')
+    p.add_argument('root', nargs='?', default='notes', help='Directory with the rendered notes (default: notes)')
+    p.add_argument('-e', '--edits', type=int, default=1, help='Pages edited before the incremental update (default: 1)')
+    p.add_argument('-r', '--repeat', type=int, default=3, help='Repetitions, best time is reported (default: 3)')
+    p.set_defaults(func=bench_precache)
+
+    p = subparsers.add_parser('dynamic', help='Dead :hover rules of the static CSS mode (inline_css.py)')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog3/react/reactrouter.md', 'notes/Prog4/objetos.md',
+                                                 'notes/BdDII/grafos/grafos.md'],
+                   help='Markdown notes to render (default: three reference notes)')
+    p.set_defaults(func=bench_dynamic)
+
+    p = subparsers.add_parser('static', help='Page weight of the static CSS mode (inline_css.py) and its check')
+    p.add_argument('inputs', nargs='*', default=['notes/Prog4/apuntes_typescript_parte_1.md', 'notes/Prog4/objetos.md',
+                                                 'notes/Prog3/react/reactrouter.md'],
+                   help='Markdown notes to render (default: three reference notes)')
+    p.set_defaults(func=bench_static)
+
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.print_help()
+        sys.exit(1)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
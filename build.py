@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+build.py - Batch build of the notes with a metrics report
+
+Renders every Markdown note under the given paths (default: notes) with the
+in-memory pipeline (pipeline.py) in parallel worker processes, and writes each
+page to <note dir>/html_output/<name>_final.html (only when it changed;
+<name>_draft.html with --draft).
+
+After every run it writes a metrics report (build_metrics.py) with counters
+per document: code blocks by language, lexer fallbacks, section cache hits,
+collapsible blocks, CSS rules before/after merging, Mermaid blocks and bytes
+and time per stage. The report is written as <prefix>.json and as
+<prefix>.prom (Prometheus text format).
+
+The notes are handed to the workers most expensive first, with the cost
+estimated from the build times of previous runs (build_schedule.py, kept in
+--history), and the predicted total time is reported next to the actual one.
+With --watch the builder keeps running and rebuilds the notes that change;
+edited notes jump ahead of the ones still waiting.
+
+The search index (search_index.py) at the root of the notes is updated
+after every run as well; only the pages that changed are tokenized again.
+
+With --offline the pages register a service worker, and the precache
+manifest at the root of the notes is updated after every run (precache.py),
+so the site can be read without a connection.
+
+Usage:
+    python build.py [notes ...] [-j 4] [--metrics build_metrics] [--skip-collapsible] [--skip-toc]
+                    [--critical-css | --textarea-css] [--themes monokai ...] [--draft] [--defer-code [20]]
+                    [--no-optimize-svg] [--offline]
+                    [--history .build_history.json] [--watch [--interval 1]]
+"""
+
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import build_metrics
+from build_schedule import DEFAULT_HISTORY, BuildHistory, NotesWatcher, Scheduler, predict_total
+from collapsible import DEFAULT_DEFER_LINES
+from output_utils import write_if_changed
+from precache import add_registration, site_root, update_manifest
+from search_index import build_index
+
+DEFAULT_METRICS = 'build_metrics'
+OUTPUT_DIRNAME = 'html_output'
+
+
+def find_notes(paths):
+    """Markdown files under paths (files are taken as they are), in a stable order."""
+    notes = []
+    for path in map(Path, paths):
+        if path.is_file():
+            notes.append(path)
+        elif path.is_dir():
+            notes.extend(p for p in path.rglob('*.md') if OUTPUT_DIRNAME not in p.parts)
+    return sorted(set(notes))
+
+
+# --- procesos de trabajo ---------------------------------------------------------
+
+_pipeline = None
+_offline_root = None
+
+
+def _init_worker(options, offline_root=None):
+    global _pipeline, _offline_root
+    from pipeline import Pipeline
+    _pipeline = Pipeline(quiet=True, **options)
+    _offline_root = offline_root
+
+
+def _build_task(md_path):
+    """Build one note. Returns (md_path, output_path, changed, metrics, error)."""
+    from pipeline import default_output_path
+
+    output_path = default_output_path(md_path, 'draft' if _pipeline.draft else 'final')
+    with build_metrics.collecting(md_path) as metrics:
+        try:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            html = _pipeline.render_file(md_path, output_path.parent)
+            if _offline_root is not None:
+                html = add_registration(html, output_path, _offline_root)
+            changed = write_if_changed(output_path, html)
+        except Exception as e:
+            return str(md_path), str(output_path), False, metrics.as_dict(), f'{type(e).__name__}: {e}'
+    return str(md_path), str(output_path), changed, metrics.as_dict(), None
+
+
+class Builder:
+    """Warm worker processes that build the notes handed out by a Scheduler."""
+
+    def __init__(self, jobs=None, options=None, offline_root=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        options = options or {}
+        if self.jobs == 1:
+            _init_worker(options, offline_root)
+            self.executor = None
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_worker,
+                                                initargs=(options, offline_root))
+
+    def run(self, scheduler, poll=None, interval=1.0):
+        """
+        Build until the scheduler is empty; yields the results of _build_task as they finish.
+
+        Only as many notes as workers are submitted at a time, so the next one
+        is chosen by the scheduler when a worker gets free (after poll() has
+        queued the notes edited meanwhile).
+        """
+        if self.executor is None:
+            while scheduler:
+                yield _build_task(scheduler.pop())
+                if poll:
+                    poll()
+            return
+        running = set()
+        while scheduler or running:
+            while scheduler and len(running) < self.jobs:
+                running.add(self.executor.submit(_build_task, scheduler.pop()))
+            done, running = wait(running, timeout=interval if poll else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            if poll:
+                poll()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        elif _pipeline is not None:
+            _pipeline.close()
+
+
+def print_summary(documents, top=5):
+    """Most expensive documents and most used languages of the run."""
+    seconds = lambda d: sum(d['metrics'].get('stage_seconds', {}).values())
+    print("\nDocumentos más costosos:")
+    for document in sorted(documents, key=seconds, reverse=True)[:top]:
+        final_bytes = document['metrics'].get('stage_bytes', {}).get('inline_css', 0)
+        print(f"  {seconds(document) * 1000:7.0f} ms  {final_bytes / 1024:7.1f} KB  {document['document']}")
+    languages = build_metrics.totals(documents).get('code_blocks', {})
+    if languages:
+        print("Bloques de código por lenguaje: " + ', '.join(
+            f"{language} {count}" for language, count in sorted(languages.items(), key=lambda i: -i[1])[:top * 2]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera todos los apuntes y un reporte de métricas por documento.')
+    parser.add_argument('paths', nargs='*', default=['notes'], help='Archivos o directorios (por defecto: notes)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help='Procesos en paralelo (por defecto: número de CPUs)')
+    parser.add_argument('--metrics', default=DEFAULT_METRICS,
+                        help=f'Prefijo del reporte de métricas (por defecto: {DEFAULT_METRICS} -> .json y .prom)')
+    parser.add_argument('--skip-collapsible', action='store_true', help='Omitir los bloques colapsables')
+    parser.add_argument('--skip-toc', action='store_true', help='Omitir la tabla de contenidos')
+    css_mode = parser.add_mutually_exclusive_group()
+    css_mode.add_argument('--critical-css', dest='css_mode', action='store_const', const='critical', default='static',
+                          help='CSS de la primera pantalla en el <head> y el resto después del primer pintado '
+                               '(páginas ~30%% más livianas que con atributos style, si el host conserva los <style>)')
+    css_mode.add_argument('--textarea-css', dest='css_mode', action='store_const', const='textarea',
+                          help='Alternativa: CSS en el <textarea> css-editor, inyectado con JS al cargar')
+    parser.add_argument('--themes', nargs='+', default=[], metavar='STYLE',
+                        help='Estilos de Pygments adicionales como temas alternativos (p. ej. --themes monokai)')
+    parser.add_argument('--draft', action='store_true',
+                        help='Vista previa rápida (pipeline.py --draft): código sin resaltar, sin colapsables ni CSS inline')
+    parser.add_argument('--defer-code', type=int, nargs='?', const=DEFAULT_DEFER_LINES, metavar='LÍNEAS',
+                        help='Bloques colapsados de más de LÍNEAS líneas: el cuerpo completo en un <template> '
+                             f'hasta el primer clic (por defecto: {DEFAULT_DEFER_LINES})')
+    parser.add_argument('--no-optimize-svg', action='store_true',
+                        help='Dejar el SVG de los bloques ```svg tal como está escrito (ver svg_optimize.py)')
+    parser.add_argument('--offline', action='store_true',
+                        help='Service worker y manifiesto de precarga en la raíz de los apuntes (ver precache.py)')
+    parser.add_argument('--history', default=DEFAULT_HISTORY,
+                        help=f'Historial de tiempos por documento para ordenar los builds (por defecto: {DEFAULT_HISTORY})')
+    parser.add_argument('--watch', action='store_true',
+                        help='Seguir corriendo y regenerar los apuntes que cambian (los editados pasan primero)')
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Segundos entre revisiones de cambios con --watch (por defecto: 1)')
+    args = parser.parse_args()
+
+    notes = find_notes(args.paths)
+    if not notes:
+        print("No se encontraron archivos Markdown.")
+        sys.exit(1)
+
+    options = {'skip_collapsible': args.skip_collapsible, 'skip_toc': args.skip_toc,
+               'css_mode': args.css_mode, 'themes': args.themes, 'draft': args.draft,
+               'defer_lines': args.defer_code, 'optimize_svg': not args.no_optimize_svg}
+    jobs = max(1, args.jobs or 1)
+    if not args.watch:
+        jobs = min(jobs, len(notes))
+
+    # Lo más costoso primero, según el historial de builds anteriores
+    history = BuildHistory(args.history)
+    scheduler = Scheduler(history)
+    for note in notes:
+        scheduler.add(note)
+    costs = scheduler.costs()
+    predicted = predict_total(costs, jobs) if costs is not None else None
+    if predicted is None:
+        print(f"Generando {len(notes)} apuntes con {jobs} procesos (sin historial: primero los más grandes)...")
+    else:
+        in_order = predict_total(scheduler.costs(notes), jobs)
+        print(f"Generando {len(notes)} apuntes con {jobs} procesos "
+              f"(estimado: {predicted:.1f} s; en orden alfabético serían {in_order:.1f} s)...")
+
+    root = site_root(args.paths)
+    offline_root = root if args.offline else None
+    watcher = NotesWatcher(find_notes, args.paths) if args.watch else None
+
+    def queue_edited():
+        for note, mtime in watcher.poll():
+            scheduler.add(note, edited_at=mtime)
+
+    def build(poll=None):
+        """Build what the scheduler has; returns (documents, written, errors)."""
+        documents = []
+        written = errors = 0
+        for md_path, output_path, changed, metrics, error in builder.run(scheduler, poll, args.interval):
+            documents.append(metrics)
+            if error:
+                errors += 1
+                print(f"  Error en {md_path}: {error}")
+                continue
+            written += changed
+            elapsed = sum(metrics['metrics'].get('stage_seconds', {}).values())
+            estimate = scheduler.estimates.get(md_path)
+            estimated = f', estimado {estimate * 1000:.0f} ms' if estimate is not None else ''
+            print(f"  {output_path} ({elapsed * 1000:.0f} ms{estimated}{'' if changed else ', sin cambios'})")
+            history.record(md_path, os.path.getsize(md_path), elapsed)
+        history.save()
+        if not args.draft:
+            # Índice de búsqueda sobre las páginas *_final.html: solo se releen las que cambiaron
+            index = build_index(root, verbose=False)
+            print(f"Índice de búsqueda: {index['pages']} páginas, {index['updated']} actualizadas, "
+                  f"{index['removed']} eliminadas, {index['shards_written']} shards escritos")
+        if offline_root is not None:
+            # Solo se releen los archivos que cambiaron desde la última vez
+            update_manifest(offline_root)
+        return documents, written, errors
+
+    def build_and_report(predicted=None):
+        """Run build() and write the metrics report of that run; returns the number of errors."""
+        start = time.perf_counter()
+        documents, written, errors = build(queue_edited if watcher else None)
+        elapsed = time.perf_counter() - start
+
+        json_path, prom_path = build_metrics.write_reports(documents, args.metrics, {
+            'elapsed_s': round(elapsed, 3), 'predicted_s': None if predicted is None else round(predicted, 3),
+            'jobs': jobs, 'documents_built': len(documents) - errors, 'documents_written': written,
+            'errors': errors,
+        })
+        print_summary(documents)
+        estimated = f", estimado {predicted:.1f} s" if predicted is not None else ''
+        print(f"\n{len(documents) - errors} apuntes en {elapsed:.1f} s{estimated} ({written} escritos, "
+              f"{errors} errores). Métricas: {json_path}, {prom_path}")
+        return errors
+
+    builder = Builder(jobs, options, offline_root)
+    try:
+        errors = build_and_report(predicted)
+
+        if watcher:
+            print(f"Esperando cambios en {', '.join(args.paths)} (Ctrl+C para salir)...")
+            while True:
+                time.sleep(args.interval)
+                queue_edited()
+                if scheduler:
+                    # El reporte de métricas corresponde siempre a la última regeneración
+                    build_and_report()
+    except KeyboardInterrupt:
+        print("\nDetenido.")
+        return
+    finally:
+        builder.close()
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
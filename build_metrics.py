@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+build_metrics.py - Per-document counters for batch builds
+
+The pipeline stages report what they did through incr() / record() while a
+document is being built inside collecting(); outside of it the calls do
+nothing, so the CLIs and the render server pay nothing. build.py gathers the
+counters of every document and writes them with write_reports() as JSON and
+in the Prometheus text exposition format.
+
+Usage:
+    with build_metrics.collecting('notes/Prog4/objetos.md') as metrics:
+        html = pipeline.render_file('notes/Prog4/objetos.md')
+    build_metrics.write_reports([metrics.as_dict()], 'build_metrics')
+    # -> build_metrics.json, build_metrics.prom
+"""
+
+import json
+import time
+import contextlib
+
+from output_utils import write_if_changed
+
+PROMETHEUS_PREFIX = 'md2html_'
+
+# nombre -> (tipo, etiquetas, descripción)
+METRICS = {
+    'code_blocks': ('counter', ('language',), 'Fenced code blocks by language'),
+    'lexer_fallbacks': ('counter', ('reason', 'language'),
+                        'Code blocks not highlighted with their own lexer (no_lexer, highlight_error, plain_pre)'),
+    'section_cache_hits': ('counter', (), 'Sections (and their code blocks) reused from the section cache'),
+    'section_cache_misses': ('counter', (), 'Sections rendered and highlighted again'),
+    'collapsible_blocks': ('counter', (), '<pre> blocks wrapped by collapsible.py'),
+    'deferred_code_blocks': ('counter', (), 'Collapsed blocks whose full body waits in a <template> (--defer-code)'),
+    'css_rules_before': ('gauge', (), 'CSS rules passed to fusionar_reglas (one per selector)'),
+    'css_rules_after': ('gauge', (), 'CSS rules left after fusionar_reglas'),
+    'css_bytes': ('gauge', ('kind',), 'Critical (<head>) and deferred CSS with inline_css.py --css-mode critical'),
+    'mermaid_blocks': ('counter', (), 'Mermaid diagrams found'),
+    'svg_bytes': ('counter', ('kind',), 'Inline SVG before and after svg_optimize.py and in the final page (UTF-8 bytes)'),
+    'stage_bytes': ('gauge', ('stage',), 'Size of the document after each stage (UTF-8 bytes)'),
+    'stage_seconds': ('gauge', ('stage',), 'Time spent in each stage'),
+}
+
+
+class DocumentMetrics:
+    """Counters of one document: {metric: {label values tuple: value}}."""
+
+    def __init__(self, document):
+        self.document = str(document)
+        self.values = {}
+
+    def incr(self, metric, *labels, amount=1):
+        series = self.values.setdefault(metric, {})
+        series[labels] = series.get(labels, 0) + amount
+
+    def record(self, metric, value, *labels):
+        self.values.setdefault(metric, {})[labels] = value
+
+    def as_dict(self):
+        """JSON-friendly form: label values become nested keys."""
+        result = {}
+        for metric, series in sorted(self.values.items()):
+            for labels, value in sorted(series.items()):
+                if not labels:
+                    result[metric] = value
+                    continue
+                node = result.setdefault(metric, {})
+                for label in labels[:-1]:
+                    node = node.setdefault(label, {})
+                node[labels[-1]] = value
+        return {'document': self.document, 'metrics': result}
+
+
+_current = None
+_recorders = []
+
+
+@contextlib.contextmanager
+def collecting(document):
+    """Collect the counters reported while building document."""
+    global _current
+    previous, _current = _current, DocumentMetrics(document)
+    try:
+        yield _current
+    finally:
+        _current = previous
+
+
+@contextlib.contextmanager
+def recording():
+    """
+    Keep the incr() calls made inside the block (whether or not a document is
+    being collected) as [[metric, labels, amount]], for replay().
+    """
+    events = []
+    _recorders.append(events)
+    try:
+        yield events
+    finally:
+        _recorders.remove(events)
+
+
+def replay(events):
+    """Count again the incr() calls kept by recording() (e.g. for a cached section)."""
+    for metric, labels, amount in events:
+        incr(metric, *labels, amount=amount)
+
+
+def incr(metric, *labels, amount=1):
+    for events in _recorders:
+        events.append([metric, list(labels), amount])
+    if _current is not None:
+        _current.incr(metric, *labels, amount=amount)
+
+
+def record(metric, value, *labels):
+    if _current is not None:
+        _current.record(metric, value, *labels)
+
+
+def _flatten(value, labels=()):
+    """Yield (label values, number) from a value of DocumentMetrics.as_dict()."""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            yield from _flatten(child, labels + (key,))
+    else:
+        yield labels, value
+
+
+def totals(documents):
+    """Sum every series over the documents (same shape as one document)."""
+    summed = DocumentMetrics('total')
+    for document in documents:
+        for metric, value in document['metrics'].items():
+            for labels, number in _flatten(value):
+                summed.incr(metric, *labels, amount=number)
+    return summed.as_dict()['metrics']
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def prometheus_text(documents):
+    """Prometheus text exposition format, one series per document and label set."""
+    lines = []
+    for metric, (kind, label_names, description) in METRICS.items():
+        samples = []
+        for document in documents:
+            value = document['metrics'].get(metric)
+            if value is None:
+                continue
+            for labels, number in _flatten(value):
+                pairs = [('document', document['document'])] + list(zip(label_names, labels))
+                label_text = ','.join(f'{name}="{_escape_label(v)}"' for name, v in pairs)
+                samples.append(f'{PROMETHEUS_PREFIX}{metric}{{{label_text}}} {number:g}')
+        if samples:
+            name = PROMETHEUS_PREFIX + metric
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+    return '\n'.join(lines) + '\n'
+
+
+def write_reports(documents, prefix, extra=None):
+    """Write <prefix>.json and <prefix>.prom; returns the two paths."""
+    report = {
+        'generated': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        **(extra or {}),
+        'totals': totals(documents),
+        'documents': documents,
+    }
+    json_path, prom_path = f'{prefix}.json', f'{prefix}.prom'
+    write_if_changed(json_path, json.dumps(report, indent=2, ensure_ascii=False) + '\n')
+    write_if_changed(prom_path, prometheus_text(documents))
+    return json_path, prom_path
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+build_schedule.py - Order the notes of a batch build by their expected cost
+
+In a parallel build the total time is set by the documents that finish last.
+Starting the most expensive documents first (longest processing time first)
+keeps a few huge notes from starting at the end while the other workers sit
+idle. The cost of each note is estimated from a small history of previous
+builds (build time and input size per document), kept in a JSON file:
+
+  - a note built before: its median seconds per byte times its current size
+  - a new note: the median rate of all the known notes times its size
+  - no history at all: its size (same order, no time estimate)
+
+In watch mode (build.py --watch) the notes edited while the build runs jump
+the queue, most recent edit first.
+
+Usage:
+    history = BuildHistory('.build_history.json')
+    scheduler = Scheduler(history)
+    for note in notes:
+        scheduler.add(note)
+    predicted = predict_total(scheduler.costs(), jobs=4)
+    while scheduler:
+        note = scheduler.pop()
+"""
+
+import json
+import heapq
+import statistics
+from pathlib import Path
+
+from output_utils import write_if_changed
+
+DEFAULT_HISTORY = '.build_history.json'
+# Builds recordadas por documento (las más recientes)
+HISTORY_RUNS = 5
+
+
+def _size(note):
+    try:
+        return Path(note).stat().st_size
+    except OSError:
+        return 0
+
+
+class BuildHistory:
+    """Build time and input size of the last builds of every document."""
+
+    def __init__(self, path=DEFAULT_HISTORY):
+        self.path = Path(path)
+        self.documents = {}  # documento -> [[bytes, segundos], ...]
+        if self.path.exists():
+            try:
+                self.documents = json.loads(self.path.read_text(encoding='utf-8')).get('documents', {})
+            except (OSError, ValueError):
+                print(f"Warning: historial de builds ilegible ({self.path}); se empieza de cero")
+
+    def record(self, document, size, seconds):
+        runs = self.documents.setdefault(str(document), [])
+        runs.append([size, round(seconds, 4)])
+        del runs[:-HISTORY_RUNS]
+
+    def _rate(self, runs):
+        """Median seconds per byte of some runs (None without usable runs)."""
+        rates = [seconds / size for size, seconds in runs if size > 0]
+        return statistics.median(rates) if rates else None
+
+    def rate(self):
+        """Median seconds per byte over every known document (None without history)."""
+        rates = [rate for rate in map(self._rate, self.documents.values()) if rate is not None]
+        return statistics.median(rates) if rates else None
+
+    def estimate(self, document, size):
+        """Expected build seconds of a document of size bytes (None without history)."""
+        rate = self._rate(self.documents.get(str(document), []))
+        if rate is None:
+            rate = self.rate()
+        return None if rate is None else rate * size
+
+    def save(self):
+        data = {'documents': {document: runs for document, runs in sorted(self.documents.items())}}
+        write_if_changed(self.path, json.dumps(data, indent=1) + '\n')
+
+
+class Scheduler:
+    """Pending notes; pop() returns the edited ones first, then the most expensive."""
+
+    def __init__(self, history):
+        self.history = history
+        self.pending = {}    # nota -> (momento de la edición o None, costo)
+        self.estimates = {}  # nota -> segundos estimados (None sin historial)
+
+    def add(self, note, edited_at=None):
+        """Queue a note (again); edited_at (an mtime) puts it ahead of the notes that were not edited."""
+        note = str(note)
+        size = _size(note)
+        estimate = self.history.estimate(note, size)
+        self.estimates[note] = estimate
+        previous = self.pending.get(note, (None, 0))[0]
+        if edited_at is None:
+            edited_at = previous
+        elif previous is not None:
+            edited_at = max(edited_at, previous)
+        self.pending[note] = (edited_at, size if estimate is None else estimate)
+
+    def _key(self, note):
+        edited_at, cost = self.pending[note]
+        # Primero lo editado (lo más reciente antes), después lo más costoso
+        return (edited_at is not None, edited_at or 0, cost)
+
+    def order(self):
+        """Pending notes in the order pop() would return them."""
+        return sorted(self.pending, key=self._key, reverse=True)
+
+    def pop(self):
+        note = max(self.pending, key=self._key)
+        del self.pending[note]
+        return note
+
+    def costs(self, notes=None):
+        """Estimated seconds of notes (default: the pending ones, in order); None if one is unknown."""
+        estimates = [self.estimates.get(str(note)) for note in (self.order() if notes is None else notes)]
+        return None if any(e is None for e in estimates) else estimates
+
+    def __len__(self):
+        return len(self.pending)
+
+
+def predict_total(costs, jobs):
+    """Wall time of running costs in that order on jobs workers (each job to the first free worker)."""
+    if not costs:
+        return 0.0
+    workers = [0.0] * max(1, min(jobs, len(costs)))
+    for cost in costs:
+        heapq.heappush(workers, heapq.heappop(workers) + cost)
+    return max(workers)
+
+
+class NotesWatcher:
+    """Polls the modification time of the notes found by find_notes(paths)."""
+
+    def __init__(self, find_notes, paths):
+        self.find_notes = find_notes
+        self.paths = paths
+        self.mtimes = self._scan()
+
+    def _scan(self):
+        mtimes = {}
+        for note in self.find_notes(self.paths):
+            try:
+                mtimes[str(note)] = note.stat().st_mtime
+            except OSError:
+                pass
+        return mtimes
+
+    def poll(self):
+        """[(note, mtime)] of the notes created or modified since the last poll."""
+        mtimes = self._scan()
+        edited = [(note, mtime) for note, mtime in mtimes.items() if self.mtimes.get(note) != mtime]
+        self.mtimes = mtimes
+        return edited
@@ -1,12 +1,30 @@
 #!/usr/bin/env python3
 import sys
 import os
+import copy
 import argparse
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, NavigableString
+
+import build_metrics
+from output_utils import write_if_changed
 
 # --- CONFIGURACIÓN POR DEFECTO ---
 DEFAULT_MAX_LINES = 6
 CSS_ID = "collapsible-styles"
+RUNTIME_STYLES_ID = "runtime-styles"
+# Bloques diferidos: solo las primeras líneas en el DOM, el cuerpo completo en un <template>
+DEFERRED_CODE_CLASS = "deferred-code"
+DEFAULT_DEFER_LINES = 20
+
+# Elementos que crea COLLAPSIBLE_JS, por estado del contenedor. inline_css.py
+# --css-mode static resuelve sus estilos al generar la página y los deja en
+# <script id="runtime-styles"> para que el JS los aplique al crearlos.
+RUNTIME_PROTOTYPES = {
+    state: f'''<div class="collapsible-container {state}"><pre></pre>
+<button class="copy-button"></button><button class="toggle-button"></button>
+<div class="fade-overlay"></div><div class="ellipsis"></div></div>'''
+    for state in ('collapsed', 'expanded')
+}
 
 # CSS y JS a inyectar en el <head>
 COLLAPSIBLE_CSS = """
@@ -94,12 +112,32 @@ COLLAPSIBLE_CSS = """
 """
 
 COLLAPSIBLE_JS = """(function() {
-  function initCollapsibles() {
+  // Estilos de los botones resueltos al generar la página (si los hay)
+  let runtimeStyles = null;
+  function applyRuntimeStyles(container, state) {
+    if (runtimeStyles === null) {
+      const data = document.getElementById('runtime-styles');
+      runtimeStyles = data ? JSON.parse(data.textContent) : {};
+    }
+    const styles = runtimeStyles[state] || {};
+    Object.keys(styles).forEach(className => {
+      container.querySelectorAll(':scope > .' + className).forEach(el => {
+        el.style.cssText = styles[className];
+      });
+    });
+  }
+
+  function initCollapsibles(root) {
     // Esperar un poco para que los estilos se apliquen
     setTimeout(() => {
-      document.querySelectorAll('.collapsible-container').forEach(container => {
-        const pre = container.querySelector('pre');
+      (root || document).querySelectorAll('.collapsible-container').forEach(container => {
+        // Inicializar cada contenedor una sola vez
+        if (container.dataset.collapsibleReady) return;
+
+        let pre = container.querySelector('pre');
         if (!pre) return;
+        // Bloque diferido: el cuerpo completo está en un <template> hasta el primer clic
+        let deferred = container.querySelector(':scope > template.deferred-code');
         
         const maxLines = parseInt(container.dataset.maxLines, 10) || 6;
         
@@ -116,7 +154,7 @@ COLLAPSIBLE_JS = """(function() {
         const lineHeight = tempSpan.offsetHeight;
         document.body.removeChild(tempSpan);
         
-        const fullHeight = pre.scrollHeight;
+        let fullHeight = pre.scrollHeight;
         const collapsedHeight = Math.ceil(lineHeight * maxLines);
         
         console.log('Debug:', {
@@ -124,13 +162,25 @@ COLLAPSIBLE_JS = """(function() {
           lineHeight,
           fullHeight,
           collapsedHeight,
-          shouldCollapse: fullHeight > collapsedHeight + 10
+          shouldCollapse: deferred !== null || fullHeight > collapsedHeight + 10
         });
         
-        // Solo colapsar si realmente es necesario
-        if (fullHeight <= collapsedHeight + 10) {
+        // Solo colapsar si realmente es necesario (un bloque diferido siempre es largo)
+        if (!deferred && fullHeight <= collapsedHeight + 10) {
           return;
         }
+        container.dataset.collapsibleReady = 'true';
+
+        // Reemplazar las primeras líneas por el cuerpo completo (una sola vez)
+        function restoreDeferred() {
+          if (!deferred) return;
+          const full = deferred.content.querySelector('pre');
+          pre.replaceWith(deferred.content);
+          deferred.remove();
+          deferred = null;
+          pre = full;
+          fullHeight = pre.scrollHeight;
+        }
 
         // Estado inicial: colapsado
         container.style.maxHeight = collapsedHeight + 'px';
@@ -147,7 +197,8 @@ COLLAPSIBLE_JS = """(function() {
         copyBtn.addEventListener('click', (e) => {
           e.preventDefault();
           e.stopPropagation();
-          // Copiar el contenido de 'pre'
+          // Copiar el contenido de 'pre' (completo)
+          restoreDeferred();
           const codeText = pre.innerText;
           navigator.clipboard.writeText(codeText).then(() => {
             // Opcional: retroalimentación breve (por ejemplo cambiar texto o color)
@@ -174,6 +225,7 @@ COLLAPSIBLE_JS = """(function() {
         ell.className = 'ellipsis';
         ell.textContent = '...';
         container.appendChild(ell);
+        applyRuntimeStyles(container, 'collapsed');
 
         // Evento toggle
         btn.addEventListener('click', (e) => {
@@ -184,103 +236,193 @@ COLLAPSIBLE_JS = """(function() {
           
           if (isCollapsed) {
             // Expandir
+            restoreDeferred();
             container.style.maxHeight = fullHeight + 20 + 'px';
             container.classList.remove('collapsed');
             container.classList.add('expanded');
             btn.textContent = '−';
+            applyRuntimeStyles(container, 'expanded');
           } else {
             // Colapsar
             container.style.maxHeight = collapsedHeight + 'px';
             container.classList.add('collapsed');
             container.classList.remove('expanded');
             btn.textContent = '+';
+            applyRuntimeStyles(container, 'collapsed');
           }
         });
       });
     }, 100); // Esperar 100ms para que se apliquen los estilos
   }
+
+  // Expuesto para inicializar contenido insertado después de la carga
+  window.initCollapsibles = initCollapsibles;
   
   // Múltiples puntos de inicialización para mayor compatibilidad
   if (document.readyState === 'loading') {
-    document.addEventListener('DOMContentLoaded', initCollapsibles);
+    document.addEventListener('DOMContentLoaded', () => initCollapsibles());
   } else {
     initCollapsibles();
   }
   
   // También inicializar en window.load por si acaso
-  window.addEventListener('load', initCollapsibles);
+  window.addEventListener('load', () => initCollapsibles());
 })();"""
 
 
-def transform_html(input_path, output_path, max_lines):
-    try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+def add_assets(soup):
+    """Inject the collapsible CSS and JS in the <head> (once)."""
+    # Asegurar que existe <html> y <head>
+    if not soup.html:
+        soup.wrap(soup.new_tag('html'))
+    
+    head = soup.head
+    if not head:
+        head = soup.new_tag('head')
+        soup.html.insert(0, head)
+
+    # Solo inyectar CSS y JS si no existen ya
+    if not soup.find(id=CSS_ID):
+        # Inyectar CSS
+        style_tag = soup.new_tag('style', id=CSS_ID)
+        style_tag.string = COLLAPSIBLE_CSS
+        head.append(style_tag)
         
-        soup = BeautifulSoup(content, 'html.parser')
+        # Inyectar JS
+        script_tag = soup.new_tag('script')
+        script_tag.string = COLLAPSIBLE_JS
+        head.append(script_tag)
+
+
+def truncate_lines(pre, lines):
+    """Keep only the first `lines` lines of pre, cutting inside its text (in place)."""
+    seen = 0
+    for text in pre.find_all(string=True):
+        breaks = text.count('\n')
+        if seen + breaks < lines:
+            seen += breaks
+            continue
+        cut = -1
+        for _ in range(lines - seen):
+            cut = text.index('\n', cut + 1)
+        node = NavigableString(text[:cut])
+        text.replace_with(node)
+        # Todo lo que sigue al corte sale del <pre>; las etiquetas abiertas quedan cerradas
+        while node is not pre:
+            for sibling in list(node.next_siblings):
+                sibling.extract()
+            node = node.parent
+        return
+
+
+def defer_block(soup, pre, visible_lines):
+    """
+    Move the full pre to a <template> of the wrapper and leave only its first
+    visible_lines lines in the DOM (COLLAPSIBLE_JS swaps them on the first
+    expand or copy).
+    """
+    template = soup.new_tag('template', **{'class': DEFERRED_CODE_CLASS})
+    template.append(copy.copy(pre))
+    pre.insert_after(template)
+    truncate_lines(pre, visible_lines)
+
+
+def wrap_long_blocks(soup, max_lines=DEFAULT_MAX_LINES, defer_lines=None):
+    """
+    Wrap the <pre> blocks with more than max_lines lines; returns how many.
+
+    With defer_lines, the wrapped blocks with more than defer_lines lines
+    keep only what the collapsed container shows in the DOM (see defer_block).
+    """
+    pre_elements = soup.find_all('pre')
+    processed = 0
+    deferred = 0
+    
+    for pre in pre_elements:
+        # Omitir si ya está dentro de un contenedor colapsable
+        if pre.find_parent('div', class_='collapsible-container'):
+            continue
+            
+        # Omitir diagramas Mermaid
+        if pre.find_parent('div', class_=['mermaid', 'language-mermaid']):
+            continue
         
-        # Asegurar que existe <html> y <head>
-        if not soup.html:
-            soup.wrap(soup.new_tag('html'))
+        # Contar líneas reales
+        text_content = pre.get_text()
+        lines = len([line for line in text_content.split('\n') if line.strip()])
         
-        head = soup.head
-        if not head:
-            head = soup.new_tag('head')
-            soup.html.insert(0, head)
-
-        # Solo inyectar CSS y JS si no existen ya
-        if not soup.find(id=CSS_ID):
-            # Inyectar CSS
-            style_tag = soup.new_tag('style', id=CSS_ID)
-            style_tag.string = COLLAPSIBLE_CSS
-            head.append(style_tag)
-            
-            # Inyectar JS
-            script_tag = soup.new_tag('script')
-            script_tag.string = COLLAPSIBLE_JS
-            head.append(script_tag)
-
-        # Procesar cada <pre>
-        pre_elements = soup.find_all('pre')
-        processed = 0
+        if lines <= max_lines:
+            continue
+
+        # Crear wrapper
+        wrapper = soup.new_tag('div', **{
+            'class': 'collapsible-container',
+            'data-max-lines': str(max_lines)
+        })
         
-        for pre in pre_elements:
-            # Omitir si ya está dentro de un contenedor colapsable
-            if pre.find_parent('div', class_='collapsible-container'):
-                continue
-                
-            # Omitir diagramas Mermaid
-            if pre.find_parent('div', class_=['mermaid', 'language-mermaid']):
-                continue
-            
-            # Contar líneas reales
-            text_content = pre.get_text()
-            lines = len([line for line in text_content.split('\n') if line.strip()])
-            
-            if lines <= max_lines:
-                continue
-
-            # Crear wrapper
-            wrapper = soup.new_tag('div', **{
-                'class': 'collapsible-container',
-                'data-max-lines': str(max_lines)
-            })
-            
-            # NO heredar clases del pre para evitar conflictos
-            # Solo preservar atributos esenciales si es necesario
-            if pre.has_attr('style'):
-                # Aplicar algunos estilos del pre al wrapper si son relevantes
-                wrapper['style'] = pre['style']
-            
-            # Envolver el pre
-            pre.wrap(wrapper)
-            processed += 1
+        # NO heredar clases del pre para evitar conflictos
+        # Solo preservar atributos esenciales si es necesario
+        if pre.has_attr('style'):
+            # Aplicar algunos estilos del pre al wrapper si son relevantes
+            wrapper['style'] = pre['style']
+        
+        # Envolver el pre
+        pre.wrap(wrapper)
+        processed += 1
+
+        if defer_lines is not None and lines > defer_lines:
+            # Una línea más que las visibles: queda algo bajo el degradado
+            defer_block(soup, pre, max_lines + 1)
+            deferred += 1
+    if deferred:
+        build_metrics.incr('deferred_code_blocks', amount=deferred)
+    return processed
+
+
+def collapse_html(content, max_lines=DEFAULT_MAX_LINES, defer_lines=None):
+    """Return the document with long <pre> blocks wrapped in collapsible containers."""
+    soup = BeautifulSoup(content, 'html.parser')
+    add_assets(soup)
+    processed = wrap_long_blocks(soup, max_lines, defer_lines)
+    build_metrics.incr('collapsible_blocks', amount=processed)
+
+    print(f"Procesados {processed} bloques <pre> con más de {max_lines} líneas")
+    return str(soup)
+
+
+def collapse_fragment(content, max_lines=DEFAULT_MAX_LINES, defer_lines=None):
+    """
+    Wrap the long <pre> blocks of an HTML fragment (no assets are added).
+
+    Returns (html, processed). Used by the streaming pipeline, one section at
+    a time; add_assets() is applied once to the document skeleton.
+    """
+    soup = BeautifulSoup(content, 'html.parser')
+    processed = wrap_long_blocks(soup, max_lines, defer_lines)
+    build_metrics.incr('collapsible_blocks', amount=processed)
+    return str(soup), processed
+
+
+def collapse_skeleton(start, end, placeholder='<!--collapsible-content-->'):
+    """
+    Apply collapse_html's <head> changes to a document given as the markup
+    before and after its content. Returns the new (start, end).
+    """
+    soup = BeautifulSoup(start + placeholder + end, 'html.parser')
+    add_assets(soup)
+    start, end = str(soup).split(placeholder)
+    return start, end
+
+
+def transform_html(input_path, output_path, max_lines, defer_lines=None):
+    try:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            content = f.read()
 
-        print(f"Procesados {processed} bloques <pre> con más de {max_lines} líneas")
+        result = collapse_html(content, max_lines, defer_lines)
 
-        # Guardar resultado
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
+        # Guardar resultado (sin reescribir el archivo si no cambió)
+        write_if_changed(output_path, result)
             
     except Exception as e:
         print(f"Error procesando el archivo: {e}")
@@ -295,6 +437,9 @@ def main():
     parser.add_argument('-o', '--output', help='Archivo HTML de salida (por defecto: <input>_collapsible.html)')
     parser.add_argument('-l', '--lines', type=int, default=DEFAULT_MAX_LINES,
                         help=f'Máximo de líneas antes de colapsar (por defecto: {DEFAULT_MAX_LINES})')
+    parser.add_argument('--defer-code', type=int, nargs='?', const=DEFAULT_DEFER_LINES, metavar='LÍNEAS',
+                        help='Bloques de más de LÍNEAS líneas: solo las visibles al colapsar en el DOM, el resto en '
+                             f'un <template> hasta el primer clic (por defecto: {DEFAULT_DEFER_LINES})')
     
     args = parser.parse_args()
     
@@ -311,7 +456,7 @@ def main():
         output_path = f"{name}_collapsible{ext or '.html'}"
     
     # Procesar archivo
-    success = transform_html(args.input, output_path, args.lines)
+    success = transform_html(args.input, output_path, args.lines, args.defer_code)
     
     if success:
         print(f"✓ Se guardó correctamente el archivo: \"{output_path}\"")
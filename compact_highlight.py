@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+compact_highlight.py - Pygments HTML formatter with fewer and shorter spans
+
+HtmlFormatter wraps every token in <span class="...">, including whitespace,
+and adjacent tokens of different types that the page styles identically.
+CompactHtmlFormatter emits the same visual result with less markup:
+
+  - token classes that our stylesheets style identically (in every language
+    context) are collapsed into one short class, so adjacent tokens merge
+  - Text and whitespace tokens are left unwrapped (except indentation, which
+    Markdown would strip from code blocks nested in lists)
+  - whitespace between two tokens of the same class is absorbed into a single
+    span when the class has no visible effect on whitespace (only colour/font)
+
+Lines with a tab keep the markup of HtmlFormatter: Markdown expands tabs
+after highlighting, by their column in the HTML, so a shorter line would
+get a different number of spaces.
+
+The equivalence is computed with the cascade engine of css_cascade.py over a
+synthetic document, from the same CSS that ends up in the page.
+"""
+
+import io
+import re
+from functools import lru_cache
+
+from bs4 import BeautifulSoup
+from pygments.formatters import HtmlFormatter
+from pygments.token import STANDARD_TYPES, Token
+
+from css_cascade import resolve_styles
+
+LANGUAGE_CONTEXT_RE = re.compile(r'\.language-([\w-]+)')
+WHITESPACE_CLASS = STANDARD_TYPES[Token.Text.Whitespace]
+# Propiedades que no se ven sobre espacios en blanco (en una fuente monoespaciada)
+INVISIBLE_ON_WHITESPACE = {'color', 'font-style', 'font-weight'}
+INVISIBLE_VALUES = {'none', 'transparent', '0', 'initial', 'inherit', 'unset'}
+# Markdown quita la sangría de las líneas que empiezan con espacios (y vacía las que solo tienen
+# espacios), así que la sangría que HtmlFormatter envolvía sigue envuelta
+LEADING_WHITESPACE = Token.Text.Whitespace.Leading
+
+
+def _standard_class(ttype):
+    """CSS class of the closest standard token type ('' for Text)."""
+    while ttype not in STANDARD_TYPES:
+        ttype = ttype.parent
+    return STANDARD_TYPES[ttype]
+
+
+def _invisible_on_whitespace(signature):
+    return all(prop in INVISIBLE_ON_WHITESPACE or value.lower() in INVISIBLE_VALUES
+               for props in signature for prop, (value, _) in props)
+
+
+@lru_cache(maxsize=8)
+def token_class_map(css_texts, root_classes=('',)):
+    """
+    Group the Pygments token classes by their resolved style.
+
+    css_texts is a tuple with the stylesheets of the page; root_classes are
+    the classes the page may put on <html> (the highlight themes, see
+    highlight_themes.py). Returns (class_map, whitespace_safe): class_map maps
+    each class to the shortest class with the same style in every language
+    context and theme found in the CSS; whitespace_safe is the set of classes
+    whose style is invisible on spaces.
+    """
+    classes = sorted({c for c in STANDARD_TYPES.values() if c})
+    contexts = sorted({m.group(1) for css in css_texts for m in LANGUAGE_CONTEXT_RE.finditer(css)})
+    spans = ''.join(f'<span class="{c}">x</span>' for c in classes)
+
+    # Un bloque sin lenguaje y, por cada lenguaje, el bloque anidado en un ancestro con la misma clase
+    parts = [f'<div class="highlight"><pre>{spans}</pre></div>']
+    for language in contexts:
+        parts.append(f'<div class="language-{language}"><div class="highlight language-{language}">'
+                     f'<pre>{spans}</pre></div></div>')
+
+    signatures = {c: [] for c in classes}
+    for root_class in root_classes:
+        html_tag = f'<html class="{root_class}">' if root_class else '<html>'
+        soup = BeautifulSoup(f'{html_tag}<body>{"".join(parts)}</body></html>', 'html.parser')
+        resolved = {id(element): props for element, props in resolve_styles(soup, css_texts, warn=lambda _: None)}
+        for pre in soup.find_all('pre'):
+            for span in pre.find_all('span'):
+                props = resolved.get(id(span), {})
+                signatures[span['class'][0]].append(tuple(sorted(props.items())))
+
+    groups = {}
+    for cls in classes:
+        groups.setdefault(tuple(signatures[cls]), []).append(cls)
+    class_map = {}
+    whitespace_safe = set()
+    for signature, members in groups.items():
+        representative = min(members, key=lambda c: (len(c), c))
+        for cls in members:
+            class_map[cls] = representative
+        if _invisible_on_whitespace(signature):
+            whitespace_safe.add(representative)
+    return class_map, frozenset(whitespace_safe)
+
+
+class CompactHtmlFormatter(HtmlFormatter):
+    """HtmlFormatter that collapses equivalent classes and unwraps whitespace."""
+
+    def __init__(self, css_texts=(), root_classes=('',), **options):
+        super().__init__(**options)
+        self.class_map, self.whitespace_safe = token_class_map(tuple(css_texts), tuple(root_classes))
+        self.unwrapped = {''}
+        if WHITESPACE_CLASS in self.whitespace_safe or self.class_map.get(WHITESPACE_CLASS) in self.whitespace_safe:
+            self.unwrapped.add(WHITESPACE_CLASS)
+
+    def _compact_class(self, ttype):
+        if ttype is LEADING_WHITESPACE:
+            return self.class_map.get(WHITESPACE_CLASS, WHITESPACE_CLASS)
+        cls = _standard_class(ttype)
+        if cls in self.unwrapped:
+            return ''
+        return self.class_map.get(cls, cls)
+
+    def _get_css_classes(self, ttype):
+        cls = self._compact_class(ttype)
+        return self.classprefix + cls if cls else ''
+
+    def _absorb_whitespace(self, tokensource):
+        """Give same-line whitespace between two tokens of one class that class's type."""
+        previous = None  # (ttype, class) del último token con clase
+        pending = []
+        for ttype, value in tokensource:
+            cls = self._compact_class(ttype)
+            if not cls and value.isspace() and '\n' not in value and previous:
+                pending.append((ttype, value))
+                continue
+            if pending:
+                absorb = cls and cls == previous[1] and cls in self.whitespace_safe
+                for pending_ttype, pending_value in pending:
+                    yield (previous[0] if absorb else pending_ttype), pending_value
+                pending = []
+            yield ttype, value
+            previous = (ttype, cls) if cls else None
+        yield from pending
+
+    def _keep_leading_whitespace(self, tokensource):
+        """Mark the whitespace tokens that start a line as LEADING_WHITESPACE."""
+        line_start = True
+        for ttype, value in tokensource:
+            for index, piece in enumerate(value.split('\n')):
+                if index:
+                    yield ttype, '\n'
+                    line_start = True
+                if not piece:
+                    continue
+                if line_start and piece.isspace():
+                    yield (LEADING_WHITESPACE if _standard_class(ttype) == WHITESPACE_CLASS else ttype), piece
+                    continue
+                line_start = False
+                yield ttype, piece
+
+    def _format_compact(self, tokensource, outfile):
+        tokens = self._absorb_whitespace(self._keep_leading_whitespace(tokensource))
+        super().format_unencoded(tokens, outfile)
+
+    def format_unencoded(self, tokensource, outfile):
+        tokens = list(tokensource)
+        if not any('\t' in value for _, value in tokens):
+            self._format_compact(tokens, outfile)
+            return
+        # Markdown expande los tabs después de resaltar, según la columna en el HTML: las líneas con
+        # tabs van con el markup de HtmlFormatter para que queden con los mismos espacios
+        compact, reference = io.StringIO(), io.StringIO()
+        self._format_compact(tokens, compact)
+        HtmlFormatter(**self.options).format_unencoded(iter(tokens), reference)
+        compact_lines = compact.getvalue().split('\n')
+        reference_lines = reference.getvalue().split('\n')
+        if len(compact_lines) != len(reference_lines):
+            outfile.write(reference.getvalue())
+            return
+        outfile.write('\n'.join(ref if '\t' in ref else line for line, ref in zip(compact_lines, reference_lines)))
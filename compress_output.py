@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+compress_output.py - Precompress the generated pages for static hosting
+
+Writes <file>.gz (and <file>.br when the brotli module is available) next to
+every *_final.html page, chapter fragment (split_chapters.py) and shared asset,
+at maximum compression, so the static host can serve them without compressing
+on each request. Files whose
+content hash did not change since the last run are skipped.
+
+Usage:
+    python compress_output.py notes/Prog4/html_output [more paths...] [-j 4] [--force]
+"""
+
+import os
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from output_utils import write_if_changed
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se genera .gz
+    brotli = None
+
+STATE_FILE = '.precompressed.json'
+ASSET_SUFFIXES = {'.css', '.js', '.mjs', '.json', '.svg', '.txt'}
+
+
+def find_targets(paths):
+    """Return the final pages and shared assets under the given files/directories."""
+    targets = []
+    for path in map(Path, paths):
+        if path.is_file():
+            targets.append(path)
+            continue
+        targets.extend(path.rglob('*_final.html'))
+        targets.extend(path.rglob('*_final.chapter-*.html'))
+        for assets_dir in path.rglob('assets'):
+            if assets_dir.is_dir():
+                targets.extend(p for p in assets_dir.rglob('*')
+                               if p.is_file() and p.suffix.lower() in ASSET_SUFFIXES)
+    # Sin duplicados y en orden estable
+    return sorted(set(targets))
+
+
+def _load_state(directory):
+    state_path = directory / STATE_FILE
+    if state_path.exists():
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def compress_file(path, known_hash=None, force=False):
+    """
+    Write the .gz/.br siblings of one file.
+
+    Returns (path, digest, raw_size, gzip_size, brotli_size, skipped).
+    """
+    path = Path(path)
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    gz_path = path.with_name(path.name + '.gz')
+    br_path = path.with_name(path.name + '.br')
+
+    up_to_date = (not force and digest == known_hash and gz_path.exists()
+                  and (brotli is None or br_path.exists()))
+    if not up_to_date:
+        write_if_changed(gz_path, gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            write_if_changed(br_path, brotli.compress(data, quality=11))
+
+    gz_size = gz_path.stat().st_size
+    br_size = br_path.stat().st_size if brotli is not None and br_path.exists() else None
+    return str(path), digest, len(data), gz_size, br_size, up_to_date
+
+
+def _format_size(size):
+    if size is None:
+        return '-'
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def print_report(results):
+    """Print a table with raw, gzip and brotli sizes per file."""
+    if not results:
+        return
+    width = max(len(r[0]) for r in results)
+    width = min(max(width, len('Archivo')), 70)
+    print(f"{'Archivo':<{width}}  {'Original':>10}  {'gzip':>10}  {'%':>5}  {'brotli':>10}  {'%':>5}")
+    print('-' * (width + 50))
+    total_raw = total_gz = total_br = 0
+    for path, _, raw, gz, br, skipped in results:
+        name = path if len(path) <= width else '...' + path[-(width - 3):]
+        gz_ratio = f"{100 * gz / raw:.0f}" if raw else '-'
+        br_ratio = f"{100 * br / raw:.0f}" if raw and br is not None else '-'
+        mark = ' (sin cambios)' if skipped else ''
+        print(f"{name:<{width}}  {_format_size(raw):>10}  {_format_size(gz):>10}  {gz_ratio:>5}  "
+              f"{_format_size(br):>10}  {br_ratio:>5}{mark}")
+        total_raw += raw
+        total_gz += gz
+        total_br += br or 0
+    print('-' * (width + 50))
+    br_total = _format_size(total_br) if brotli is not None else '-'
+    print(f"{'Total':<{width}}  {_format_size(total_raw):>10}  {_format_size(total_gz):>10}  "
+          f"{100 * total_gz / max(total_raw, 1):>5.0f}  {br_total:>10}")
+
+
+def compress_outputs(paths, jobs=None, force=False):
+    """Precompress every target under paths in parallel and update the hash state."""
+    targets = find_targets(paths)
+    if not targets:
+        print("No se encontraron archivos para comprimir.")
+        return []
+
+    states = {}
+    for target in targets:
+        if target.parent not in states:
+            states[target.parent] = _load_state(target.parent)
+    known = [states[t.parent].get(t.name) for t in targets]
+
+    if len(targets) == 1 or jobs == 1:
+        results = [compress_file(t, h, force) for t, h in zip(targets, known)]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(compress_file, targets, known, [force] * len(targets)))
+
+    changed_dirs = set()
+    for target, result in zip(targets, results):
+        if states[target.parent].get(target.name) != result[1]:
+            states[target.parent][target.name] = result[1]
+            changed_dirs.add(target.parent)
+    for directory in changed_dirs:
+        with open(directory / STATE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(states[directory], f, indent=2, sort_keys=True)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Genera versiones .gz/.br de las páginas finales y los assets compartidos.')
+    parser.add_argument('paths', nargs='+', help='Archivos o directorios html_output a procesar')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Procesos en paralelo (por defecto: número de CPUs)')
+    parser.add_argument('-f', '--force', action='store_true', help='Recomprimir aunque el contenido no haya cambiado')
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"Error: '{path}' no existe.")
+            sys.exit(1)
+
+    if brotli is None:
+        print("Warning: el módulo brotli no está instalado; solo se generan archivos .gz")
+
+    results = compress_outputs(args.paths, args.jobs, args.force)
+    print_report(results)
+
+
+if __name__ == '__main__':
+    main()
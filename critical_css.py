@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+critical_css.py - Critical CSS for the first screen, the rest after the first paint
+
+Splits the stylesheet of a page in two:
+
+- critical: the rules that match something on the first screen (the html and
+  body elements, and the body content up to and including the first
+  chapter-container: #main-title-block, the table of contents and the first
+  chapter), plus the base .highlight box, so that code blocks further down
+  keep their size when the rest arrives. They go to a <style> in the <head>.
+- deferred: everything else (token colors of other languages, collapsible
+  and copy buttons, Mermaid, tables further down...). It is kept in a
+  <script type="text/css"> at the end of the <body> and applied after the
+  first paint, so it never blocks rendering.
+
+Splitting keeps the cascade: a critical rule that an earlier deferred rule
+could override (same specificity, same property and importance) is repeated
+in the deferred sheet after it.
+
+Used by inline_css.py --css-mode critical (md2html.sh --critical-css).
+
+Usage:
+    from critical_css import defer_styles
+    stats = defer_styles(soup, css_text)
+"""
+
+import re
+
+from css_cascade import (ElementIndex, PSEUDO_ELEMENT_RE, element_classes, iter_css_blocks, match_selector,
+                         parse_declarations, selector_specificity, split_top_level)
+from highlight_themes import THEME_CLASS_PREFIX
+
+FIRST_CHAPTER_CLASS = 'chapter-container'
+# Caja base de los bloques de código: siempre crítica para que la página no se reacomode
+ALWAYS_CRITICAL = ('.highlight', '.highlight pre')
+
+CRITICAL_STYLE_ID = 'critical-css'
+DEFERRED_CSS_ID = 'deferred-css'
+
+# Estados que no existen al generar la página (se ignoran para decidir)
+DYNAMIC_PSEUDO_RE = re.compile(r':(hover|active|focus-visible|focus-within|focus|visited|link|target|checked)\b')
+# Clases que el script de temas pone en <html> al cargar (highlight_themes.py)
+THEME_CLASS_RE = re.compile(rf'\.{THEME_CLASS_PREFIX}[\w-]+')
+
+DEFERRED_CSS_LOADER = """
+document.addEventListener('DOMContentLoaded', function() {
+    // Aplicar el resto del CSS después del primer pintado (no bloquea el render)
+    requestAnimationFrame(function() {
+        setTimeout(function() {
+            var deferred = document.getElementById('deferred-css');
+            if (!deferred) return;
+            var style = document.createElement('style');
+            style.textContent = deferred.textContent;
+            document.head.appendChild(style);
+
+            document.querySelectorAll('.toggle-button, .copy-button').forEach(btn => {
+                btn.style.setProperty('color', 'black', 'important');
+            });
+        }, 0);
+    });
+});
+"""
+
+
+def first_screen_elements(soup):
+    """html, body and every element of the body content up to the first chapter-container."""
+    elements = [element for element in (soup.html, soup.body) if element is not None]
+    body = soup.body or soup
+    for child in body.find_all(True, recursive=False):
+        if child.name in ('script', 'textarea'):
+            continue
+        elements.append(child)
+        elements.extend(child.find_all(True))
+        if FIRST_CHAPTER_CLASS in element_classes(child):
+            break
+    return elements
+
+
+def static_selector(selector):
+    """
+    The selector without pseudo-elements, dynamic pseudo-classes and theme
+    classes (what can match at build time).
+    """
+    stripped = THEME_CLASS_RE.sub('', DYNAMIC_PSEUDO_RE.sub('', PSEUDO_ELEMENT_RE.sub('', selector)))
+    if stripped == selector:
+        return selector
+    # Un compuesto que quedó vacío pasa a ser '*': 'a > :hover' -> 'a > *'
+    tokens = []
+    for token in re.sub(r'\s*([>+~])\s*', r' \1 ', stripped).split():
+        if token in '>+~' and (not tokens or tokens[-1] in '>+~'):
+            tokens.append('*')
+        tokens.append(token)
+    if not tokens or tokens[-1] in '>+~':
+        tokens.append('*')
+    return ' '.join(tokens)
+
+
+def split_stylesheet(soup, css_text):
+    """
+    Split css_text into (critical_css, deferred_css) for the document in soup.
+
+    Grouped selectors are split so that each selector goes where it belongs;
+    at-rules are deferred.
+    """
+    index = ElementIndex(soup)
+    first_screen = {id(element) for element in first_screen_elements(soup)}
+
+    def is_critical(selector):
+        if selector in ALWAYS_CRITICAL:
+            return True
+        try:
+            return any(id(element) in first_screen for element in match_selector(index, static_selector(selector)))
+        except Exception:
+            # Ante la duda, crítico: mejor un poco más de CSS que un parpadeo
+            return True
+
+    critical, deferred = [], []
+    # (especificidad, propiedad, !important) de las reglas diferidas vistas hasta ahora
+    deferred_keys = set()
+    for prelude, block in iter_css_blocks(css_text, at_rules=True):
+        if prelude.startswith('@'):
+            deferred.append(f"{prelude} {{{block}}}")
+            continue
+        declarations = parse_declarations(block)
+        if not declarations:
+            continue
+        body = block.strip()
+        for selector in split_top_level(prelude, ','):
+            selector = ' '.join(selector.split())
+            if not selector:
+                continue
+            rule = f"{selector} {{{body}}}"
+            keys = {(selector_specificity(selector), prop, important) for prop, _, important in declarations}
+            if not is_critical(selector):
+                deferred.append(rule)
+                deferred_keys |= keys
+                continue
+            critical.append(rule)
+            # Una regla diferida anterior le ganaría al llegar después: repetirla a continuación
+            if keys & deferred_keys:
+                deferred.append(rule)
+    return '\n'.join(critical), '\n'.join(deferred)
+
+
+def defer_styles(soup, css_text):
+    """
+    Put the critical part of css_text in a <style> of the <head> and the rest
+    in a <script type="text/css"> applied after the first paint.
+
+    Returns {'critical_bytes': ..., 'deferred_bytes': ...}.
+    """
+    critical_css, deferred_css = split_stylesheet(soup, css_text)
+
+    if critical_css:
+        style_tag = soup.new_tag('style', id=CRITICAL_STYLE_ID)
+        style_tag.string = critical_css
+        if soup.head:
+            soup.head.append(style_tag)
+        else:
+            soup.insert(0, style_tag)
+
+    if deferred_css:
+        if not soup.body:
+            soup.body = soup.new_tag('body')
+        # El contenido de un <script> no se interpreta: solo hay que evitar que lo cierre
+        css_tag = soup.new_tag('script', type='text/css', id=DEFERRED_CSS_ID)
+        css_tag.string = deferred_css.replace('</', '<\\/')
+        soup.body.append(css_tag)
+        loader = soup.new_tag('script')
+        loader.string = DEFERRED_CSS_LOADER
+        soup.body.append(loader)
+
+    return {
+        'critical_bytes': len(critical_css.encode('utf-8')),
+        'deferred_bytes': len(deferred_css.encode('utf-8')),
+    }
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Indexed CSS cascade resolver used to turn <style> rules into inline style attributes.
+
+The document is indexed once by tag, class and id. Each selector is matched only
+against the candidates of its rightmost compound selector, declarations are
+resolved by importance, specificity and source order, and every element's
+``style`` attribute is written once at the end.
+"""
+import re
+from collections import defaultdict
+
+import soupsieve as sv
+
+COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+CDATA_RE = re.compile(r'<!\[CDATA\[|\]\]>')
+IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.IGNORECASE)
+
+# Tokens of a compound selector (outside of parentheses)
+ID_RE = re.compile(r'#(-?[_a-zA-Z][\w-]*)')
+CLASS_RE = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+TAG_RE = re.compile(r'^([a-zA-Z][\w-]*|\*)')
+ATTR_RE = re.compile(r'\[[^\]]*\]')
+PSEUDO_ELEMENT_RE = re.compile(r'::[\w-]+(\([^)]*\))?|:(before|after|first-line|first-letter)\b')
+PSEUDO_CLASS_RE = re.compile(r'(?<!:):(?!not\b)[\w-]+(\([^)]*\))?')
+SIMPLE_COMPOUND_RE = re.compile(r'^([a-zA-Z][\w-]*|\*)?([.#]-?[_a-zA-Z][\w-]*)*$')
+
+
+def split_top_level(text, separators):
+    """Split text on any of the separator characters that are not nested in () or []."""
+    parts = []
+    depth = 0
+    current = []
+    for char in text:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        if depth == 0 and char in separators:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append(''.join(current))
+    return parts
+
+
+def iter_css_blocks(css_text, at_rules=False):
+    """
+    Yield (selector_group, declarations) for every plain rule in a stylesheet.
+
+    At-rules with a block (@media, @keyframes, @font-face...) cannot be expressed
+    as inline styles, so they are skipped entirely unless at_rules is True, in
+    which case they are yielded as (prelude, body) too.
+    """
+    css_text = CDATA_RE.sub('', COMMENT_RE.sub('', css_text))
+    pos = 0
+    length = len(css_text)
+    while pos < length:
+        open_brace = css_text.find('{', pos)
+        if open_brace == -1:
+            break
+        prelude = css_text[pos:open_brace]
+        # Statements like @import end with ';' before the next block
+        if '@' in prelude and ';' in prelude:
+            prelude = prelude[prelude.rfind(';') + 1:]
+        prelude = prelude.strip()
+
+        # Find the matching closing brace (depth-aware for nested at-rules)
+        depth = 1
+        end = open_brace + 1
+        while end < length and depth:
+            if css_text[end] == '{':
+                depth += 1
+            elif css_text[end] == '}':
+                depth -= 1
+            end += 1
+
+        if prelude and (at_rules or not prelude.startswith('@')):
+            yield prelude, css_text[open_brace + 1:end - 1]
+        pos = end
+
+
+def parse_declarations(block):
+    """Parse 'prop: value; ...' into a list of (prop, value, important)."""
+    declarations = []
+    for prop in block.split(';'):
+        prop = prop.strip()
+        if not prop:
+            continue
+        parts = prop.split(':', 1)
+        if len(parts) != 2:
+            continue
+        name = parts[0].strip().lower()
+        value = parts[1].strip()
+        important = bool(IMPORTANT_RE.search(value))
+        if important:
+            value = IMPORTANT_RE.sub('', value)
+        if name and value:
+            declarations.append((name, value, important))
+    return declarations
+
+
+def parse_css_rules(css_text):
+    """
+    Parse a stylesheet into a list of (selector, declarations) tuples.
+
+    Grouped selectors ("a, b { ... }") are split into one rule per selector,
+    keeping their source order.
+    """
+    rules = []
+    for selector_group, block in iter_css_blocks(css_text):
+        declarations = parse_declarations(block)
+        if not declarations:
+            continue
+        for selector in split_top_level(selector_group, ','):
+            selector = ' '.join(selector.split())
+            if selector:
+                rules.append((selector, declarations))
+    return rules
+
+
+def rightmost_compound(selector):
+    """Return the last compound selector (after the last combinator)."""
+    normalized = re.sub(r'\s*([>+~])\s*', r'\1', selector)
+    return split_top_level(normalized, ' >+~')[-1]
+
+
+def selector_specificity(selector):
+    """Compute the (ids, classes, types) specificity of a selector."""
+    # :not(x) counts as its argument
+    flat = re.sub(r':not\(', ' ', selector).replace(')', ' ')
+    flat = ATTR_RE.sub('[]', flat)
+    ids = len(ID_RE.findall(flat))
+    classes = len(CLASS_RE.findall(flat)) + flat.count('[]')
+    pseudo_elements = len(PSEUDO_ELEMENT_RE.findall(flat))
+    classes += len(PSEUDO_CLASS_RE.findall(PSEUDO_ELEMENT_RE.sub('', flat)))
+    types = 0
+    for compound in split_top_level(re.sub(r'\s*([>+~])\s*', r' ', flat), ' '):
+        match = TAG_RE.match(compound)
+        if match and match.group(1) != '*':
+            types += 1
+    return (ids, classes, types + pseudo_elements)
+
+
+def element_classes(element):
+    """Return the class list of an element (bs4 may store it as a plain string)."""
+    classes = element.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return classes
+
+
+class ElementIndex:
+    """Elements of a document indexed once by tag name, class and id."""
+
+    def __init__(self, soup):
+        self.elements = []
+        self.by_tag = defaultdict(list)
+        self.by_class = defaultdict(list)
+        self.by_id = defaultdict(list)
+        for element in soup.find_all(True):
+            self.elements.append(element)
+            self.by_tag[element.name].append(element)
+            for class_name in element_classes(element):
+                self.by_class[class_name].append(element)
+            element_id = element.get('id')
+            if element_id:
+                self.by_id[element_id].append(element)
+
+    def candidates(self, compound):
+        """Return the smallest candidate list for a compound selector."""
+        # Ignore anything inside :not(...) and friends
+        plain = re.sub(r'\([^)]*\)', '', ATTR_RE.sub('', compound))
+        ids = ID_RE.findall(plain)
+        if ids:
+            return self.by_id.get(ids[0], [])
+        classes = CLASS_RE.findall(plain)
+        if classes:
+            return min((self.by_class.get(c, []) for c in classes), key=len)
+        match = TAG_RE.match(plain)
+        if match and match.group(1) != '*':
+            return self.by_tag.get(match.group(1).lower(), [])
+        return self.elements
+
+
+def _simple_matcher(compound):
+    """Build a fast matcher for compounds made only of tag, .class and #id."""
+    tag_match = TAG_RE.match(compound)
+    tag = tag_match.group(1).lower() if tag_match and tag_match.group(1) != '*' else None
+    ids = set(ID_RE.findall(compound))
+    classes = set(CLASS_RE.findall(compound))
+
+    def matches(element):
+        if tag and element.name != tag:
+            return False
+        if ids and element.get('id') not in ids:
+            return False
+        return classes.issubset(element_classes(element))
+    return matches
+
+
+def match_selector(index, selector):
+    """Return the elements of the index matching a selector."""
+    compound = rightmost_compound(selector)
+    candidates = index.candidates(compound)
+    if not candidates:
+        return []
+    if compound == selector and SIMPLE_COMPOUND_RE.match(selector):
+        matches = _simple_matcher(selector)
+    else:
+        matches = sv.compile(selector).match
+    return [element for element in candidates if matches(element)]
+
+
+def resolve_styles(soup, css_texts, warn=print):
+    """
+    Resolve the cascade of the given stylesheets over the document.
+
+    Returns a list of (element, {prop: (value, important)}) in document order,
+    including each element's existing inline style, which wins over normal
+    stylesheet declarations but loses against !important ones.
+    """
+    index = ElementIndex(soup)
+    # winners[id(element)][prop] = (sort_key, value, important)
+    winners = {}
+    order = 0
+
+    def offer(element, key, prop, value, important):
+        props = winners.setdefault(id(element), {})
+        current = props.get(prop)
+        if current is None or key >= current[0]:
+            props[prop] = (key, value, important)
+
+    for css_text in css_texts:
+        for selector, declarations in parse_css_rules(css_text):
+            if PSEUDO_ELEMENT_RE.search(selector):
+                continue
+            try:
+                elements = match_selector(index, selector)
+            except Exception as e:
+                warn(f"Error applying style for selector '{selector}': {e}")
+                continue
+            if not elements:
+                continue
+            specificity = selector_specificity(selector)
+            for prop, value, important in declarations:
+                order += 1
+                key = (important, False, specificity, order)
+                for element in elements:
+                    offer(element, key, prop, value, important)
+
+    resolved = []
+    for element in index.elements:
+        if id(element) not in winners:
+            continue
+        existing = element.get('style')
+        if existing:
+            for prop, value, important in parse_declarations(existing):
+                order += 1
+                offer(element, (important, True, (0, 0, 0), order), prop, value, important)
+        props = winners[id(element)]
+        resolved.append((element, {p: (v, imp) for p, (_, v, imp) in props.items()}))
+    return resolved
+
+
+def format_style(props, compact=False):
+    """
+    Serialize a resolved {prop: (value, important)} mapping as a style attribute.
+
+    compact drops the optional whitespace ('color:red;margin:0'), for pages
+    where every element carries its style.
+    """
+    if compact:
+        return ';'.join(f"{prop}:{' '.join(value.split())}{'!important' if important else ''}"
+                        for prop, (value, important) in props.items())
+    return '; '.join(f"{prop}: {value}{' !important' if important else ''}"
+                     for prop, (value, important) in props.items())
+
+
+def inline_styles(soup, css_texts, warn=print):
+    """Write the resolved cascade as inline style attributes (one write per element)."""
+    resolved = resolve_styles(soup, css_texts, warn)
+    for element, props in resolved:
+        element['style'] = format_style(props)
+    return len(resolved)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+highlight_themes.py - Extra Pygments themes for the code blocks of a page
+
+Code blocks are highlighted once, with classes that do not depend on the
+theme. The page style (-hl/--highlight plus the overrides of md2html.py) is
+the base theme; every extra Pygments style is added as CSS scoped under
+html.theme-<style>. A small script at the start of the <body> puts the first
+extra theme on <html> when the reader prefers a dark color scheme, and
+window.setHighlightTheme('<style>') switches by hand ('' for the base theme).
+
+The scoped rules are !important and more specific than the overrides of the
+base theme, and tokens that the extra style leaves alone take its text color.
+The CSS of each style is generated once per process and reused for every
+document (see theme_css).
+
+Usage:
+    python md2html.py nota.md -hl default --themes monokai
+"""
+
+import re
+import json
+from functools import lru_cache
+
+from pygments.formatters import HtmlFormatter
+from pygments.token import STANDARD_TYPES
+
+from css_cascade import COMMENT_RE
+
+THEME_CLASS_PREFIX = 'theme-'
+SWITCH_SCRIPT_ID = 'highlight-theme-switch'
+
+THEME_SWITCH_JS = """(function() {
+  var themes = __THEMES__;
+  var root = document.documentElement;
+  function apply(name) {
+    themes.forEach(function(theme) { root.classList.remove(theme); });
+    if (name) root.classList.add(name);
+  }
+  window.setHighlightTheme = function(style) {
+    apply(style ? '__PREFIX__' + style.replace(/[^\\w-]/g, '-') : null);
+  };
+  // El primer tema extra es el de los lectores con esquema de color oscuro
+  if (window.matchMedia) {
+    var dark = window.matchMedia('(prefers-color-scheme: dark)');
+    apply(dark.matches ? themes[0] : null);
+    if (dark.addEventListener) {
+      dark.addEventListener('change', function(e) { apply(e.matches ? themes[0] : null); });
+    }
+  }
+})();"""
+
+
+def theme_class(style):
+    """Class that selects a theme on <html>."""
+    return THEME_CLASS_PREFIX + re.sub(r'[^\w-]', '-', style)
+
+
+@lru_cache(maxsize=None)
+def theme_css(style):
+    """CSS of a Pygments style scoped under html.theme-<style> (cached per process)."""
+    scope = f'html.{theme_class(style)} .highlight'
+    token_rule = re.compile(rf'^{re.escape(scope)} \.([\w-]+)$')
+    rules = []
+    styled = set()
+    for line in HtmlFormatter(style=style).get_style_defs(scope).splitlines():
+        # pre y linenos no dependen del tema: ya están en el tema base
+        if not line.startswith(scope):
+            continue
+        selector, _, body = COMMENT_RE.sub('', line).partition('{')
+        selector = selector.strip()
+        # 'background' de Pygments es siempre un color: como background-color le gana al del tema base
+        declarations = [re.sub(r'^background\s*:', 'background-color:', d.strip())
+                        for d in body.replace('}', '').split(';') if d.strip()]
+        if not declarations:
+            continue
+        rules.append(f"{selector} {{ {'; '.join(d + ' !important' for d in declarations)}; }}")
+        match = token_rule.match(selector)
+        if match:
+            styled.add(match.group(1))
+
+    # Los tokens que el estilo no colorea toman su color de texto, no el del tema base
+    resets = [f"{scope} .{cls} {{ color: inherit !important; font-weight: inherit !important; "
+              f"font-style: inherit !important; }}"
+              for cls in sorted({c for c in STANDARD_TYPES.values() if c} - styled)]
+    return '\n'.join(resets + rules)
+
+
+def theme_switch_script(themes):
+    """Script (for the start of the <body>) that applies the theme preferred by the reader."""
+    return (THEME_SWITCH_JS.replace('__THEMES__', json.dumps([theme_class(t) for t in themes]))
+            .replace('__PREFIX__', THEME_CLASS_PREFIX))
@@ -1,13 +1,77 @@
+import re
 import sys
 import os
+import json
 import argparse
 from bs4 import BeautifulSoup
 
+import build_metrics
+from collapsible import RUNTIME_PROTOTYPES, RUNTIME_STYLES_ID
+from critical_css import defer_styles, static_selector
+from css_cascade import (ElementIndex, PSEUDO_ELEMENT_RE, iter_css_blocks, match_selector, parse_declarations,
+                         resolve_styles, format_style, split_top_level)
+from output_utils import write_if_changed
+from svg_optimize import inline_svg_bytes
+
+CSS_MODES = ('static', 'critical', 'textarea')
+DYNAMIC_STYLE_ID = 'dynamic-css'
+
+# Propiedades heredadas: el hijo calcula el mismo valor que su ancestro si no declara otro
+INHERITED_PROPERTIES = {
+    'color', 'cursor', 'direction', 'font-family', 'font-size', 'font-style', 'font-variant', 'font-weight',
+    'letter-spacing', 'line-height', 'list-style', 'list-style-position', 'list-style-type', 'overflow-wrap',
+    'tab-size', 'text-align', 'text-indent', 'text-shadow', 'text-transform', 'visibility', 'white-space',
+    'word-break', 'word-spacing', 'word-wrap',
+}
+# Valores que dependen del elemento (em, %, bolder...) aunque se escriban igual que en el ancestro
+RELATIVE_VALUE_RE = re.compile(r'\d(?:em|ex|ch|%)|\b(?:smaller|larger|bolder|lighter|inherit|initial|unset|revert)\b'
+                               r'|var\(', re.IGNORECASE)
+# Propiedades heredadas que el navegador fija en algunos elementos (su valor no viene del ancestro)
+UA_INHERITED = {
+    'a': {'color', 'cursor'}, 'b': {'font-weight'}, 'strong': {'font-weight'}, 'th': {'font-weight', 'text-align'},
+    'em': {'font-style'}, 'i': {'font-style'}, 'cite': {'font-style'}, 'var': {'font-style'}, 'dfn': {'font-style'},
+    'address': {'font-style'}, 'code': {'font-family'}, 'kbd': {'font-family'}, 'samp': {'font-family'},
+    'tt': {'font-family'}, 'pre': {'font-family', 'white-space'}, 'small': {'font-size'}, 'big': {'font-size'},
+    'sub': {'font-size'}, 'sup': {'font-size'}, 'mark': {'color'}, 'caption': {'text-align'},
+    'center': {'text-align'}, 'h1': {'font-size', 'font-weight'}, 'h2': {'font-size', 'font-weight'},
+    'h3': {'font-size', 'font-weight'}, 'h4': {'font-size', 'font-weight'}, 'h5': {'font-size', 'font-weight'},
+    'h6': {'font-size', 'font-weight'},
+}
+# Valor inicial de las heredadas: lo que calcula un elemento si ningún ancestro declara otro
+INHERITED_INITIAL = {
+    'font-weight': {'normal', '400'}, 'font-style': {'normal'}, 'font-variant': {'normal'},
+    'letter-spacing': {'normal'}, 'word-spacing': {'normal', '0'}, 'text-indent': {'0'},
+    'text-transform': {'none'}, 'text-shadow': {'none'}, 'visibility': {'visible'}, 'cursor': {'auto'},
+    'direction': {'ltr'}, 'word-break': {'normal'}, 'overflow-wrap': {'normal'}, 'word-wrap': {'normal'},
+}
+FORM_TAGS = {'button', 'input', 'select', 'textarea', 'option', 'optgroup'}
+# Valores iniciales de propiedades no heredadas (los resets que el CSS de código repite en cada token)
+INITIAL_VALUES = {
+    'background': {'none', 'transparent'}, 'background-color': {'transparent'}, 'background-image': {'none'},
+    'border': {'none', '0'}, 'box-shadow': {'none'}, 'text-decoration': {'none'}, 'outline': {'none', '0'},
+    'margin': {'0'}, 'padding': {'0'}, 'float': {'none'}, 'transform': {'none'}, 'filter': {'none'},
+}
+# Elementos sin estilos del navegador en esas propiedades
+NEUTRAL_TAGS = {'span', 'div', 'section', 'article', 'header', 'footer', 'main', 'nav', 'aside', 'label', 'li'}
+
+# Lo que el cargador del textarea forzaba con un setTimeout de 1 s, ahora al generar la página
+BUTTON_OVERRIDES_CSS = """
+.collapsible-container .toggle-button, .collapsible-container .copy-button { color: black !important; }
+"""
+
 def _parse_arguments():
     parser = argparse.ArgumentParser(description='Convertir estilos CSS en <style> a inline y mover scripts.')
     parser.add_argument('input_file', help='Input HTML file')
     parser.add_argument('-o', '--output', nargs='?', const=True,
                         help='Optional output file name. If used without value, default to input filename with _inline.')
+    parser.add_argument('--css-mode', choices=CSS_MODES, default='static',
+                        help='static: la cascada se resuelve al generar la página y se escribe en atributos style '
+                             '(por defecto; sobrevive a un host que elimina los <style>, pero la página pesa '
+                             'alrededor de 1,4 veces la de critical: 220 KB contra 154 KB en '
+                             'apuntes_typescript_parte_1, ver bench.py static); critical: CSS de la primera pantalla '
+                             'en el <head> y el resto después del primer pintado (la más liviana si el host conserva '
+                             'los <style>); textarea: todo el CSS en el <textarea> css-editor, cargado con JS '
+                             '(alternativa)')
     return parser.parse_args()
 
 def process_mermaid_divs(soup):
@@ -33,24 +97,190 @@ def process_mermaid_divs(soup):
                     new_text = new_text.replace('\r', '#10')
                     text_node.replace_with(new_text)
 
-def main():
-    args = _parse_arguments()
-    archivo_entrada = args.input_file
+def shadows(prop, inline_props):
+    """True if a style attribute with inline_props sets prop (itself, a longhand or its shorthand)."""
+    return any(other == prop or other.startswith(prop + '-') or prop.startswith(other + '-')
+               for other in inline_props)
 
-    # Determinar archivo de salida
-    if args.output:
-        # Si se proporcionó '-o' sin valor, args.output == True
-        if args.output is True:
-            base, ext = os.path.splitext(archivo_entrada)
-            archivo_salida = f"{base}_inline.html"
+
+def _important(block, inline_props):
+    """The declarations of block, with !important on those that a style attribute would otherwise win."""
+    declarations = parse_declarations(block)
+    if not any(shadows(prop, inline_props) for prop, _, _ in declarations):
+        return block.strip()
+    return '; '.join(f"{prop}: {value}{' !important' if important or shadows(prop, inline_props) else ''}"
+                     for prop, value, important in declarations)
+
+
+def _match_static(index, selector):
+    try:
+        return match_selector(index, static_selector(selector))
+    except Exception:
+        return None
+
+
+def dynamic_rules(soup, css_content, inline_props=None, targets=None):
+    """
+    Rules that cannot be written as style attributes (:hover, ::before,
+    @media...), keeping only those whose static part matches something.
+
+    inline_props ({id(element): props}) are the styles that become style
+    attributes. A stylesheet rule never beats a style attribute, so the
+    declarations of a rule that set one of those properties on an element it
+    matches get !important (a:hover over the static colour of the link).
+    targets (a set), if given, collects id() of every element the kept rules
+    (and the rules inside @media/@supports) can match.
+    """
+    index = ElementIndex(soup)
+    rules = []
+    for prelude, block in iter_css_blocks(css_content, at_rules=True):
+        if prelude.startswith('@'):
+            rules.append(f"{prelude} {{{block}}}")
+            if targets is not None and prelude.startswith(('@media', '@supports')):
+                for inner, _ in iter_css_blocks(block):
+                    for selector in split_top_level(inner, ','):
+                        targets.update(id(element) for element in _match_static(index, selector.strip()) or ())
+            continue
+        for selector in split_top_level(prelude, ','):
+            selector = ' '.join(selector.split())
+            if not selector or static_selector(selector) == selector:
+                continue
+            matched = _match_static(index, selector)
+            if matched == []:
+                continue
+            if targets is not None and matched:
+                targets.update(id(element) for element in matched)
+            rule_block = block.strip()
+            # Un pseudo-elemento no hereda el atributo style de su elemento
+            if inline_props and matched and not PSEUDO_ELEMENT_RE.search(selector):
+                props = set()
+                for element in matched:
+                    props.update(inline_props.get(id(element), ()))
+                rule_block = _important(block, props)
+            rules.append(f"{selector} {{{rule_block}}}")
+    return rules
+
+def _inherited_values(element, prop, resolved):
+    """Values an inherited prop of element may have from its ancestors (a set; empty if unknown)."""
+    for ancestor in element.parents:
+        props = resolved.get(id(ancestor))
+        if props:
+            if prop in props:
+                value = props[prop][0]
+                return set() if RELATIVE_VALUE_RE.search(value) else {' '.join(value.split()).lower()}
+            if any(shadows(prop, [other]) for other in props):
+                return set()
+        # El navegador fija la propiedad en el ancestro: no viene de más arriba
+        if ancestor.name in FORM_TAGS or prop in UA_INHERITED.get(ancestor.name, ()):
+            return set()
+    return INHERITED_INITIAL.get(prop, set())
+
+
+def minimal_style(element, props, resolved):
+    """
+    props without the declarations that cannot change how element renders
+    once no stylesheet is left: an inherited property with the value the
+    element already inherits, or a non-inherited one at its initial value on
+    an element the browser does not style. The !important flags only matter
+    against other stylesheets, so they are dropped too.
+
+    Only for elements that no rule of <style id="dynamic-css"> matches.
+    resolved ({id(element): props}) are the full styles of the page.
+    """
+    kept = {}
+    for prop, (value, important) in props.items():
+        # Un shorthand/longhand del mismo elemento depende del orden: se conservan los dos
+        related = any(other != prop and shadows(prop, [other]) for other in props)
+        normalized = ' '.join(value.split()).lower()
+        if not related and element.name not in FORM_TAGS:
+            if prop in INHERITED_PROPERTIES and prop not in UA_INHERITED.get(element.name, ()):
+                if normalized in _inherited_values(element, prop, resolved):
+                    continue
+            elif element.name in NEUTRAL_TAGS and normalized in INITIAL_VALUES.get(prop, ()):
+                continue
+        kept[prop] = (value, False)
+    return kept
+
+
+def apply_static_styles(soup, css_content, minimal=True):
+    """
+    Resolve the cascade at build time and write it as style attributes
+    (css_cascade.py), so the page needs no CSS at runtime.
+
+    The elements that collapsible.py creates at runtime get their styles from
+    RUNTIME_PROTOTYPES, as JSON in <script id="runtime-styles">. Rules that no
+    attribute can express (:hover, ::before, @media...) are kept in
+    <style id="dynamic-css">; the page looks right without them, so it does
+    not matter if the host strips it. Their declarations of properties that
+    are also in the style attribute get !important, or they would never apply.
+
+    With minimal (the default) the style attributes of the elements that no
+    dynamic rule matches only keep what changes their rendering (see
+    minimal_style): the resets of the code CSS repeated on every token span
+    are most of the weight of a page otherwise.
+
+    Returns {'styled_elements': n, 'dynamic_rules': n}.
+    """
+    body = soup.body or soup
+    prototypes = []
+    runtime_elements = {}
+    if soup.find('div', class_='collapsible-container'):
+        for state, markup in RUNTIME_PROTOTYPES.items():
+            prototype = BeautifulSoup(markup, 'html.parser').div
+            body.append(prototype)
+            prototypes.append(prototype)
+            for child in prototype.find_all(True, recursive=False):
+                if child.get('class'):
+                    runtime_elements[id(child)] = (state, child['class'][0])
+    prototype_nodes = {id(node) for prototype in prototypes for node in [prototype, *prototype.find_all(True)]}
+
+    resolved = resolve_styles(soup, [css_content, BUTTON_OVERRIDES_CSS])
+    resolved_props = {id(element): props for element, props in resolved}
+    targets = set()
+    dynamic = dynamic_rules(soup, css_content, resolved_props, targets)
+    for prototype in prototypes:
+        prototype.decompose()
+
+    runtime = {}
+    styled = 0
+    for element, props in resolved:
+        if id(element) in runtime_elements:
+            state, class_name = runtime_elements[id(element)]
+            runtime.setdefault(state, {})[class_name] = format_style(props, compact=True)
+        elif id(element) not in prototype_nodes:
+            if minimal and id(element) not in targets:
+                props = minimal_style(element, props, resolved_props)
+                if not props:
+                    continue
+            element['style'] = format_style(props, compact=True)
+            styled += 1
+
+    if dynamic:
+        style_tag = soup.new_tag('style', id=DYNAMIC_STYLE_ID)
+        style_tag.string = '\n'.join(dynamic)
+        if soup.head:
+            soup.head.append(style_tag)
         else:
-            archivo_salida = args.output
-    else:
-        base, ext = os.path.splitext(archivo_entrada)
-        archivo_salida = f"{base}_inline.html"
+            soup.insert(0, style_tag)
+    if runtime:
+        data_tag = soup.new_tag('script', type='application/json', id=RUNTIME_STYLES_ID)
+        data_tag.string = json.dumps(runtime, ensure_ascii=False).replace('</', '<\\/')
+        body.append(data_tag)
+    return {'styled_elements': styled, 'dynamic_rules': len(dynamic)}
 
-    with open(archivo_entrada, "r", encoding="utf-8") as f:
-        soup = BeautifulSoup(f, "html.parser")
+def inline_document(html, css_mode='static'):
+    """
+    Write the <head> styles as style attributes, wrap the <head> scripts in
+    DOMContentLoaded and encode Mermaid line breaks (in memory).
+
+    css_mode='critical' splits the styles instead: the rules of the first
+    screen stay in the <head> and the rest is applied after the first paint
+    (see critical_css.py). css_mode='textarea' is the fallback: the styles go
+    to the css-editor <textarea> and a script injects them on load.
+
+    Returns (prettified_html, stats).
+    """
+    soup = BeautifulSoup(html, "html.parser")
 
     head = soup.head
     
@@ -77,8 +307,19 @@ def main():
     # NUEVA FUNCIONALIDAD: Procesar divs de clase "mermaid"
     process_mermaid_divs(soup)
 
-    # Solo crear el textarea si hay contenido CSS para procesar
-    if css_content.strip():
+    mode_stats = {}
+    if not css_content.strip():
+        pass
+    elif css_mode == 'static':
+        # La cascada se resuelve ahora: sin CSS que inyectar al cargar la página
+        mode_stats = apply_static_styles(soup, css_content)
+    elif css_mode == 'critical':
+        # CSS de la primera pantalla en el <head>, el resto después del primer pintado
+        mode_stats = defer_styles(soup, css_content)
+        build_metrics.record('css_bytes', mode_stats['critical_bytes'], 'critical')
+        build_metrics.record('css_bytes', mode_stats['deferred_bytes'], 'deferred')
+    else:
+        # Solo crear el textarea si hay contenido CSS para procesar
         # Crear <textarea> para el CSS extraído (invisible al usuario)
         textarea_tag = soup.new_tag("textarea")
         textarea_tag['id'] = "css-editor"
@@ -147,19 +388,61 @@ document.addEventListener('DOMContentLoaded', function() {
 """
         soup.body.append(mermaid_restore_script)
 
-    with open(archivo_salida, "w", encoding="utf-8") as f:
-        f.write(str(soup.prettify()))
+    stats = {
+        'style_tags': len(style_tags),
+        'has_css': bool(css_content.strip()),
+        'wrapped_scripts': len(wrapped_scripts),
+        'mermaid_divs': len(mermaid_divs),
+        **mode_stats,
+    }
+    output = str(soup.prettify())
+    # El SVG tal como queda en la página (lo que ahorra svg_optimize.py después de resolver los estilos)
+    svg_bytes = inline_svg_bytes(output)
+    if svg_bytes:
+        stats['svg_bytes'] = svg_bytes
+        build_metrics.incr('svg_bytes', 'final', amount=svg_bytes)
+    return output, stats
+
+def main():
+    args = _parse_arguments()
+    archivo_entrada = args.input_file
+
+    # Determinar archivo de salida
+    if args.output:
+        # Si se proporcionó '-o' sin valor, args.output == True
+        if args.output is True:
+            base, ext = os.path.splitext(archivo_entrada)
+            archivo_salida = f"{base}_inline.html"
+        else:
+            archivo_salida = args.output
+    else:
+        base, ext = os.path.splitext(archivo_entrada)
+        archivo_salida = f"{base}_inline.html"
+
+    with open(archivo_entrada, "r", encoding="utf-8") as f:
+        html = f.read()
+    output, stats = inline_document(html, args.css_mode)
+
+    write_if_changed(archivo_salida, output)
 
     print(f"Archivo procesado: {archivo_entrada}")
     print(f"Archivo de salida: {archivo_salida}")
-    if css_content.strip():
-        print(f"CSS extraído y convertido a inline: {len(style_tags)} etiquetas <style>")
+    if 'styled_elements' in stats:
+        print(f"CSS resuelto en atributos style: {stats['styled_elements']} elementos "
+              f"({stats['dynamic_rules']} reglas dinámicas en <style id=\"{DYNAMIC_STYLE_ID}\">)")
+    elif 'critical_bytes' in stats:
+        print(f"CSS crítico en el <head>: {stats['critical_bytes']} bytes; "
+              f"diferido tras el primer pintado: {stats['deferred_bytes']} bytes")
+    elif stats['has_css']:
+        print(f"CSS extraído y convertido a inline: {stats['style_tags']} etiquetas <style>")
     else:
         print("No se encontraron etiquetas <style> para procesar")
-    if wrapped_scripts:
-        print(f"Scripts del <head> movidos al final del <body>: {len(wrapped_scripts)}")
-    if mermaid_divs:
-        print(f"Divs Mermaid procesados: {len(mermaid_divs)}")
+    if stats['wrapped_scripts']:
+        print(f"Scripts del <head> movidos al final del <body>: {stats['wrapped_scripts']}")
+    if stats['mermaid_divs']:
+        print(f"Divs Mermaid procesados: {stats['mermaid_divs']}")
+    if 'svg_bytes' in stats:
+        print(f"SVG en la página final: {stats['svg_bytes']} bytes")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -3,13 +3,20 @@
 md2html.py - Convert Markdown files to HTML with optional CSS styling and syntax highlighting
 
 Usage:
-    python md2html.py input.md [-s style.css] [-o output.html] [-hl highlight_style]
+    python md2html.py input.md [-s style.css] [-o output.html] [-hl highlight_style] [--themes monokai ...]
 """
 
+import re
 import sys
+import json
+import hashlib
 import argparse
 import markdown
+from functools import lru_cache
+import pygments
+from html import escape
 from pathlib import Path
+from markdown.extensions.toc import unique
 from pygments import highlight
 from pygments.lexers import JavascriptLexer, get_lexer_by_name
 from pygments.lexers.python import PythonLexer
@@ -20,6 +27,16 @@ from pygments.styles import get_all_styles
 from pygments.util import ClassNotFound
 from pygments.lexers.special import TextLexer
 
+from batch_highlight import BatchHighlighter
+from compact_highlight import CompactHtmlFormatter
+from highlight_themes import SWITCH_SCRIPT_ID, theme_class, theme_css, theme_switch_script
+from inline_css import CSS_MODES
+from svg_optimize import CACHE_FILENAME as SVG_CACHE_FILENAME, SvgCache, SvgOptimizer
+from mermaid_runtime import (LOADER_ID as MERMAID_LOADER_ID, MERMAID_CDN_URL, install_mermaid_asset,
+                             mermaid_loader_script)
+import build_metrics
+from output_utils import write_if_changed, write_chunks_if_changed
+
 class EnhancedSyntaxExtension(markdown.Extension):
     """
     Markdown extension for syntax highlighting with focus on MongoDB, JavaScript, JSX, Python, Bash, Mermaid, and SVG
@@ -150,6 +167,203 @@ class EnhancedSyntaxPreprocessor(markdown.preprocessors.Preprocessor):
             
         return text.split('\n')
 
+CACHE_DIRNAME = '.md2html_cache'
+CACHE_VERSION = 2
+
+# Módulos cuyo código decide el HTML de una sección (svg_optimize.py entra por render_settings)
+SECTION_SOURCES = ('md2html.py', 'batch_highlight.py', 'compact_highlight.py', 'css_cascade.py',
+                   'highlight_themes.py')
+# Cambia cuando cambia uno de esos archivos, Markdown o Pygments: invalida todas las secciones
+_SOURCE_DIGEST = hashlib.sha256(b''.join(hashlib.sha256((Path(__file__).parent / name).read_bytes()).digest()
+                                         for name in SECTION_SOURCES)).hexdigest()
+SECTION_HEADING_RE = re.compile(r'^##(?!#)')
+FENCE_RE = re.compile(r'^\s*(```|~~~)')
+REFERENCE_DEF_RE = re.compile(r'^[ ]{0,3}\[([^\[\]]*)\]:[ ]*\S')
+HEADING_ID_RE = re.compile(r'(<h[1-6] id=")([^"]*)(")')
+# Encabezado centinela al final de cada sección: conserva el separador exacto con la siguiente
+SECTION_END = 'md2htmlsectionend'
+SECTION_END_RE = re.compile(r'<h2 id="[^"]*">' + SECTION_END + r'</h2>$')
+
+
+class SectionCache:
+    """
+    Rendered HTML of the top-level sections of one document, keyed by the hash
+    of the section source and the render settings.
+
+    Each entry also keeps the counters reported while rendering the section
+    (build_metrics.recording), so a cached section reports the same metrics
+    as a rendered one.
+    """
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.entries = {}
+        self.used = {}
+        self.hits = 0
+        self.misses = 0
+        if self.path and self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_VERSION:
+                    self.entries = data.get('sections', {})
+            except (OSError, ValueError):
+                pass
+
+    @classmethod
+    def for_document(cls, output_dir, name):
+        return cls(Path(output_dir) / CACHE_DIRNAME / f'{name}.sections.json')
+
+    def get(self, key):
+        """(html, metric events) of a cached section, or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[key] = entry
+        return entry
+
+    def put(self, key, html, events=()):
+        self.used[key] = [html, list(events)]
+
+    def save(self):
+        """Keep only the sections of the last render (nothing is written if unchanged)."""
+        if self.path is None or self.used == self.entries:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Escritura atómica: varios procesos (render_server.py) pueden compartir el caché
+        write_if_changed(self.path, json.dumps({'version': CACHE_VERSION, 'sections': self.used},
+                                               ensure_ascii=False))
+        self.entries = dict(self.used)
+
+
+def iter_sections(lines, references):
+    """
+    Group Markdown lines into sections, starting a new one before every
+    top-level '## ' heading outside fenced code (the same boundaries as the
+    chapter-container divs).
+
+    Yields each section as a list of lines and fills references with the
+    reference-style link definitions (lowercase label -> line; the last one
+    wins, as in Markdown).
+    """
+    current = []
+    fence = None
+    for line in lines:
+        m = FENCE_RE.match(line)
+        if fence is None and m:
+            fence = m.group(1)
+        elif fence is not None and line.lstrip().startswith(fence):
+            fence = None
+        elif fence is None:
+            if SECTION_HEADING_RE.match(line) and current:
+                yield current
+                current = []
+            ref = REFERENCE_DEF_RE.match(line)
+            if ref:
+                references[ref.group(1).strip().lower()] = line
+        current.append(line)
+    yield current
+
+
+def split_sections(md_content):
+    """
+    Split the Markdown source into sections (see iter_sections).
+
+    Returns (sections, reference_definitions).
+    """
+    references = {}
+    sections = ['\n'.join(lines) for lines in iter_sections(md_content.split('\n'), references)]
+    return sections, references
+
+
+def read_lines(md_path):
+    """Lines of a Markdown file read lazily (same result as content.split('\\n'))."""
+    with open(md_path, 'r', encoding='utf-8') as f:
+        line = ''
+        for line in f:
+            yield line[:-1] if line.endswith('\n') else line
+        if line == '' or line.endswith('\n'):
+            yield ''
+
+
+def iter_file_sections(md_path):
+    """
+    Yield (section, is_last, references) for a Markdown file without loading it
+    whole: a first pass collects the reference definitions, the second one
+    yields the sections one at a time.
+    """
+    references = {}
+    for _ in iter_sections(read_lines(md_path), references):
+        pass
+    previous = None
+    for lines in iter_sections(read_lines(md_path), {}):
+        if previous is not None:
+            yield previous, False, references
+        previous = '\n'.join(lines)
+    yield previous, True, references
+
+
+class SectionRenderer:
+    """
+    Convert a document section by section, reusing cached sections.
+
+    Sections are rendered on their own, so the state that crosses sections is
+    rebuilt here: reference-style link definitions used by a section are
+    prepended to its source, and heading ids are made unique across the whole
+    document in order (as the toc extension does for a single conversion).
+    """
+
+    def __init__(self, md, references, cache=None, render_settings=''):
+        self.md = md
+        self.references = references
+        self.cache = cache
+        self.settings = (f'{CACHE_VERSION}:{_SOURCE_DIGEST}:{markdown.__version__}:{pygments.__version__}:'
+                         f'{render_settings}')
+        self.used_ids = set()
+
+    def _dedupe(self, match):
+        heading_id = match.group(2)
+        if heading_id in self.used_ids:
+            heading_id = unique(heading_id, self.used_ids)
+        else:
+            self.used_ids.add(heading_id)
+        return match.group(1) + heading_id + match.group(3)
+
+    def render(self, section, is_last):
+        lowered = section.lower()
+        used_refs = [line for label, line in self.references.items() if f'[{label}]' in lowered]
+        if used_refs:
+            section = '\n'.join(used_refs) + '\n\n' + section
+        if not is_last:
+            section = section + '\n## ' + SECTION_END
+        key = hashlib.sha256(f'{self.settings}\n{section}'.encode('utf-8')).hexdigest()
+        entry = self.cache.get(key) if self.cache is not None else None
+        build_metrics.incr('section_cache_misses' if entry is None else 'section_cache_hits')
+        if entry is None:
+            with build_metrics.recording() as events:
+                html = self.md.reset().convert(section)
+            if not is_last:
+                end = SECTION_END_RE.search(html)
+                html = html[:end.start()] if end else html + '\n'
+            if self.cache is not None:
+                self.cache.put(key, html, events)
+        else:
+            # Los contadores del bloque (lenguajes, mermaid, fallbacks...) como si se hubiera convertido
+            html, events = entry
+            build_metrics.replay(events)
+        return HEADING_ID_RE.sub(self._dedupe, html)
+
+
+def render_sections(md, md_content, cache, render_settings):
+    """Convert md_content section by section, reusing cached sections (see SectionRenderer)."""
+    sections, references = split_sections(md_content)
+    renderer = SectionRenderer(md, references, cache, render_settings)
+    return ''.join(renderer.render(section, number == len(sections))
+                   for number, section in enumerate(sections, start=1))
+
+
 def list_available_styles():
     """Return a formatted list of all available Pygments styles."""
     styles = sorted(list(get_all_styles()))
@@ -163,7 +377,9 @@ def list_available_styles():
     
     return style_list
 
-def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight_style='default'):
+def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight_style='default', use_cache=True,
+                             compact_highlight=True, stream=False, themes=(), draft=False, optimize_svg=True,
+                             css_mode='static'):
     """
     Convert a Markdown file to HTML with optional CSS styling
     
@@ -172,6 +388,18 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
         css_file (str, optional): Path to a CSS file to include
         output_file (str, optional): Path for the output HTML file
         highlight_style (str, optional): Pygments style for syntax highlighting
+        use_cache (bool, optional): Reuse unchanged sections from the section cache
+        compact_highlight (bool, optional): Merge equivalent token spans in code blocks
+        stream (bool, optional): Convert and write one section at a time (bounded
+            memory for very large files; the section cache is not used)
+        themes (list, optional): Extra Pygments styles emitted as alternative
+            themes (see highlight_themes.py)
+        draft (bool, optional): Fast preview: code blocks as plain escaped
+            <pre> (no Pygments) and the page styles linked from assets/
+        optimize_svg (bool, optional): Optimize the inline SVG of ```svg blocks
+            (see svg_optimize.py)
+        css_mode (str, optional): CSS mode of inline_css.py that will finish the
+            page; with 'static' the SVG styles are not hoisted into classes
     
     Returns:
         str: Path to the generated HTML file
@@ -188,13 +416,166 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
     else:
         html_path = md_path.with_suffix('.html')
     
+    if stream:
+        html_path.parent.mkdir(parents=True, exist_ok=True)
+        chunks = (html for _, html in stream_markdown(md_path, md_path.stem, css_file, highlight_style,
+                                                      html_path.parent, compact_highlight, themes,
+                                                      optimize_svg, css_mode))
+        changed = write_chunks_if_changed(html_path, chunks)
+        print(f"Successfully converted {md_file} to {html_path}{'' if changed else ' (unchanged)'}")
+        return str(html_path)
+
     # Read markdown content
     with open(md_path, 'r', encoding='utf-8') as f:
         md_content = f.read()
+
+    cache = SectionCache.for_document(html_path.parent, md_path.stem) if use_cache else None
+    html = render_markdown(md_content, md_path.stem, css_file, highlight_style, html_path.parent, cache,
+                           compact_highlight, themes, draft, optimize_svg, css_mode)
+    if cache is not None:
+        cache.save()
+        print(f"Sections: {cache.hits + cache.misses} ({cache.hits} from cache)")
+
+    # Write the HTML file (untouched if the content is the same)
+    if write_if_changed(html_path, html):
+        print(f"Successfully converted {md_file} to {html_path}")
+    else:
+        print(f"Successfully converted {md_file} to {html_path} (unchanged)")
+    return str(html_path)
+
+def render_markdown(md_content, title, css_file=None, highlight_style='default', output_dir=None, cache=None,
+                    compact_highlight=True, themes=(), draft=False, optimize_svg=True, css_mode='static'):
+    """
+    Convert Markdown text to a complete HTML document (in memory)
+    
+    Args:
+        md_content (str): Markdown source
+        title (str): Fallback title when the document has no <h1>
+        css_file (str, optional): Path to a CSS file to embed
+        highlight_style (str, optional): Pygments style for syntax highlighting
+        output_dir (str, optional): Directory the page will be written to; the
+            Mermaid bundle is installed there (CDN fallback when None)
+        cache (SectionCache, optional): Reuse the HTML of unchanged sections
+        compact_highlight (bool, optional): Use CompactHtmlFormatter for code blocks
+        themes (list, optional): Extra Pygments styles emitted as alternative themes
+        draft (bool, optional): Code blocks as plain escaped <pre> and the page
+            styles in the shared stylesheet assets/draft.css (see install_stylesheet)
+        optimize_svg (bool, optional): Optimize the inline SVG of ```svg blocks
+            (not in drafts); the results are cached in output_dir
+        css_mode (str, optional): CSS mode of inline_css.py that will finish the
+            page ('static': the SVG styles stay on their elements; None: the
+            page keeps its stylesheet)
     
+    Returns:
+        str: The HTML document
+    """
+    svg_optimizer = _svg_optimizer(output_dir, css_mode) if optimize_svg and not draft else None
+    md, head_styles, render_settings, themes = _prepare_rendering(highlight_style, css_file, compact_highlight,
+                                                                  themes, draft, svg_optimizer)
+    if draft:
+        head_styles = [install_stylesheet(DRAFT_CSS_ASSET, _styles_text(head_styles), output_dir)]
+    if cache is None:
+        html_content = md.convert(md_content)
+    else:
+        html_content = render_sections(md, md_content, cache, render_settings)
+    html_content = wrap_chapters(html_content)
+    html_content, title = extract_title(html_content, title)
+    _finish_svg(svg_optimizer)
+
+    return (document_start(title, head_styles, themes) + html_content +
+            document_end('class="mermaid"' in html_content, output_dir))
+
+
+def stream_markdown(md_path, title=None, css_file=None, highlight_style='default', output_dir=None,
+                    compact_highlight=True, themes=(), optimize_svg=True, css_mode='static'):
+    """
+    Convert a Markdown file to HTML one top-level section at a time.
+
+    Yields (part, html) pairs where part is 'start' (doctype and <head>),
+    'section' or 'end'; joined, the html is the same document that
+    render_markdown returns. Only one section is held in memory at a time
+    (plus the reference definitions and the heading ids), so the peak memory
+    follows the largest section instead of the whole file. The <h1> title
+    block is only recognised in the first section.
+    """
+    md_path = Path(md_path)
+    svg_optimizer = _svg_optimizer(output_dir, css_mode) if optimize_svg else None
+    md, head_styles, render_settings, themes = _prepare_rendering(highlight_style, css_file, compact_highlight,
+                                                                  themes, svg_optimizer=svg_optimizer)
+    renderer = None
+    has_mermaid = False
+    for section, is_last, references in iter_file_sections(md_path):
+        if renderer is None:
+            renderer = SectionRenderer(md, references, None, render_settings)
+            html = wrap_chapters(renderer.render(section, is_last))
+            html, title = extract_title(html, title or md_path.stem)
+            yield 'start', document_start(title, head_styles, themes)
+        else:
+            html = wrap_chapters(renderer.render(section, is_last))
+        has_mermaid = has_mermaid or 'class="mermaid"' in html
+        yield 'section', html
+    _finish_svg(svg_optimizer)
+    yield 'end', document_end(has_mermaid, output_dir)
+
+
+def _svg_optimizer(output_dir, css_mode='static'):
+    """SVG optimizer whose results are cached in the section cache directory of output_dir."""
+    cache = SvgCache(Path(output_dir) / CACHE_DIRNAME / SVG_CACHE_FILENAME) if output_dir is not None else None
+    # En modo static inline_css.py volvería a escribir las clases .sN en cada elemento
+    return SvgOptimizer(cache, hoist=css_mode != 'static')
+
+
+def _finish_svg(svg_optimizer):
+    """Save the SVG cache and report the bytes saved (if there was any SVG)."""
+    if svg_optimizer is not None and svg_optimizer.count:
+        svg_optimizer.cache.save()
+        print(svg_optimizer.summary())
+
+
+# Hoja de estilos compartida por las páginas en borrador (en <output_dir>/assets/)
+DRAFT_CSS_ASSET = 'draft.css'
+
+
+def _styles_text(head_styles):
+    """CSS of the <head> style lines (without the <style> tags)."""
+    return '\n'.join(line for line in head_styles if line.strip() not in ('<style>', '</style>'))
+
+
+def install_stylesheet(name, css_text, output_dir):
+    """
+    Write a stylesheet shared by the pages of output_dir to <output_dir>/assets/<name> (only if changed).
+
+    Returns the <head> line that links it; without an output directory the CSS
+    is embedded in a <style> instead.
+    """
+    if output_dir is None:
+        return f'    <style>\n{css_text}\n    </style>'
+    assets_dir = Path(output_dir) / 'assets'
+    assets_dir.mkdir(parents=True, exist_ok=True)
+    write_if_changed(assets_dir / name, css_text + '\n')
+    return f'    <link rel="stylesheet" href="assets/{name}">'
+
+
+@lru_cache(maxsize=None)
+def _available_styles():
+    """Names of the Pygments styles (looking up the style plugins is slow: once per process)."""
+    return tuple(get_all_styles())
+
+
+def _prepare_rendering(highlight_style, css_file, compact_highlight, themes=(), draft=False, svg_optimizer=None):
+    """
+    Build the Markdown converter and the <head> styles of a page.
+
+    Returns (md, head_styles, render_settings, themes); render_settings
+    identifies the options that change the rendered HTML (for the section
+    cache) and themes are the valid extra highlight themes. With draft, code
+    blocks are not highlighted and there are no Pygments styles or themes.
+    The SVG of ```svg blocks goes through svg_optimizer (svg_optimize.py),
+    if there is one.
+    """
     # Set up Pygments formatter with the specified style
     # Verificar si el estilo existe en Pygments
-    available_styles = list(get_all_styles())
+    available_styles = _available_styles()
     
     if highlight_style not in available_styles:
         print(f"Warning: Style '{highlight_style}' not found. Available styles: {', '.join(available_styles[:10])}...")
@@ -210,6 +591,168 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
     
     pygments_css = pygments_formatter.get_style_defs('.highlight')
     
+    # Head styles of the page (also used to collapse equivalent token classes)
+    head_styles = []
+
+    # Add Pygments CSS for syntax highlighting (not needed for the plain <pre> of a draft)
+    if not draft:
+        head_styles.append('    <style>')
+        head_styles.append(pygments_css)
+        head_styles.append('    </style>')
+
+    # Add default styling for readability
+    head_styles.append('    <style>')
+    head_styles.append('        body { font-family: Arial, sans-serif; line-height: 1.6; margin: 0 auto; padding: 20px; }')
+
+    # Estilo para el div que reemplaza al h1
+    head_styles.append('        #main-title-block { background-color: #2e2e2e; color: #f0f0f0; padding: 18px; border-radius: 10px; border: 1px solid #444; box-shadow: 0 2px 5px rgba(0,0,0,0.2); font-size: 1.8em; font-weight: bold; margin-bottom: 20px; text-align: center; }')
+
+    # Estilo para bloques pre fuera de .highlight
+    head_styles.append('        pre:not(.highlight pre) { background-color: #fef6e4; color: #2e2e2e; padding: 12px; border-radius: 5px; overflow-x: auto; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); margin: 15px 0; }')
+    head_styles.append('        code { font-family: "Courier New", Courier, monospace; }')
+    
+    # ConfiguraciÃ³n mejorada para los bloques de resaltado de sintaxis (contenedor externo)
+    head_styles.append('        .highlight { padding: 0; border-radius: 5px; margin: 15px 0; background-color: #fef6e4 !important; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }')
+    
+    # Quitar bordes y fondos duplicados del pre dentro de .highlight
+    head_styles.append('        .highlight pre { background: none; border: none; box-shadow: none; padding: 12px; margin: 0; border-radius: 0; }')
+    
+    # ConfiguraciÃ³n para las lÃ­neas de comentarios en los bloques de cÃ³digo
+    head_styles.append('        .highlight .c, .highlight .c1, .highlight .cm { color: #9a8052 !important; font-style: italic; }') 
+    
+    # ConfiguraciÃ³n para las palabras clave en los bloques de cÃ³digo
+    head_styles.append('        .highlight .k, .highlight .kd, .highlight .kn { color: #8250df !important; font-weight: normal; }')
+    
+    # ConfiguraciÃ³n para las cadenas de texto en los bloques de cÃ³digo
+    head_styles.append('        .highlight .s, .highlight .s1, .highlight .s2, .highlight .sb, .highlight .si { color: #327d41 !important; }')
+    
+    # ConfiguraciÃ³n para los nÃºmeros en los bloques de cÃ³digo
+    head_styles.append('        .highlight .m, .highlight .mi, .highlight .mf { color: #606060 !important; }')
+    
+    # ConfiguraciÃ³n para los operadores en los bloques de cÃ³digo
+    head_styles.append('        .highlight .o, .highlight .ow { color: #666666 !important; font-weight: normal; }')
+    
+    # ConfiguraciÃ³n para las constantes en los bloques de cÃ³digo
+    head_styles.append('        .highlight .kc, .highlight .no { color: #9a5b13 !important; }')
+    
+    # ConfiguraciÃ³n para las funciones y clases en los bloques de cÃ³digo
+    head_styles.append('        .highlight .nf, .highlight .nb, .highlight .nx { color: #606060 !important; font-weight: normal; }')
+    
+    # Mejorar la visibilidad de parÃ©ntesis, corchetes, llaves, puntos y coma, etc.
+    head_styles.append('        .highlight .p { color: #666666 !important; font-weight: normal; }')
+    
+    # JSX/React specific styling - Colores basados en la imagen proporcionada
+    head_styles.append('        .language-jsx .highlight .k, .language-jsx .highlight .kd, .language-jsx .highlight .kr { color: #af00db !important; font-weight: normal; background: none !important; border: none !important; }')  # Keywords (function, const, return) - pÃºrpura
+    head_styles.append('        .language-jsx .highlight .nx, .language-jsx .highlight .nf { color: #0969da !important; background: none !important; border: none !important; }')  # Functions/variables - azul
+    head_styles.append('        .language-jsx .highlight .nt { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Opening tags - verde
+    head_styles.append('        .language-jsx .highlight .nc { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Component names - verde
+    head_styles.append('        .language-jsx .highlight .o  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Operators
+    head_styles.append('        .language-jsx .highlight .p  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Punctuation
+    head_styles.append('        .language-jsx .highlight .na { color: #0969da !important; background: none !important; border: none !important; }')  # JSX attributes - azul
+    head_styles.append('        .language-jsx .highlight .s, .language-jsx .highlight .s1, .language-jsx .highlight .s2 { color: #0a3069 !important; background: none !important; border: none !important; }')   # Strings - azul oscuro
+    head_styles.append('        .language-jsx .highlight .c, .language-jsx .highlight .c1, .language-jsx .highlight .cm { color: #656d76 !important; font-style: italic; background: none !important; border: none !important; }')   # Comments - gris
+    head_styles.append('        .language-jsx .highlight .m, .language-jsx .highlight .mi, .language-jsx .highlight .mf { color: #0969da !important; background: none !important; border: none !important; }')   # Numbers - azul
+    
+    head_styles.append('        .language-react .highlight .k, .language-react .highlight .kd, .language-react .highlight .kr { color: #af00db !important; font-weight: normal; background: none !important; border: none !important; }')  # Keywords - pÃºrpura
+    head_styles.append('        .language-react .highlight .nx, .language-react .highlight .nf { color: #0969da !important; background: none !important; border: none !important; }')  # Functions/variables - azul
+    head_styles.append('        .language-react .highlight .nt { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Opening tags - verde
+    head_styles.append('        .language-react .highlight .nc { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Component names - verde
+    head_styles.append('        .language-react .highlight .o  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Operators
+    head_styles.append('        .language-react .highlight .p  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Punctuation
+    head_styles.append('        .language-react .highlight .na { color: #0969da !important; background: none !important; border: none !important; }')  # React attributes - azul
+    head_styles.append('        .language-react .highlight .s, .language-react .highlight .s1, .language-react .highlight .s2 { color: #0a3069 !important; background: none !important; border: none !important; }')   # Strings - azul oscuro
+    head_styles.append('        .language-react .highlight .c, .language-react .highlight .c1, .language-react .highlight .cm { color: #656d76 !important; font-style: italic; background: none !important; border: none !important; }')   # Comments - gris
+    head_styles.append('        .language-react .highlight .m, .language-react .highlight .mi, .language-react .highlight .mf { color: #0969da !important; background: none !important; border: none !important; }')   # Numbers - azul
+    
+    # TSX specific styling - mismos colores con adiciÃ³n de tipos TypeScript
+    head_styles.append('        .language-tsx .highlight .k, .language-tsx .highlight .kd, .language-tsx .highlight .kr { color: #af00db !important; font-weight: normal; background: none !important; border: none !important; }')  # Keywords - pÃºrpura
+    head_styles.append('        .language-tsx .highlight .nx, .language-tsx .highlight .nf { color: #0969da !important; background: none !important; border: none !important; }')  # Functions/variables - azul
+    head_styles.append('        .language-tsx .highlight .nt { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Opening tags - verde
+    head_styles.append('        .language-tsx .highlight .nc { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Component names - verde
+    head_styles.append('        .language-tsx .highlight .o  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Operators
+    head_styles.append('        .language-tsx .highlight .p  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Punctuation
+    head_styles.append('        .language-tsx .highlight .na { color: #0969da !important; background: none !important; border: none !important; }')  # TSX attributes - azul
+    head_styles.append('        .language-tsx .highlight .s, .language-tsx .highlight .s1, .language-tsx .highlight .s2 { color: #0a3069 !important; background: none !important; border: none !important; }')   # Strings - azul oscuro
+    head_styles.append('        .language-tsx .highlight .c, .language-tsx .highlight .c1, .language-tsx .highlight .cm { color: #656d76 !important; font-style: italic; background: none !important; border: none !important; }')   # Comments - gris
+    head_styles.append('        .language-tsx .highlight .m, .language-tsx .highlight .mi, .language-tsx .highlight .mf { color: #0969da !important; background: none !important; border: none !important; }')   # Numbers - azul
+    head_styles.append('        .language-tsx .highlight .kt { color: #0969da !important; background: none !important; border: none !important; }')   # TypeScript types - azul
+    
+    # JavaScript specific styling
+    head_styles.append('        .language-javascript .highlight .err { color: #116329 !important; background: none !important; border: none !important; }')  # Error class (for JSX closing tags in JS) - verde
+    head_styles.append('        .language-js .highlight .err { color: #116329 !important; background: none !important; border: none !important; }')  # Error class (for JSX closing tags in JS) - verde
+    
+    # Remover cualquier decoraciÃ³n adicional
+    head_styles.append('        .highlight span { background: none !important; border: none !important; box-shadow: none !important; text-decoration: none !important; outline: none !important; }')
+    
+    # SVG container styling
+    head_styles.append('        .svg-container { margin: 15px 0; text-align: center; padding: 10px; }')
+    head_styles.append('        .svg-container svg { max-width: 100%; height: auto; }')
+    
+    # Mermaid diagram styling
+    head_styles.append('        .mermaid { margin: 15px 0; text-align: center; }')
+    head_styles.append('        .mermaid svg { max-width: 100%; height: auto; }')
+    
+    # Otras configuraciones de estilo
+    head_styles.append('        .empty-code-block { background-color: #fef6e4; color: #2e2e2e; padding: 12px; border-radius: 5px; margin: 15px 0; font-family: monospace; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }')
+    head_styles.append('        .highlight-error { background-color: #fef6e4; color: #000080; padding: 12px; border-radius: 5px; margin: 15px 0; font-family: monospace; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }')
+    
+    head_styles.append('        img { max-width: 100%; height: auto; }')
+    head_styles.append('        table { border-collapse: collapse; width: 100%; }')
+    head_styles.append('        th, td { border: 1px solid #ddd; padding: 8px; }')
+    head_styles.append('        th { background-color: #f2f2f2; }')
+    head_styles.append('        .chapter-container { background-color: #f9f9f9; border: 1px solid #ddd; border-radius: 8px; padding: 15px; margin: 20px 0; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }')
+    head_styles.append('        .chapter-container h2 { margin-top: 0; border-bottom: 1px solid #eee; padding-bottom: 10px; color: #444; }')
+    head_styles.append('    </style>')
+    
+    # Include CSS if specified - embed the CSS content directly
+    if css_file:
+        css_path = Path(css_file)
+        if css_path.exists():
+            try:
+                # Read the CSS file content
+                with open(css_path, 'r', encoding='utf-8') as f:
+                    css_content = f.read()
+                
+                # Add the CSS content directly into the HTML head
+                head_styles.append('    <style>')
+                head_styles.append(f'        /* CSS from {css_path.name} */')
+                head_styles.append(css_content)
+                head_styles.append('    </style>')
+                
+                print(f"Embedded CSS from {css_file} directly into the HTML")
+            except Exception as e:
+                print(f"Warning: Could not read CSS file {css_file}: {str(e)}")
+        else:
+            print(f"Warning: CSS file not found: {css_file}")
+
+    # Temas de resaltado adicionales, bajo html.theme-<estilo> (el CSS de cada uno se genera una vez)
+    valid_themes = []
+    for theme in () if draft else themes:
+        if theme not in available_styles:
+            print(f"Warning: Style '{theme}' not found; theme skipped.")
+        elif theme != highlight_style and theme not in valid_themes:
+            valid_themes.append(theme)
+    for theme in valid_themes:
+        head_styles.append('    <style>')
+        head_styles.append(f'        /* Highlight theme: {theme} */')
+        head_styles.append(theme_css(theme))
+        head_styles.append('    </style>')
+    if valid_themes:
+        print(f"Extra highlight themes: {', '.join(valid_themes)}")
+
+    page_css = _styles_text(head_styles)
+
+    def make_formatter(cssclass):
+        if compact_highlight:
+            # Clases que no dependen del tema: equivalentes en el tema base y en cada tema adicional
+            root_classes = ('',) + tuple(theme_class(theme) for theme in valid_themes)
+            return CompactHtmlFormatter(css_texts=(page_css,), root_classes=root_classes, cssclass=cssclass,
+                                        style=highlight_style)
+        return HtmlFormatter(cssclass=cssclass, style=highlight_style)
+
+    # Lexers y formatters compartidos por todos los bloques (y secciones) que convierta este md
+    highlighter = BatchHighlighter(make_formatter)
+
     # Configure the Enhanced syntax extension to use the specified style
     class CustomEnhancedSyntaxPreprocessor(EnhancedSyntaxPreprocessor):
         def run(self, lines):
@@ -217,37 +760,44 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
             from pygments.lexers.special import TextLexer
             
             text = '\n'.join(lines)
+            # Trozos del texto; los bloques a resaltar se completan después de resaltar todos juntos
+            parts = []
+            queued = []  # (trozo, bloque en el highlighter, código, lenguaje, es un lexer de respaldo)
+            last_end = 0
             
-            while True:
-                m = re.search(self.FENCED_BLOCK_RE, text, re.MULTILINE)
-                if not m:
-                    break
+            for m in re.finditer(self.FENCED_BLOCK_RE, text, re.MULTILINE):
+                parts.append(text[last_end:m.start()])
+                last_end = m.end()
                     
                 original_lang = m.group(1)
                 code = m.group(2)
+                build_metrics.incr('code_blocks', (original_lang or 'text').lower())
                 
                 # Skip empty code blocks or blocks with just whitespace
                 if not code or code.strip() == '':
                     # Replace with a simple pre tag to avoid errors
-                    original_block = f'```{original_lang or ""}\n{code}```'
-                    replacement = f'<pre class="empty-code-block">{code}</pre>'
-                    text = text.replace(original_block, replacement, 1)
+                    parts.append(f'<pre class="empty-code-block">{code}</pre>')
                     continue
                 
                 # Handle SVG content specially - render directly as SVG
                 if original_lang and original_lang.lower() == 'svg':
-                    original_block = f'```{original_lang}\n{code}```'
+                    if svg_optimizer is not None:
+                        code = svg_optimizer.optimize(code)
                     # Create a div wrapper for the SVG with centering
-                    replacement = f'<div class="svg-container">\n{code}\n</div>'
-                    text = text.replace(original_block, replacement, 1)
+                    parts.append(f'<div class="svg-container">\n{code}\n</div>')
                     continue
                 
                 # Handle Mermaid diagrams specially - don't wrap in <pre> tags
                 if original_lang and original_lang.lower() == 'mermaid':
-                    original_block = f'```{original_lang}\n{code}```'
+                    build_metrics.incr('mermaid_blocks')
                     # Create a div with class "mermaid" for Mermaid.js to process
-                    replacement = f'<div class="mermaid">\n{code}\n</div>'
-                    text = text.replace(original_block, replacement, 1)
+                    parts.append(f'<div class="mermaid">\n{code}\n</div>')
+                    continue
+                
+                # Borrador: el código escapado tal cual, sin Pygments
+                if draft:
+                    parts.append(f'<div class="highlight language-{original_lang or "text"}">'
+                                 f'<pre>{escape(code, quote=False)}</pre></div>\n')
                     continue
                     
                 # Handle language selection with good defaults including JSX
@@ -270,63 +820,64 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
                     # Keep the original language identifier for generic handling
                     lang = original_lang
                 
+                cssclass = f'highlight language-{original_lang or "text"}'
                 try:
-                    # Try to get a lexer for the specified language
-                    lexer = get_lexer_by_name(lang)
-                    
-                    # Try highlighting the code, but handle potential errors
-                    try:
-                        formatter = HtmlFormatter(cssclass=f'highlight language-{original_lang or "text"}', style=highlight_style)
-                        highlighted = highlight(code, lexer, formatter)
-                    except Exception as e:
-                        print(f"Warning: Error highlighting code: {str(e)}. Using plain text fallback.")
-                        # Use TextLexer as a fallback for problematic code
-                        formatter = HtmlFormatter(cssclass='highlight language-text', style=highlight_style)
-                        highlighted = highlight(code, TextLexer(), formatter)
+                    # Try to get a lexer for the specified language (one instance per language)
+                    block = highlighter.add(lang, code, cssclass)
+                    fallback = False
                         
                 except ClassNotFound:
                     # If lexer not found, select a fallback based on language hints
                     print(f"Warning: No lexer found for language '{lang}'. Using fallback.")
-                    try:
-                        if lang.lower() in ('py', 'python'):
-                            lexer = PythonLexer()
-                        elif lang.lower() in ('sh', 'bash', 'shell'):
-                            lexer = BashLexer()
-                        elif lang.lower() in ('js', 'javascript', 'mongodb'):
-                            lexer = JavascriptLexer()
-                        elif lang.lower() in ('jsx', 'react'):
-                            # Use JavaScript lexer for JSX - Pygments doesn't have a separate JSX lexer
-                            lexer = JavascriptLexer()
-                        elif lang.lower() in ('tsx', 'typescript-jsx'):
-                            # Use TypeScript lexer for TSX
-                            try:
-                                lexer = TypeScriptLexer()
-                            except:
-                                lexer = JavascriptLexer()  # Fallback to JS if TS not available
-                        elif lang.lower() in ('ts', 'typescript'):
-                            try:
-                                lexer = TypeScriptLexer()
-                            except:
-                                lexer = JavascriptLexer()  # Fallback to JS if TS not available
-                        else:
-                            # Use TextLexer as a last resort for any unrecognized language
-                            lexer = TextLexer()
-                        
-                        formatter = HtmlFormatter(cssclass=f'highlight language-{original_lang or "text"}', style=highlight_style)
-                        highlighted = highlight(code, lexer, formatter)
-                    except Exception as e:
-                        print(f"Warning: Error highlighting fallback code: {str(e)}. Using simple pre tag.")
-                        # If all else fails, just wrap in a pre tag
-                        highlighted = f'<pre class="highlight-error">{code}</pre>'
-                
-                # Simple replacement without collapsible functionality
-                replacement = highlighted
+                    build_metrics.incr('lexer_fallbacks', 'no_lexer', lang)
+                    if lang.lower() in ('py', 'python'):
+                        lexer = PythonLexer()
+                    elif lang.lower() in ('sh', 'bash', 'shell'):
+                        lexer = BashLexer()
+                    elif lang.lower() in ('js', 'javascript', 'mongodb'):
+                        lexer = JavascriptLexer()
+                    elif lang.lower() in ('jsx', 'react'):
+                        # Use JavaScript lexer for JSX - Pygments doesn't have a separate JSX lexer
+                        lexer = JavascriptLexer()
+                    elif lang.lower() in ('tsx', 'typescript-jsx'):
+                        # Use TypeScript lexer for TSX
+                        try:
+                            lexer = TypeScriptLexer()
+                        except:
+                            lexer = JavascriptLexer()  # Fallback to JS if TS not available
+                    elif lang.lower() in ('ts', 'typescript'):
+                        try:
+                            lexer = TypeScriptLexer()
+                        except:
+                            lexer = JavascriptLexer()  # Fallback to JS if TS not available
+                    else:
+                        # Use TextLexer as a last resort for any unrecognized language
+                        lexer = TextLexer()
+                    block = highlighter.add(lexer, code, cssclass)
+                    fallback = True
                 
-                # Ensure we replace the exact original code block
-                original_block = f'```{original_lang or ""}\n{code}```'
-                text = text.replace(original_block, replacement, 1)
+                queued.append((len(parts), block, code, lang, fallback))
+                parts.append(None)
+            
+            parts.append(text[last_end:])
+            
+            # Todos los bloques al final, con lexers y formatters compartidos (el HTML es el mismo que bloque por bloque)
+            results = highlighter.run()
+            for part, block, code, lang, fallback in queued:
+                highlighted = results[block]
+                if isinstance(highlighted, Exception) and not fallback:
+                    print(f"Warning: Error highlighting code: {str(highlighted)}. Using plain text fallback.")
+                    build_metrics.incr('lexer_fallbacks', 'highlight_error', lang)
+                    # Use TextLexer as a fallback for problematic code
+                    highlighted = highlight(code, TextLexer(), highlighter.formatter('highlight language-text'))
+                elif isinstance(highlighted, Exception):
+                    print(f"Warning: Error highlighting fallback code: {str(highlighted)}. Using simple pre tag.")
+                    build_metrics.incr('lexer_fallbacks', 'plain_pre', lang)
+                    # If all else fails, just wrap in a pre tag
+                    highlighted = f'<pre class="highlight-error">{code}</pre>'
+                parts[part] = highlighted
                 
-            return text.split('\n')
+            return ''.join(parts).split('\n')
     
     # Create custom extension with the specified highlight style
     class CustomEnhancedSyntaxExtension(markdown.Extension):
@@ -335,8 +886,7 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
             md.preprocessors.register(CustomEnhancedSyntaxPreprocessor(md), 'enhanced_syntax', 175)
     
     # Convert markdown to HTML with syntax highlighting
-    html_content = markdown.markdown(
-        md_content,
+    md = markdown.Markdown(
         extensions=[
             'markdown.extensions.tables',
             'markdown.extensions.fenced_code',
@@ -345,11 +895,13 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
             CustomEnhancedSyntaxExtension()  # Custom extension with the specified highlight style
         ]
     )
-    
-    # Add custom styling for h2 headers (chapters)
-    # This will wrap each h2 and all content until the next h2 in a container
-    import re
-    
+
+    svg_settings = svg_optimizer.settings if svg_optimizer is not None else False
+    return md, head_styles, f'{highlight_style}:{compact_highlight}:{draft}:{svg_settings}:{page_css}', valid_themes
+
+
+def wrap_chapters(html_content):
+    """Wrap every <h2> and the content up to the next <h2> in a chapter-container div."""
     # Process h2 headers and wrap them in chapter-container divs
     # Using a more robust approach to ensure all content is properly wrapped
     html_content_parts = []
@@ -390,18 +942,13 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
         
         # Replace the original content
         html_content = ''.join(html_content_parts)
-    
-    
-    # Build the HTML document with syntax highlighting CSS and optional external CSS
-    html_doc = []
-    html_doc.append('<!DOCTYPE html>')
-    html_doc.append('<html lang="en">')
-    html_doc.append('<head>')
-    html_doc.append('    <meta charset="UTF-8">')
-    html_doc.append('    <meta name="viewport" content="width=device-width, initial-scale=1.0">')
-    
+
+    return html_content
+
+
+def extract_title(html_content, title):
+    """Replace the first plain <h1> with the title block; returns (html_content, title)."""
     # Extract title from the first heading or use the filename
-    title = md_path.stem
     if html_content.find('<h1>') != -1:
         title_start = html_content.find('<h1>') + 4
         title_end = html_content.find('</h1>')
@@ -412,166 +959,43 @@ def convert_markdown_to_html(md_file, css_file=None, output_file=None, highlight
             h1_block = html_content[title_start - 4:title_end + 5]  # '<h1>...</h1>'
             new_block = f'<div id="main-title-block"><span>{title}</span></div>'
             html_content = html_content.replace(h1_block, new_block, 1)
+    return html_content, title
 
-    html_doc.append(f'    <title>{title}</title>')
-
-    # Add Pygments CSS for syntax highlighting
-    html_doc.append('    <style>')
-    html_doc.append(pygments_css)
-    html_doc.append('    </style>')
-
-    # Add default styling for readability
-    html_doc.append('    <style>')
-    html_doc.append('        body { font-family: Arial, sans-serif; line-height: 1.6; margin: 0 auto; padding: 20px; }')
-
-    # Estilo para el div que reemplaza al h1
-    html_doc.append('        #main-title-block { background-color: #2e2e2e; color: #f0f0f0; padding: 18px; border-radius: 10px; border: 1px solid #444; box-shadow: 0 2px 5px rgba(0,0,0,0.2); font-size: 1.8em; font-weight: bold; margin-bottom: 20px; text-align: center; }')
 
-    # Estilo para bloques pre fuera de .highlight
-    html_doc.append('        pre:not(.highlight pre) { background-color: #fef6e4; color: #2e2e2e; padding: 12px; border-radius: 5px; overflow-x: auto; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); margin: 15px 0; }')
-    html_doc.append('        code { font-family: "Courier New", Courier, monospace; }')
-    
-    # ConfiguraciÃ³n mejorada para los bloques de resaltado de sintaxis (contenedor externo)
-    html_doc.append('        .highlight { padding: 0; border-radius: 5px; margin: 15px 0; background-color: #fef6e4 !important; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }')
-    
-    # Quitar bordes y fondos duplicados del pre dentro de .highlight
-    html_doc.append('        .highlight pre { background: none; border: none; box-shadow: none; padding: 12px; margin: 0; border-radius: 0; }')
-    
-    # ConfiguraciÃ³n para las lÃ­neas de comentarios en los bloques de cÃ³digo
-    html_doc.append('        .highlight .c, .highlight .c1, .highlight .cm { color: #9a8052 !important; font-style: italic; }') 
-    
-    # ConfiguraciÃ³n para las palabras clave en los bloques de cÃ³digo
-    html_doc.append('        .highlight .k, .highlight .kd, .highlight .kn { color: #8250df !important; font-weight: normal; }')
-    
-    # ConfiguraciÃ³n para las cadenas de texto en los bloques de cÃ³digo
-    html_doc.append('        .highlight .s, .highlight .s1, .highlight .s2, .highlight .sb, .highlight .si { color: #327d41 !important; }')
-    
-    # ConfiguraciÃ³n para los nÃºmeros en los bloques de cÃ³digo
-    html_doc.append('        .highlight .m, .highlight .mi, .highlight .mf { color: #606060 !important; }')
-    
-    # ConfiguraciÃ³n para los operadores en los bloques de cÃ³digo
-    html_doc.append('        .highlight .o, .highlight .ow { color: #666666 !important; font-weight: normal; }')
-    
-    # ConfiguraciÃ³n para las constantes en los bloques de cÃ³digo
-    html_doc.append('        .highlight .kc, .highlight .no { color: #9a5b13 !important; }')
-    
-    # ConfiguraciÃ³n para las funciones y clases en los bloques de cÃ³digo
-    html_doc.append('        .highlight .nf, .highlight .nb, .highlight .nx { color: #606060 !important; font-weight: normal; }')
-    
-    # Mejorar la visibilidad de parÃ©ntesis, corchetes, llaves, puntos y coma, etc.
-    html_doc.append('        .highlight .p { color: #666666 !important; font-weight: normal; }')
-    
-    # JSX/React specific styling - Colores basados en la imagen proporcionada
-    html_doc.append('        .language-jsx .highlight .k, .language-jsx .highlight .kd, .language-jsx .highlight .kr { color: #af00db !important; font-weight: normal; background: none !important; border: none !important; }')  # Keywords (function, const, return) - pÃºrpura
-    html_doc.append('        .language-jsx .highlight .nx, .language-jsx .highlight .nf { color: #0969da !important; background: none !important; border: none !important; }')  # Functions/variables - azul
-    html_doc.append('        .language-jsx .highlight .nt { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Opening tags - verde
-    html_doc.append('        .language-jsx .highlight .nc { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Component names - verde
-    html_doc.append('        .language-jsx .highlight .o  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Operators
-    html_doc.append('        .language-jsx .highlight .p  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Punctuation
-    html_doc.append('        .language-jsx .highlight .na { color: #0969da !important; background: none !important; border: none !important; }')  # JSX attributes - azul
-    html_doc.append('        .language-jsx .highlight .s, .language-jsx .highlight .s1, .language-jsx .highlight .s2 { color: #0a3069 !important; background: none !important; border: none !important; }')   # Strings - azul oscuro
-    html_doc.append('        .language-jsx .highlight .c, .language-jsx .highlight .c1, .language-jsx .highlight .cm { color: #656d76 !important; font-style: italic; background: none !important; border: none !important; }')   # Comments - gris
-    html_doc.append('        .language-jsx .highlight .m, .language-jsx .highlight .mi, .language-jsx .highlight .mf { color: #0969da !important; background: none !important; border: none !important; }')   # Numbers - azul
-    
-    html_doc.append('        .language-react .highlight .k, .language-react .highlight .kd, .language-react .highlight .kr { color: #af00db !important; font-weight: normal; background: none !important; border: none !important; }')  # Keywords - pÃºrpura
-    html_doc.append('        .language-react .highlight .nx, .language-react .highlight .nf { color: #0969da !important; background: none !important; border: none !important; }')  # Functions/variables - azul
-    html_doc.append('        .language-react .highlight .nt { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Opening tags - verde
-    html_doc.append('        .language-react .highlight .nc { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Component names - verde
-    html_doc.append('        .language-react .highlight .o  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Operators
-    html_doc.append('        .language-react .highlight .p  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Punctuation
-    html_doc.append('        .language-react .highlight .na { color: #0969da !important; background: none !important; border: none !important; }')  # React attributes - azul
-    html_doc.append('        .language-react .highlight .s, .language-react .highlight .s1, .language-react .highlight .s2 { color: #0a3069 !important; background: none !important; border: none !important; }')   # Strings - azul oscuro
-    html_doc.append('        .language-react .highlight .c, .language-react .highlight .c1, .language-react .highlight .cm { color: #656d76 !important; font-style: italic; background: none !important; border: none !important; }')   # Comments - gris
-    html_doc.append('        .language-react .highlight .m, .language-react .highlight .mi, .language-react .highlight .mf { color: #0969da !important; background: none !important; border: none !important; }')   # Numbers - azul
-    
-    # TSX specific styling - mismos colores con adiciÃ³n de tipos TypeScript
-    html_doc.append('        .language-tsx .highlight .k, .language-tsx .highlight .kd, .language-tsx .highlight .kr { color: #af00db !important; font-weight: normal; background: none !important; border: none !important; }')  # Keywords - pÃºrpura
-    html_doc.append('        .language-tsx .highlight .nx, .language-tsx .highlight .nf { color: #0969da !important; background: none !important; border: none !important; }')  # Functions/variables - azul
-    html_doc.append('        .language-tsx .highlight .nt { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Opening tags - verde
-    html_doc.append('        .language-tsx .highlight .nc { color: #116329 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Component names - verde
-    html_doc.append('        .language-tsx .highlight .o  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Operators
-    html_doc.append('        .language-tsx .highlight .p  { color: #666666 !important; background:none !important; border:none !important; box-shadow:none !important; outline:none !important; }')  # Punctuation
-    html_doc.append('        .language-tsx .highlight .na { color: #0969da !important; background: none !important; border: none !important; }')  # TSX attributes - azul
-    html_doc.append('        .language-tsx .highlight .s, .language-tsx .highlight .s1, .language-tsx .highlight .s2 { color: #0a3069 !important; background: none !important; border: none !important; }')   # Strings - azul oscuro
-    html_doc.append('        .language-tsx .highlight .c, .language-tsx .highlight .c1, .language-tsx .highlight .cm { color: #656d76 !important; font-style: italic; background: none !important; border: none !important; }')   # Comments - gris
-    html_doc.append('        .language-tsx .highlight .m, .language-tsx .highlight .mi, .language-tsx .highlight .mf { color: #0969da !important; background: none !important; border: none !important; }')   # Numbers - azul
-    html_doc.append('        .language-tsx .highlight .kt { color: #0969da !important; background: none !important; border: none !important; }')   # TypeScript types - azul
-    
-    # JavaScript specific styling
-    html_doc.append('        .language-javascript .highlight .err { color: #116329 !important; background: none !important; border: none !important; }')  # Error class (for JSX closing tags in JS) - verde
-    html_doc.append('        .language-js .highlight .err { color: #116329 !important; background: none !important; border: none !important; }')  # Error class (for JSX closing tags in JS) - verde
-    
-    # Remover cualquier decoraciÃ³n adicional
-    html_doc.append('        .highlight span { background: none !important; border: none !important; box-shadow: none !important; text-decoration: none !important; outline: none !important; }')
-    
-    # SVG container styling
-    html_doc.append('        .svg-container { margin: 15px 0; text-align: center; padding: 10px; }')
-    html_doc.append('        .svg-container svg { max-width: 100%; height: auto; }')
-    
-    # Mermaid diagram styling
-    html_doc.append('        .mermaid { margin: 15px 0; text-align: center; }')
-    html_doc.append('        .mermaid svg { max-width: 100%; height: auto; }')
-    
-    # Otras configuraciones de estilo
-    html_doc.append('        .empty-code-block { background-color: #fef6e4; color: #2e2e2e; padding: 12px; border-radius: 5px; margin: 15px 0; font-family: monospace; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }')
-    html_doc.append('        .highlight-error { background-color: #fef6e4; color: #000080; padding: 12px; border-radius: 5px; margin: 15px 0; font-family: monospace; border: 1px solid #f0e6d4; box-shadow: 0 1px 3px rgba(0,0,0,0.1); }')
-    
-    html_doc.append('        img { max-width: 100%; height: auto; }')
-    html_doc.append('        table { border-collapse: collapse; width: 100%; }')
-    html_doc.append('        th, td { border: 1px solid #ddd; padding: 8px; }')
-    html_doc.append('        th { background-color: #f2f2f2; }')
-    html_doc.append('        .chapter-container { background-color: #f9f9f9; border: 1px solid #ddd; border-radius: 8px; padding: 15px; margin: 20px 0; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }')
-    html_doc.append('        .chapter-container h2 { margin-top: 0; border-bottom: 1px solid #eee; padding-bottom: 10px; color: #444; }')
-    html_doc.append('    </style>')
-    
-    # Include CSS if specified - embed the CSS content directly
-    if css_file:
-        css_path = Path(css_file)
-        if css_path.exists():
-            try:
-                # Read the CSS file content
-                with open(css_path, 'r', encoding='utf-8') as f:
-                    css_content = f.read()
-                
-                # Add the CSS content directly into the HTML head
-                html_doc.append('    <style>')
-                html_doc.append(f'        /* CSS from {css_path.name} */')
-                html_doc.append(css_content)
-                html_doc.append('    </style>')
-                
-                print(f"Embedded CSS from {css_file} directly into the HTML")
-            except Exception as e:
-                print(f"Warning: Could not read CSS file {css_file}: {str(e)}")
-        else:
-            print(f"Warning: CSS file not found: {css_file}")
-    
-    # Add Mermaid.js script from CDN
-
-    
+def document_start(title, head_styles, themes=()):
+    """Doctype, <head> and opening <body> of the page (up to the content)."""
+    html_doc = []
+    html_doc.append('<!DOCTYPE html>')
+    html_doc.append('<html lang="en">')
+    html_doc.append('<head>')
+    html_doc.append('    <meta charset="UTF-8">')
+    html_doc.append('    <meta name="viewport" content="width=device-width, initial-scale=1.0">')
+    html_doc.append(f'    <title>{title}</title>')
+    html_doc.extend(head_styles)
     html_doc.append('</head>')
     html_doc.append('<body>')
-    html_doc.append(html_content)
-    html_doc.append('    <script type="module">')
-    html_doc.append('        import mermaid from "https://cdn.jsdelivr.net/npm/mermaid@11/dist/mermaid.esm.min.mjs";')
-    html_doc.append('        mermaid.initialize({')
-    html_doc.append('            startOnLoad: true,')
-    html_doc.append('            theme: "default",')
-    html_doc.append('            securityLevel: "loose",')
-    html_doc.append('            flowchart: {')
-    html_doc.append('                useMaxWidth: true,')
-    html_doc.append('                htmlLabels: true')
-    html_doc.append('            }')
-    html_doc.append('        });')
-    html_doc.append('    </script>')
+    # Antes del contenido (no en el <head>, que inline_css.py difiere) para no pintar con el tema equivocado
+    if themes:
+        html_doc.append(f'    <script id="{SWITCH_SCRIPT_ID}">')
+        html_doc.append(theme_switch_script(themes))
+        html_doc.append('    </script>')
+    return '\n'.join(html_doc) + '\n'
+
+
+def document_end(has_mermaid, output_dir=None):
+    """Scripts and closing tags of the page (after the content)."""
+    html_doc = ['']
+    # Lazy Mermaid loader, only for pages that actually have diagrams
+    if has_mermaid:
+        # Sin directorio de salida (HTML en memoria, p. ej. render_client.py a stdout) no hay dónde copiar
+        # el bundle: esos diagramas se cargan del CDN fijado y necesitan red (ver mermaid_runtime.py)
+        mermaid_src = install_mermaid_asset(output_dir) if output_dir is not None else MERMAID_CDN_URL
+        html_doc.append(f'    <script id="{MERMAID_LOADER_ID}">')
+        html_doc.append(mermaid_loader_script(mermaid_src))
+        html_doc.append('    </script>')
     html_doc.append('</body>')
     html_doc.append('</html>')
-    
-    # Write the HTML file
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(html_doc))
-    
-    print(f"Successfully converted {md_file} to {html_path}")
-    return str(html_path)
+    return '\n'.join(html_doc)
 
 def main():
     parser = argparse.ArgumentParser(description='Convert Markdown files to HTML with optional CSS styling and syntax highlighting.')
@@ -579,7 +1003,23 @@ def main():
     parser.add_argument('-s', '--style', help='Path to a CSS file to include')
     parser.add_argument('-o', '--output', help='Path for the output HTML file')
     parser.add_argument('-hl', '--highlight', default='default', help='Syntax highlighting style (default: default)')
+    parser.add_argument('--themes', nargs='+', default=[], metavar='STYLE',
+                        help='Extra highlighting styles emitted as alternative themes (e.g. --themes monokai); '
+                             'the first one is used when the reader prefers a dark color scheme')
     parser.add_argument('-ls', '--list-styles', action='store_true', help='List all available syntax highlighting styles')
+    parser.add_argument('--no-cache', action='store_true', help='Render every section, ignoring the section cache')
+    parser.add_argument('--no-compact-highlight', action='store_true',
+                        help='Use the standard Pygments HtmlFormatter (one span per token)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Convert and write one section at a time (for very large files)')
+    parser.add_argument('--draft', action='store_true',
+                        help='Fast preview: code blocks as plain <pre> without highlighting, styles linked '
+                             'from assets/draft.css')
+    parser.add_argument('--no-optimize-svg', action='store_true',
+                        help='Keep the SVG of ```svg blocks as written (see svg_optimize.py)')
+    parser.add_argument('--css-mode', choices=CSS_MODES, default='static',
+                        help='CSS mode inline_css.py will finish the page with (default: static); '
+                             'in static mode the repeated SVG styles are not hoisted into classes')
     
     args = parser.parse_args()
     
@@ -592,7 +1032,9 @@ def main():
     if not args.input:
         parser.error("the following arguments are required: input")
     
-    convert_markdown_to_html(args.input, args.style, args.output, args.highlight)
+    convert_markdown_to_html(args.input, args.style, args.output, args.highlight, not args.no_cache,
+                             not args.no_compact_highlight, args.stream, args.themes, args.draft,
+                             not args.no_optimize_svg, args.css_mode)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
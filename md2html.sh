@@ -2,10 +2,20 @@
 
 # Verifica si se proporcionó un archivo .md
 if [ $# -lt 1 ]; then
-  echo "Uso: $0 archivo.md [--skip-collapsible] [--skip-toc] [--keep-temp]"
+  echo "Uso: $0 archivo.md [--skip-collapsible] [--skip-toc] [--keep-temp] [--optimize-images] [--split-chapters] [--compress] [--critical-css] [--textarea-css] [--themes=monokai,...] [--draft] [--defer-code[=20]] [--no-optimize-svg]"
   echo "  --skip-collapsible: Omitir el procesamiento de elementos colapsables"
   echo "  --skip-toc: Omitir la adición de tabla de contenidos"
   echo "  --keep-temp: Conservar archivos temporales"
+  echo "  --optimize-images: Redimensionar y recomprimir las imágenes referenciadas"
+  echo "  --split-chapters: Dividir el documento en fragmentos por capítulo cargados bajo demanda"
+  echo "  --compress: Generar versiones precomprimidas (.gz/.br) del archivo final"
+  echo "  --critical-css: CSS de la primera pantalla en el <head> y el resto después del primer pintado"
+  echo "                  (páginas ~30% más livianas que con atributos style, si el host conserva los <style>)"
+  echo "  --textarea-css: Alternativa: CSS en un <textarea> inyectado con JS al cargar (en vez de atributos style)"
+  echo "  --themes=a,b: Estilos de Pygments adicionales como temas alternativos (el primero para esquema oscuro)"
+  echo "  --draft: Vista previa rápida en <nombre>_draft.html: código sin resaltar, sin colapsables ni CSS inline (estilos enlazados)"
+  echo "  --defer-code[=N]: Bloques colapsados de más de N líneas: el cuerpo completo en un <template> hasta el primer clic"
+  echo "  --no-optimize-svg: Dejar el SVG de los bloques \`\`\`svg tal como está escrito"
   exit 1
 fi
 
@@ -16,6 +26,14 @@ OUTPUT_DIR="$MD_DIR/html_output"
 SKIP_COLLAPSIBLE=false
 SKIP_TOC=false
 KEEP_TEMP=false
+OPTIMIZE_IMAGES=false
+SPLIT_CHAPTERS=false
+COMPRESS=false
+CSS_MODE=static
+THEMES=()
+DRAFT=false
+DEFER_ARGS=()
+SVG_ARGS=()
 
 # Crear directorio de salida en el mismo directorio del archivo MD
 mkdir -p "$OUTPUT_DIR"
@@ -32,21 +50,75 @@ for arg in "$@"; do
     --keep-temp)
       KEEP_TEMP=true
       ;;
+    --optimize-images)
+      OPTIMIZE_IMAGES=true
+      ;;
+    --split-chapters)
+      SPLIT_CHAPTERS=true
+      ;;
+    --compress)
+      COMPRESS=true
+      ;;
+    --critical-css)
+      CSS_MODE=critical
+      ;;
+    --textarea-css)
+      CSS_MODE=textarea
+      ;;
+    --themes=*)
+      IFS=',' read -r -a THEMES <<< "${arg#--themes=}"
+      ;;
+    --draft)
+      DRAFT=true
+      ;;
+    --defer-code)
+      DEFER_ARGS=(--defer-code)
+      ;;
+    --no-optimize-svg)
+      SVG_ARGS=(--no-optimize-svg)
+      ;;
+    --defer-code=*)
+      DEFER_ARGS=(--defer-code "${arg#--defer-code=}")
+      ;;
   esac
 done
 
+# Borrador: md2html y tabla de contenidos en un solo proceso (pipeline.py --draft)
+if [ "$DRAFT" = true ]; then
+  echo "[draft] Ejecutando pipeline.py --draft..."
+  DRAFT_ARGS=()
+  if [ "$SKIP_TOC" = true ]; then DRAFT_ARGS=(--skip-toc); fi
+  # Nombre propio: compress_output, search_index y precache solo toman las páginas *_final.html
+  python3 pipeline.py "$INPUT_MD" -o "${OUTPUT_DIR}/$(basename "$BASENAME")_draft.html" --draft "${DRAFT_ARGS[@]}"
+  if [ $? -ne 0 ]; then echo "Error en pipeline.py"; exit 1; fi
+  exit 0
+fi
+
 # Paso 1: Convertir Markdown a HTML
 echo "[1/5] Ejecutando md2html.py..."
-python3 md2html.py "$INPUT_MD" -o "${OUTPUT_DIR}/$(basename "$BASENAME").html" -s "assets/sintax.css"
+THEME_ARGS=()
+if [ ${#THEMES[@]} -gt 0 ]; then
+  THEME_ARGS=(--themes "${THEMES[@]}")
+  # Un atributo style no puede cambiar con el tema: se conserva una hoja de estilos
+  if [ "$CSS_MODE" = static ]; then CSS_MODE=critical; fi
+fi
+python3 md2html.py "$INPUT_MD" -o "${OUTPUT_DIR}/$(basename "$BASENAME").html" -s "assets/sintax.css" "${THEME_ARGS[@]}" "${SVG_ARGS[@]}" --css-mode "$CSS_MODE"
 if [ $? -ne 0 ]; then echo "Error en md2html.py"; exit 1; fi
 
+# Paso 1b: Optimizar imágenes (OPCIONAL)
+if [ "$OPTIMIZE_IMAGES" = true ]; then
+  echo "[+] Ejecutando optimize_images.py..."
+  python3 optimize_images.py "${OUTPUT_DIR}/$(basename "$BASENAME").html" -o "${OUTPUT_DIR}/$(basename "$BASENAME").html" --source-dir "$MD_DIR"
+  if [ $? -ne 0 ]; then echo "Error en optimize_images.py"; exit 1; fi
+fi
+
 # Paso 2: Procesar colapsables (OPCIONAL)
 if [ "$SKIP_COLLAPSIBLE" = true ]; then
   echo "[2/5] Omitiendo procesamiento de colapsables..."
   cp "${OUTPUT_DIR}/$(basename "$BASENAME").html" "${OUTPUT_DIR}/$(basename "$BASENAME")_collapsible.html"
 else
   echo "[2/5] Ejecutando collapsible.py..."
-  python3 collapsible.py "${OUTPUT_DIR}/$(basename "$BASENAME").html" -o "${OUTPUT_DIR}/$(basename "$BASENAME")_collapsible.html"
+  python3 collapsible.py "${OUTPUT_DIR}/$(basename "$BASENAME").html" -o "${OUTPUT_DIR}/$(basename "$BASENAME")_collapsible.html" "${DEFER_ARGS[@]}"
   if [ $? -ne 0 ]; then echo "Error en collapsible.py"; exit 1; fi
 fi
 
@@ -67,9 +139,27 @@ if [ $? -ne 0 ]; then echo "Error en simplify_css.py"; exit 1; fi
 
 # Paso 5: Convertir a estilos inline
 echo "[5/5] Ejecutando inline_css.py..."
-python3 inline_css.py "${OUTPUT_DIR}/$(basename "$BASENAME")_simplify.html" --output "${OUTPUT_DIR}/$(basename "$BASENAME")_final.html"
+python3 inline_css.py "${OUTPUT_DIR}/$(basename "$BASENAME")_simplify.html" --output "${OUTPUT_DIR}/$(basename "$BASENAME")_final.html" --css-mode "$CSS_MODE"
 if [ $? -ne 0 ]; then echo "Error en inline_css.py"; exit 1; fi
 
+# Paso final: Dividir en capítulos (OPCIONAL)
+if [ "$SPLIT_CHAPTERS" = true ]; then
+  echo "[+] Ejecutando split_chapters.py..."
+  python3 split_chapters.py "${OUTPUT_DIR}/$(basename "$BASENAME")_final.html"
+  if [ $? -ne 0 ]; then echo "Error en split_chapters.py"; exit 1; fi
+fi
+
+# Paso final: Precomprimir (OPCIONAL)
+if [ "$COMPRESS" = true ]; then
+  echo "[+] Ejecutando compress_output.py..."
+  TARGETS=("${OUTPUT_DIR}/$(basename "$BASENAME")_final.html")
+  for chapter in "${OUTPUT_DIR}/$(basename "$BASENAME")"_final.chapter-*.html; do
+    [ -f "$chapter" ] && TARGETS+=("$chapter")
+  done
+  python3 compress_output.py "${TARGETS[@]}"
+  if [ $? -ne 0 ]; then echo "Error en compress_output.py"; exit 1; fi
+fi
+
 # Mostrar archivo final
 echo
 echo "Proceso completo. Archivo final generado: ${OUTPUT_DIR}/$(basename "$BASENAME")_final.html"
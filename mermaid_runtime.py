@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+mermaid_runtime.py - Self-hosted, lazily initialized Mermaid runtime
+
+The Mermaid bundle is vendored under assets/vendor/mermaid/ with a pinned
+version and copied next to the generated pages (the output root), so the
+diagrams render without network access. Until the bundle is vendored
+(python mermaid_runtime.py --fetch) pages are still built: the loader points
+at the pinned CDN URL and a warning is printed, and those diagrams need the
+network. Pages rendered in memory without an output directory (md2html's
+render_markdown with output_dir=None, render_client.py to stdout) have
+nowhere to copy the bundle to and also use the CDN URL. Pages get a
+small loader that only downloads the bundle when the document has
+<div class="mermaid"> elements, and renders each diagram when it gets close
+to the viewport (IntersectionObserver).
+
+Usage:
+    python mermaid_runtime.py --fetch     Download the pinned bundle into assets/vendor/mermaid/
+"""
+
+import sys
+import shutil
+import argparse
+import urllib.request
+from pathlib import Path
+
+MERMAID_VERSION = '11.4.1'
+MERMAID_ASSET = f'mermaid-{MERMAID_VERSION}.min.js'
+MERMAID_CDN_URL = f'https://cdn.jsdelivr.net/npm/mermaid@{MERMAID_VERSION}/dist/mermaid.min.js'
+VENDOR_DIR = Path(__file__).resolve().parent / 'assets' / 'vendor' / 'mermaid'
+LOADER_ID = 'mermaid-loader'
+
+# Distance from the viewport at which a diagram starts rendering
+ROOT_MARGIN = '300px 0px'
+
+MERMAID_LOADER_JS = """(function () {
+  var MERMAID_SRC = '__MERMAID_SRC__';
+  var loading = null;
+
+  function loadMermaid() {
+    if (!loading) {
+      loading = new Promise(function (resolve, reject) {
+        var script = document.createElement('script');
+        script.src = MERMAID_SRC;
+        script.async = true;
+        script.onload = function () {
+          window.mermaid.initialize({
+            startOnLoad: false,
+            theme: 'default',
+            securityLevel: 'loose',
+            flowchart: { useMaxWidth: true, htmlLabels: true }
+          });
+          resolve(window.mermaid);
+        };
+        script.onerror = reject;
+        document.head.appendChild(script);
+      });
+    }
+    return loading;
+  }
+
+  function render(div) {
+    if (div.dataset.mermaidState) return;
+    div.dataset.mermaidState = 'pending';
+    loadMermaid().then(function (mermaid) {
+      return mermaid.run({ nodes: [div] });
+    }).then(function () {
+      div.dataset.mermaidState = 'done';
+    }).catch(function (err) {
+      console.error('Error al renderizar Mermaid:', err);
+    });
+  }
+
+  var observer = null;
+  function observeMermaid(root) {
+    var divs = (root || document).querySelectorAll('div.mermaid:not([data-mermaid-state])');
+    if (!divs.length) return;
+    if (!('IntersectionObserver' in window)) {
+      divs.forEach(render);
+      return;
+    }
+    if (!observer) {
+      observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+          if (entry.isIntersecting) {
+            observer.unobserve(entry.target);
+            render(entry.target);
+          }
+        });
+      }, { rootMargin: '__ROOT_MARGIN__' });
+    }
+    divs.forEach(function (div) { observer.observe(div); });
+  }
+
+  // Expuesto para contenido insertado después de la carga
+  window.observeMermaid = observeMermaid;
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', function () { observeMermaid(); });
+  } else {
+    observeMermaid();
+  }
+})();"""
+
+
+def vendored_mermaid_path():
+    """Path of the pinned Mermaid bundle inside the repository."""
+    return VENDOR_DIR / MERMAID_ASSET
+
+
+def install_mermaid_asset(output_root):
+    """
+    Copy the vendored Mermaid bundle into <output_root>/assets/ (only if changed).
+
+    Returns the script src to use from pages in output_root. If the bundle has
+    not been vendored yet, warns and falls back to the pinned CDN URL.
+    """
+    source = vendored_mermaid_path()
+    if not source.exists():
+        print(f"Warning: Mermaid bundle not found at {source}. "
+              f"Run 'python mermaid_runtime.py --fetch' to vendor it. "
+              f"Using CDN fallback (the diagrams will need network access).")
+        return MERMAID_CDN_URL
+
+    target_dir = Path(output_root) / 'assets'
+    target = target_dir / MERMAID_ASSET
+    if not target.exists() or target.stat().st_size != source.stat().st_size:
+        target_dir.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(source, target)
+    return f'assets/{MERMAID_ASSET}'
+
+
+def mermaid_loader_script(src):
+    """Return the JS of the lazy Mermaid loader for the given bundle src."""
+    return (MERMAID_LOADER_JS
+            .replace('__MERMAID_SRC__', src)
+            .replace('__ROOT_MARGIN__', ROOT_MARGIN))
+
+
+def fetch_mermaid():
+    """Download the pinned Mermaid bundle into the vendor directory."""
+    target = vendored_mermaid_path()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    print(f"Downloading {MERMAID_CDN_URL}...")
+    with urllib.request.urlopen(MERMAID_CDN_URL) as response:
+        data = response.read()
+    target.write_bytes(data)
+    print(f"Saved {len(data) / 1024:.0f} KB to {target}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vendored Mermaid runtime helper.')
+    parser.add_argument('--fetch', action='store_true',
+                        help=f'Download mermaid {MERMAID_VERSION} into {VENDOR_DIR}')
+    args = parser.parse_args()
+
+    if not args.fetch:
+        parser.print_help()
+        sys.exit(1)
+    fetch_mermaid()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+bench_crud.py - Operaciones por segundo de crud.py (una operación por documento)
+frente a crud_bulk.py (lotes, proyección, cliente compartido)
+
+Usa un mongod local si responde y, si no, mongomock (pip install mongomock).
+mongomock no tiene red ni confirmaciones del servidor, así que mide sobre todo
+el costo de cada llamada; con un mongod real la diferencia es mayor.
+
+La columna crud.py llama a las funciones de crud.py tal como están, con un
+cliente nuevo por tarea (como su get_database()): crear_empleado por
+documento, leer_empleados (que además repite la búsqueda por nombre y por
+edad), actualizar_empleado (dos update_one y un find_one por empleado) y
+eliminar_empleado. crud_bulk.py usa su cliente compartido de get_client(),
+con las opciones del pool, cuando hay un mongod real.
+
+Las fases que actualizan o borran documento por documento se miden sobre una
+muestra (--sample) de la colección: en mongomock cada update_one recorre toda
+la colección, y con 100k documentos no terminaría nunca.
+
+Uso:
+    python bench_crud.py [--sizes 1000 100000] [--uri mongodb://localhost:27017/] [--mock]
+"""
+
+import io
+import sys
+import time
+import argparse
+import contextlib
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+import crud
+import crud_bulk
+
+COLECCION = 'empleados_bench'
+
+
+def conectar(uri, forzar_mock=False):
+    """Devuelve (fabrica_de_clientes, descripcion, real) para mongod o mongomock."""
+    if not forzar_mock:
+        try:
+            client = MongoClient(uri, serverSelectionTimeoutMS=1000)
+            client.admin.command('ping')
+            client.close()
+            return (lambda: MongoClient(uri)), f'mongod ({uri})', True
+        except PyMongoError:
+            print(f"No hay un mongod en {uri}; se usa mongomock.")
+    try:
+        import mongomock
+    except ImportError:
+        print("Error: no hay servidor y mongomock no está instalado (pip install mongomock).")
+        sys.exit(1)
+    # Todos los clientes comparten los datos, como varios clientes de un mismo servidor
+    servidor = mongomock.store.ServerStore()
+    return (lambda: mongomock.MongoClient(_store=servidor)), 'mongomock', False
+
+
+# --- crud.py: una operación por documento, un cliente nuevo por tarea ------------
+
+@contextlib.contextmanager
+def coleccion_nueva(nuevo_cliente):
+    """La colección desde un cliente nuevo (como crud.get_database()), cerrado al terminar."""
+    client = nuevo_cliente()
+    try:
+        yield client['empresa'][COLECCION]
+    finally:
+        client.close()
+
+
+def simple_insertar(nuevo_cliente, cantidad):
+    with coleccion_nueva(nuevo_cliente) as coleccion:
+        return [crud.crear_empleado(coleccion) for _ in range(cantidad)]
+
+
+def simple_leer(nuevo_cliente):
+    with coleccion_nueva(nuevo_cliente) as coleccion:
+        crud.leer_empleados(coleccion)
+        return coleccion.count_documents({})
+
+
+def simple_actualizar(nuevo_cliente, ids):
+    with coleccion_nueva(nuevo_cliente) as coleccion:
+        for empleado_id in ids:
+            crud.actualizar_empleado(empleado_id, coleccion)
+
+
+def simple_eliminar(nuevo_cliente, ids):
+    with coleccion_nueva(nuevo_cliente) as coleccion:
+        for empleado_id in ids:
+            crud.eliminar_empleado(empleado_id, coleccion)
+
+
+# --- crud_bulk.py ------------------------------------------------------------------
+
+def lotes_leer(coleccion):
+    leidos = 0
+    for empleado in crud_bulk.leer_empleados(coleccion):
+        f"ID: {empleado['_id']}, Nombre: {empleado['nombre']}, Puesto: {empleado['puesto']}"
+        leidos += 1
+    return leidos
+
+
+def medir(funcion, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        return time.perf_counter() - inicio, resultado
+
+
+def correr(nuevo_cliente, real, uri, cantidad, muestra):
+    """Tiempos (operación, versión, ops, segundos) para una colección de 'cantidad' documentos."""
+    filas = []
+    with coleccion_nueva(nuevo_cliente) as coleccion:
+        coleccion.drop()
+    segundos, ids = medir(simple_insertar, nuevo_cliente, cantidad)
+    filas.append(('insert', 'crud.py', cantidad, segundos))
+    segundos, leidos = medir(simple_leer, nuevo_cliente)
+    filas.append(('find', 'crud.py', leidos, segundos))
+    segundos, _ = medir(simple_actualizar, nuevo_cliente, ids[:muestra])
+    filas.append(('update', 'crud.py', len(ids[:muestra]), segundos))
+    segundos, _ = medir(simple_eliminar, nuevo_cliente, ids[:muestra])
+    filas.append(('delete', 'crud.py', len(ids[:muestra]), segundos))
+
+    # Cliente compartido de crud_bulk: el de get_client(), con las opciones del pool, si es un mongod real
+    crud_bulk._client = None if real else nuevo_cliente()
+    coleccion = crud_bulk.get_database(uri)[COLECCION]
+    coleccion.drop()
+    segundos, ids = medir(crud_bulk.crear_empleados, coleccion, crud_bulk.generar_empleados(cantidad))
+    filas.append(('insert', 'crud_bulk.py', cantidad, segundos))
+    segundos, leidos = medir(lotes_leer, coleccion)
+    filas.append(('find', 'crud_bulk.py', leidos, segundos))
+    cambios = [(i, {"edad": 30 + n % 30}) for n, i in enumerate(ids[:muestra])]
+    segundos, _ = medir(crud_bulk.actualizar_empleados, coleccion, cambios)
+    filas.append(('update', 'crud_bulk.py', len(cambios), segundos))
+    segundos, _ = medir(crud_bulk.eliminar_empleados, coleccion, ids[:muestra])
+    filas.append(('delete', 'crud_bulk.py', len(ids[:muestra]), segundos))
+    coleccion.drop()
+    crud_bulk.get_client().close()
+    crud_bulk._client = None
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de crud.py frente a crud_bulk.py.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000],
+                        help='Cantidades de documentos (por defecto: 1000 100000)')
+    parser.add_argument('--sample', type=int, default=2000,
+                        help='Documentos actualizados/eliminados uno por uno (por defecto: 2000)')
+    parser.add_argument('--uri', default='mongodb://localhost:27017/', help='Servidor MongoDB')
+    parser.add_argument('--mock', action='store_true', help='Usar mongomock aunque haya un servidor')
+    args = parser.parse_args()
+
+    nuevo_cliente, descripcion, real = conectar(args.uri, args.mock)
+    print(f"Servidor: {descripcion}")
+    print(f"{'Docs':>8} {'Operación':<8} {'crud.py ops/s':>14} {'crud_bulk ops/s':>16} {'Mejora':>7}")
+    for cantidad in args.sizes:
+        filas = correr(nuevo_cliente, real, args.uri, cantidad, args.sample)
+        tasas = {(operacion, version): ops / max(segundos, 1e-9) for operacion, version, ops, segundos in filas}
+        for operacion in ('insert', 'find', 'update', 'delete'):
+            simple, lotes = tasas[(operacion, 'crud.py')], tasas[(operacion, 'crud_bulk.py')]
+            print(f"{cantidad:>8} {operacion:<8} {simple:>14,.0f} {lotes:>16,.0f} {lotes / simple:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
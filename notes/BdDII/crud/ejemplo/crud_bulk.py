@@ -0,0 +1,153 @@
+from pymongo import MongoClient, InsertOne, UpdateOne, DeleteOne
+import datetime
+
+# Versión "por lotes" de crud.py: las mismas operaciones CRUD pero pensadas
+# para muchos documentos. Cada viaje al servidor cuesta (red + confirmación),
+# así que en lugar de una operación por documento se agrupan en lotes.
+
+TAMANO_LOTE = 1000          # documentos por insert_many / bulk_write
+TAMANO_LOTE_CURSOR = 500    # documentos que trae el cursor en cada viaje
+
+_client = None
+
+# Paso 1: Un único cliente compartido
+def get_client(uri='mongodb://localhost:27017/'):
+    # MongoClient mantiene un pool de conexiones: se crea UNA vez y se reutiliza.
+    # Crear un cliente nuevo en cada llamada (como get_database() en crud.py)
+    # abre conexiones nuevas y repite el handshake con el servidor.
+    global _client
+    if _client is None:
+        _client = MongoClient(
+            uri,
+            maxPoolSize=50,                 # conexiones simultáneas como máximo
+            minPoolSize=5,                  # conexiones que se mantienen abiertas
+            maxIdleTimeMS=60000,            # cerrar conexiones ociosas después de 1 minuto
+            serverSelectionTimeoutMS=5000,  # fallar rápido si no hay servidor
+        )
+    return _client
+
+def get_database(uri='mongodb://localhost:27017/'):
+    # Obtener/crear la base de datos 'empresa' desde el cliente compartido
+    return get_client(uri)['empresa']
+
+def _lotes(elementos, tamano):
+    # Partir una secuencia (o un generador) en listas de 'tamano' elementos
+    lote = []
+    for elemento in elementos:
+        lote.append(elemento)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+# ------------------ CREATE ------------------
+def crear_empleados(empleados_collection, empleados, tamano_lote=TAMANO_LOTE):
+    # insert_many envía todo el lote en un solo viaje.
+    # ordered=False: si un documento falla (por ejemplo, _id duplicado) el resto
+    # del lote se inserta igual y el servidor puede procesarlo en paralelo.
+    ids = []
+    for lote in _lotes(empleados, tamano_lote):
+        resultado = empleados_collection.insert_many(lote, ordered=False)
+        ids.extend(resultado.inserted_ids)
+    print(f"Empleados creados: {len(ids)}")
+    return ids
+
+# ------------------ READ ------------------
+def leer_empleados(empleados_collection, filtro=None, campos=("nombre", "puesto"),
+                   tamano_lote=TAMANO_LOTE_CURSOR, limite=0):
+    # Proyección: pedir solo los campos que se van a usar (menos bytes por documento).
+    # batch_size: cuántos documentos trae el cursor en cada viaje al servidor.
+    # limit: no recorrer toda la colección si solo se necesitan algunos.
+    # Devuelve un generador: los documentos se procesan a medida que llegan,
+    # sin cargar la colección entera en memoria.
+    proyeccion = {campo: 1 for campo in campos}
+    cursor = (empleados_collection.find(filtro or {}, proyeccion)
+              .batch_size(tamano_lote)
+              .limit(limite))
+    for empleado in cursor:
+        yield empleado
+
+def mostrar_empleados(empleados_collection, filtro=None, maximo=10):
+    # Imprimir miles de líneas es más lento que la consulta: mostrar solo algunas
+    print("\nEmpleados:")
+    total = 0
+    for empleado in leer_empleados(empleados_collection, filtro, limite=maximo):
+        print(f"ID: {empleado['_id']}, Nombre: {empleado['nombre']}, Puesto: {empleado['puesto']}")
+        total += 1
+    restantes = empleados_collection.count_documents(filtro or {}) - total
+    if restantes > 0:
+        print(f"... y {restantes} más")
+
+# ------------------ UPDATE ------------------
+def actualizar_empleados(empleados_collection, cambios, tamano_lote=TAMANO_LOTE):
+    # cambios: pares (id, {campo: valor}) con un cambio distinto por documento.
+    # bulk_write agrupa muchas operaciones UpdateOne en un solo viaje.
+    modificados = 0
+    operaciones = (UpdateOne({"_id": empleado_id}, {"$set": campos}) for empleado_id, campos in cambios)
+    for lote in _lotes(operaciones, tamano_lote):
+        resultado = empleados_collection.bulk_write(lote, ordered=False)
+        modificados += resultado.modified_count
+    print(f"\nEmpleados actualizados: {modificados} documento(s) modificado(s)")
+    return modificados
+
+def actualizar_por_criterio(empleados_collection, filtro, campos):
+    # Si el cambio es el mismo para todos, update_many lo resuelve en el servidor
+    resultado = empleados_collection.update_many(filtro, {"$set": campos})
+    print(f"Información actualizada: {resultado.modified_count} documento(s) modificado(s)")
+    return resultado.modified_count
+
+# ------------------ DELETE ------------------
+def eliminar_empleados(empleados_collection, ids, tamano_lote=TAMANO_LOTE):
+    # delete_many con $in borra un lote de documentos por _id en un solo viaje
+    eliminados = 0
+    for lote in _lotes(ids, tamano_lote):
+        resultado = empleados_collection.delete_many({"_id": {"$in": lote}})
+        eliminados += resultado.deleted_count
+    print(f"\nEmpleados eliminados: {eliminados} documento(s) eliminado(s)")
+    return eliminados
+
+def operaciones_mixtas(empleados_collection, nuevos, cambios, ids_a_borrar):
+    # bulk_write también mezcla inserciones, actualizaciones y borrados en un lote
+    operaciones = ([InsertOne(empleado) for empleado in nuevos] +
+                   [UpdateOne({"_id": i}, {"$set": campos}) for i, campos in cambios] +
+                   [DeleteOne({"_id": i}) for i in ids_a_borrar])
+    resultado = empleados_collection.bulk_write(operaciones, ordered=False)
+    print(f"Insertados: {resultado.inserted_count}, modificados: {resultado.modified_count}, "
+          f"eliminados: {resultado.deleted_count}")
+    return resultado
+
+# ------------------ EJECUTAR OPERACIONES ------------------
+def generar_empleados(cantidad):
+    # Documentos de ejemplo (un generador: no hace falta tenerlos todos en memoria)
+    puestos = ["Desarrollador Python", "Analista de Datos", "DBA", "Desarrollador Frontend"]
+    for i in range(cantidad):
+        yield {
+            "nombre": f"Empleado {i}",
+            "email": f"empleado{i}@ejemplo.com",
+            "edad": 20 + i % 45,
+            "puesto": puestos[i % len(puestos)],
+            "fecha_contratacion": datetime.datetime.now(),
+            "habilidades": ["Python", "MongoDB"],
+        }
+
+def main():
+    db = get_database()
+    empleados_collection = db['empleados']
+
+    # Crear 10.000 empleados en lotes
+    ids = crear_empleados(empleados_collection, generar_empleados(10000))
+
+    # Leer solo algunos campos, con un cursor por lotes
+    mostrar_empleados(empleados_collection, {"edad": {"$gt": 25}})
+
+    # Un cambio distinto por empleado (bulk_write) y uno común a todos (update_many)
+    actualizar_empleados(empleados_collection, ((i, {"edad": 30 + n % 30}) for n, i in enumerate(ids)))
+    actualizar_por_criterio(empleados_collection, {"puesto": "DBA"}, {"puesto": "DBA Senior"})
+
+    # Eliminar todos los empleados creados
+    eliminar_empleados(empleados_collection, ids)
+    print(f"Quedan {empleados_collection.count_documents({'_id': {'$in': ids[:1000]}})} de los empleados creados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+optimize_images.py - Optimize the images referenced by a rendered note
+
+Finds the <img> references of an HTML file, writes resized and recompressed
+copies (optionally also WebP) with content-hashed names into <output dir>/img/,
+and rewrites the tags with loading="lazy", decoding="async" and their intrinsic
+width/height to avoid layout shift. Processed images are cached by the hash of
+the source file, so rebuilds only process new or modified images.
+
+Usage:
+    python optimize_images.py page.html [-o output.html] [--source-dir DIR] [--max-width 1200] [--webp]
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from urllib.parse import unquote
+from bs4 import BeautifulSoup
+
+from output_utils import write_if_changed
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow es opcional: sin él solo se copian las imágenes
+    Image = None
+
+DEFAULT_MAX_WIDTH = 1200
+DEFAULT_QUALITY = 82
+IMAGE_DIR = 'img'
+CACHE_FILE = '.image_cache.json'
+RASTER_FORMATS = {'.png': 'PNG', '.jpg': 'JPEG', '.jpeg': 'JPEG', '.webp': 'WEBP'}
+
+
+def _is_local(src):
+    return src and not src.startswith(('http://', 'https://', '//', 'data:'))
+
+
+def _resolve_source(src, search_dirs):
+    """Find the referenced file in the HTML directory or the Markdown source directory."""
+    relative = unquote(src.split('#', 1)[0].split('?', 1)[0])
+    for directory in search_dirs:
+        candidate = Path(directory) / relative
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def _load_cache(image_dir):
+    cache_path = image_dir / CACHE_FILE
+    if cache_path.exists():
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def _save_cache(image_dir, cache):
+    with open(image_dir / CACHE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def process_image(source, source_hash, image_dir, max_width, quality, webp):
+    """
+    Write the optimized copy (and WebP variant) of one image.
+
+    Returns a cache entry: {'file', 'webp', 'width', 'height'} with file names
+    relative to image_dir.
+    """
+    digest = source_hash[:12]
+    suffix = source.suffix.lower()
+    name = f"{source.stem}.{digest}{suffix}"
+    entry = {'file': name, 'webp': None, 'width': None, 'height': None}
+
+    if Image is None or suffix not in RASTER_FORMATS:
+        # SVG, GIF or no Pillow: only a content-hashed copy
+        shutil.copyfile(source, image_dir / name)
+        return entry
+
+    with Image.open(source) as im:
+        im.load()
+        resized = im.width > max_width
+        if resized:
+            height = round(im.height * max_width / im.width)
+            im = im.resize((max_width, height), Image.LANCZOS)
+        entry['width'], entry['height'] = im.width, im.height
+
+        image_format = RASTER_FORMATS[suffix]
+        if image_format == 'JPEG':
+            im.convert('RGB').save(image_dir / name, 'JPEG', quality=quality, optimize=True, progressive=True)
+        elif image_format == 'PNG':
+            im.save(image_dir / name, 'PNG', optimize=True)
+        else:
+            im.save(image_dir / name, 'WEBP', quality=quality, method=6)
+
+        # Keep the original file if recompressing made it bigger
+        if not resized and (image_dir / name).stat().st_size > source.stat().st_size:
+            shutil.copyfile(source, image_dir / name)
+
+        if webp and image_format != 'WEBP':
+            webp_name = f"{source.stem}.{digest}.webp"
+            im.save(image_dir / webp_name, 'WEBP', quality=quality, method=6)
+            entry['webp'] = webp_name
+
+    return entry
+
+
+def optimize_images(input_path, output_path, source_dir=None, max_width=DEFAULT_MAX_WIDTH,
+                    quality=DEFAULT_QUALITY, webp=False):
+    """Optimize every local <img> of input_path and write the rewritten HTML to output_path."""
+    input_path = Path(input_path)
+    output_path = Path(output_path)
+    with open(input_path, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+
+    image_dir = output_path.parent / IMAGE_DIR
+    search_dirs = [input_path.parent] + ([source_dir] if source_dir else [])
+    cache = None
+    processed = cached = missing = 0
+
+    for img in soup.find_all('img'):
+        src = img.get('src', '')
+        if _is_local(src) and not src.startswith(f'{IMAGE_DIR}/'):
+            source = _resolve_source(src, search_dirs)
+            if source is None:
+                print(f"Warning: imagen no encontrada: {src}")
+                missing += 1
+            else:
+                if cache is None:
+                    image_dir.mkdir(parents=True, exist_ok=True)
+                    cache = _load_cache(image_dir)
+
+                source_hash = hashlib.sha256(source.read_bytes()).hexdigest()
+                key = f"{source_hash}:{max_width}:{quality}:{int(webp)}:{int(Image is not None)}"
+                entry = cache.get(key)
+                if entry and (image_dir / entry['file']).exists() and \
+                        (not entry['webp'] or (image_dir / entry['webp']).exists()):
+                    cached += 1
+                else:
+                    entry = process_image(source, source_hash, image_dir, max_width, quality, webp)
+                    cache[key] = entry
+                    processed += 1
+
+                img['src'] = f"{IMAGE_DIR}/{entry['file']}"
+                if entry['width'] and not img.has_attr('width') and not img.has_attr('height'):
+                    img['width'] = str(entry['width'])
+                    img['height'] = str(entry['height'])
+                if entry['webp'] and img.parent.name != 'picture':
+                    picture = soup.new_tag('picture')
+                    img.wrap(picture)
+                    source_tag = soup.new_tag('source', type='image/webp', srcset=f"{IMAGE_DIR}/{entry['webp']}")
+                    img.insert_before(source_tag)
+
+        img['loading'] = img.get('loading', 'lazy')
+        img['decoding'] = img.get('decoding', 'async')
+
+    if cache is not None:
+        _save_cache(image_dir, cache)
+
+    write_if_changed(output_path, str(soup))
+
+    print(f"Imágenes optimizadas: {processed}, desde caché: {cached}, no encontradas: {missing}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimiza las imágenes referenciadas por un HTML generado.')
+    parser.add_argument('input', help='HTML de entrada')
+    parser.add_argument('-o', '--output', help='Archivo HTML de salida (por defecto: <input>_images.html)')
+    parser.add_argument('--source-dir', help='Directorio del Markdown original, donde buscar las imágenes')
+    parser.add_argument('--max-width', type=int, default=DEFAULT_MAX_WIDTH,
+                        help=f'Ancho máximo en píxeles (por defecto: {DEFAULT_MAX_WIDTH})')
+    parser.add_argument('-q', '--quality', type=int, default=DEFAULT_QUALITY,
+                        help=f'Calidad JPEG/WebP (por defecto: {DEFAULT_QUALITY})')
+    parser.add_argument('--webp', action='store_true', help='Generar también copias WebP (<picture>)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: El archivo '{args.input}' no existe.")
+        sys.exit(1)
+
+    if Image is None:
+        print("Warning: Pillow no está instalado; las imágenes se copian sin redimensionar.")
+
+    if args.output:
+        output_path = args.output
+    else:
+        name, ext = os.path.splitext(args.input)
+        output_path = f"{name}_images{ext or '.html'}"
+
+    optimize_images(args.input, output_path, args.source_dir, args.max_width, args.quality, args.webp)
+    print(f"✓ Se guardó correctamente el archivo: \"{output_path}\"")
+
+
+if __name__ == '__main__':
+    main()
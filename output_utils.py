@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+output_utils.py - Atomic, write-if-changed output for the pipeline scripts
+
+Every stage writes its result with write_if_changed(): when the file already
+has exactly the same content (same size, then same SHA-256) nothing is
+written, so the mtime is kept and rsync / static hosts see no change. When the
+content differs it is written to a temporary file in the same directory and
+renamed over the target, so a crash never leaves a half-written page.
+
+write_chunks_if_changed() does the same for content produced piece by piece
+(streaming conversion), without holding the whole file in memory.
+
+Usage:
+    from output_utils import write_if_changed
+    changed = write_if_changed('html_output/nota_final.html', html)
+    changed = write_chunks_if_changed('html_output/nota.html', generate_html())
+"""
+
+import os
+import hashlib
+import tempfile
+
+HASH_CHUNK = 1024 * 1024
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def same_content(path, data):
+    """True if the file at path exists and contains exactly data (bytes)."""
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        return _file_digest(path) == hashlib.sha256(data).digest()
+    except OSError:
+        return False
+
+
+def _default_mode():
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def _replace_from_temp(path, write, keep=None):
+    """
+    Call write(file) on a temporary file next to path and rename it over path.
+
+    keep(tmp_path) is called before the rename; if it returns True the
+    temporary file is discarded and path is left untouched. Returns True if
+    path was replaced.
+    """
+    directory = os.path.dirname(path) or '.'
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except OSError:
+        mode = _default_mode()
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        if keep is not None and keep(tmp_path):
+            os.unlink(tmp_path)
+            return False
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def write_if_changed(path, content, encoding='utf-8'):
+    """
+    Write content (str or bytes) to path unless the file already has it.
+
+    The write goes to a temporary file next to path that is then renamed over
+    it (atomic on POSIX and Windows). Keeps the permissions of an existing
+    file. Returns True if the file was written, False if it was up to date.
+    """
+    data = content.encode(encoding) if isinstance(content, str) else content
+    path = os.fspath(path)
+    if same_content(path, data):
+        return False
+    return _replace_from_temp(path, lambda f: f.write(data))
+
+
+def write_chunks_if_changed(path, chunks, encoding='utf-8'):
+    """
+    Like write_if_changed, for an iterable of str or bytes chunks.
+
+    The chunks are written to the temporary file as they are produced; the
+    temporary file is then compared with the existing one (size, then hash)
+    and discarded if they are equal.
+    """
+    path = os.fspath(path)
+
+    def write(f):
+        for chunk in chunks:
+            f.write(chunk.encode(encoding) if isinstance(chunk, str) else chunk)
+
+    def unchanged(tmp_path):
+        try:
+            return (os.path.getsize(path) == os.path.getsize(tmp_path)
+                    and _file_digest(path) == _file_digest(tmp_path))
+        except OSError:
+            return False
+
+    return _replace_from_temp(path, write, unchanged)
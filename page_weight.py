@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+page_weight.py - What each part of a generated page weighs
+
+Reads *_final.html pages (or every page under html_output directories) and
+splits their bytes and DOM nodes into categories, so that the biggest
+contributors can be targeted:
+
+  css: <style> ...        <style> elements (critical, dynamic, extra themes...)
+  css: style attributes   style="..." attributes (the default static CSS mode)
+  css: textarea payload   the <textarea id="css-editor"> of --textarea-css
+  css: deferred payload   the <script type="text/css"> of --critical-css
+  css: runtime styles     the button styles as JSON (<script id="runtime-styles">)
+  script: <name>          each injected script (collapsible, css loader, mermaid...)
+  code: <language>        highlighted code blocks, by language
+  code: controls          the collapsible containers around the code blocks
+  code: deferred          full bodies of long code blocks kept in a <template>
+                          (collapsible.py --defer-code; not in the live DOM)
+  mermaid                 Mermaid diagram sources
+  svg                     inline SVG
+  toc                     the table of contents
+  prose                   everything else in the <body>
+  document                doctype, <head> metadata and the html/head/body tags
+
+Every byte of the file goes to exactly one category (an element and its
+content take the category of the innermost categorized element). Nodes are
+elements plus text nodes.
+
+Usage:
+    python page_weight.py notes/Prog4/html_output/apuntes_typescript_final.html
+    python page_weight.py notes --per-page --json page_weight.json
+"""
+
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+from html.parser import HTMLParser
+
+from collapsible import DEFERRED_CODE_CLASS, RUNTIME_STYLES_ID
+from critical_css import CRITICAL_STYLE_ID, DEFERRED_CSS_ID
+from highlight_themes import SWITCH_SCRIPT_ID
+from inline_css import DYNAMIC_STYLE_ID
+from mermaid_runtime import LOADER_ID as MERMAID_LOADER_ID
+from precache import REGISTER_SCRIPT_ID
+from split_chapters import LOADER_ID as CHAPTER_LOADER_ID
+
+STYLE_ATTRIBUTE_RE = re.compile(r"""\s+style\s*=\s*("[^"]*"|'[^']*'|[^\s>]+)""", re.IGNORECASE)
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                 'source', 'track', 'wbr'}
+
+STYLE_CATEGORIES = {
+    CRITICAL_STYLE_ID: 'css: <style> critical',
+    DYNAMIC_STYLE_ID: 'css: <style> dynamic',
+}
+SCRIPT_ID_CATEGORIES = {
+    DEFERRED_CSS_ID: 'css: deferred payload',
+    RUNTIME_STYLES_ID: 'css: runtime styles',
+    SWITCH_SCRIPT_ID: 'script: theme switch',
+    MERMAID_LOADER_ID: 'script: mermaid loader',
+    CHAPTER_LOADER_ID: 'script: chapter loader',
+    REGISTER_SCRIPT_ID: 'script: service worker',
+}
+# Scripts sin id: se reconocen por su contenido (el primero que coincide)
+SCRIPT_MARKERS = (
+    ('script: collapsible', 'applyRuntimeStyles'),
+    ('script: collapsible', 'collapsible-container'),
+    ('script: collapsible', 'getElementHeight'),  # páginas generadas con versiones anteriores
+    ('script: css loader', f"getElementById('{DEFERRED_CSS_ID}')"),
+    ('script: css loader', 'css-editor'),
+    ('script: button styles', 'toggle-button'),
+    ('script: mermaid', 'div.mermaid'),
+    ('script: mermaid', 'mermaid.initialize'),
+)
+
+
+def _classes(attrs):
+    return (attrs.get('class') or '').split()
+
+
+def _script_category(attrs, text):
+    category = SCRIPT_ID_CATEGORIES.get(attrs.get('id'))
+    if category:
+        return category
+    for category, marker in SCRIPT_MARKERS:
+        if marker in text:
+            return category
+    return 'script: other'
+
+
+class PageWeightParser(HTMLParser):
+    """Streaming parser that adds the raw bytes of every token to its category."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.stack = []        # (tag, categoría del elemento, categoría de su contenido)
+        self.categories = {}   # categoría -> [bytes, nodos]
+        self.script = None     # (attrs, partes) del <script> abierto
+        self.in_text = False   # el último token fue texto (un nodo de texto continúa)
+
+    def _add(self, category, text, nodes=0):
+        entry = self.categories.setdefault(category, [0, 0])
+        entry[0] += len(text.encode('utf-8'))
+        entry[1] += nodes
+
+    def _current(self):
+        return self.stack[-1][2] if self.stack else 'document'
+
+    def _element_category(self, tag, attrs):
+        classes = _classes(attrs)
+        if tag == 'style':
+            return STYLE_CATEGORIES.get(attrs.get('id'), 'css: <style>')
+        if tag == 'textarea' and attrs.get('id') == 'css-editor':
+            return 'css: textarea payload'
+        if tag == 'svg':
+            return 'svg'
+        if tag == 'template' and DEFERRED_CODE_CLASS in classes:
+            return 'code: deferred'
+        if tag == 'div' and 'highlight' in classes:
+            languages = [c[len('language-'):] for c in classes if c.startswith('language-')]
+            return f"code: {languages[0] if languages else 'text'}"
+        if tag == 'pre' and ({'empty-code-block', 'highlight-error'} & set(classes)):
+            return 'code: text'
+        if tag == 'div' and 'mermaid' in classes:
+            return 'mermaid'
+        if attrs.get('id') == 'table-of-contents':
+            return 'toc'
+        if tag in ('html', 'head'):
+            return 'document'
+        return None
+
+    def handle_starttag(self, tag, attr_list):
+        self.in_text = False
+        attrs = dict(attr_list)
+        raw = self.get_starttag_text() or f'<{tag}>'
+        if tag == 'script':
+            self.script = (attrs, [raw])
+            self.stack.append((tag, None, None))
+            return
+        if tag == 'body':
+            # Las etiquetas son del documento; su contenido, prosa salvo que sea otra cosa
+            own, content = 'document', 'prose'
+        elif tag == 'div' and 'collapsible-container' in _classes(attrs):
+            # El contenedor es de los controles; el bloque que envuelve sigue siendo código
+            own, content = 'code: controls', self._current()
+        else:
+            own = content = self._element_category(tag, attrs) or self._current()
+        style = STYLE_ATTRIBUTE_RE.search(raw)
+        if style:
+            # El atributo style va aparte: es el CSS del modo estático
+            self._add('css: style attributes', style.group(0))
+            raw = raw[:style.start()] + raw[style.end():]
+        self._add(own, raw, nodes=1)
+        if tag not in VOID_ELEMENTS and not raw.endswith('/>'):
+            self.stack.append((tag, own, content))
+
+    def handle_startendtag(self, tag, attr_list):
+        # <tag /> no tiene contenido ni etiqueta de cierre (handle_starttag no lo apila)
+        self.handle_starttag(tag, attr_list)
+
+    def handle_endtag(self, tag):
+        self.in_text = False
+        raw = f'</{tag}>'
+        if tag == 'script' and self.script is not None:
+            attrs, parts = self.script
+            text = ''.join(parts[1:])
+            category = _script_category(attrs, text)
+            self._add(category, ''.join(parts) + raw, nodes=1 + bool(text))
+            self.script = None
+            if self.stack and self.stack[-1][0] == 'script':
+                self.stack.pop()
+            return
+        # Cerrar hasta el elemento abierto con esa etiqueta (HTML permite omitir cierres)
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                category = self.stack[index][1]
+                del self.stack[index:]
+                self._add(category, raw)
+                return
+        self._add(self._current(), raw)
+
+    def _text(self, text):
+        if self.script is not None:
+            self.script[1].append(text)
+            return
+        self._add(self._current(), text, nodes=0 if self.in_text else 1)
+        self.in_text = True
+
+    def handle_data(self, data):
+        self._text(data)
+
+    def handle_entityref(self, name):
+        self._text(f'&{name};')
+
+    def handle_charref(self, name):
+        self._text(f'&#{name};')
+
+    def handle_comment(self, data):
+        self.in_text = False
+        self._add(self._current(), f'<!--{data}-->', nodes=1)
+
+    def handle_decl(self, decl):
+        self._add('document', f'<!{decl}>')
+
+    def unknown_decl(self, data):
+        self._add(self._current(), f'<![{data}]>')
+
+
+def analyze_page(path):
+    """{'bytes': ..., 'nodes': ..., 'categories': {category: {'bytes', 'nodes'}}} of one page."""
+    data = Path(path).read_bytes()
+    parser = PageWeightParser()
+    parser.feed(data.decode('utf-8', errors='replace'))
+    parser.close()
+    categories = parser.categories
+    # Lo que el parser no reconstruye byte a byte (mayúsculas, espacios en las etiquetas de cierre...)
+    difference = len(data) - sum(entry[0] for entry in categories.values())
+    if difference:
+        categories.setdefault('document', [0, 0])[0] += difference
+    return {
+        'bytes': len(data),
+        'nodes': sum(entry[1] for entry in categories.values()),
+        'categories': {name: {'bytes': b, 'nodes': n} for name, (b, n) in sorted(categories.items())},
+    }
+
+
+def find_pages(paths):
+    """The *_final.html pages under the given files/directories."""
+    pages = []
+    for path in map(Path, paths):
+        if path.is_file():
+            pages.append(path)
+        else:
+            pages.extend(path.rglob('*_final.html'))
+    return sorted(set(pages))
+
+
+def aggregate(reports):
+    """Sum the reports of several pages."""
+    total = {'bytes': 0, 'nodes': 0, 'categories': {}}
+    for report in reports:
+        total['bytes'] += report['bytes']
+        total['nodes'] += report['nodes']
+        for name, entry in report['categories'].items():
+            summed = total['categories'].setdefault(name, {'bytes': 0, 'nodes': 0})
+            summed['bytes'] += entry['bytes']
+            summed['nodes'] += entry['nodes']
+    return total
+
+
+def _format_size(size):
+    if size >= 1024 * 1024:
+        return f"{size / (1024 * 1024):.1f} MB"
+    return f"{size / 1024:.1f} KB"
+
+
+def print_table(title, report):
+    """Categories sorted by bytes, largest first."""
+    print(f"{title} ({_format_size(report['bytes'])}, {report['nodes']} nodos)")
+    print(f"  {'Categoría':<28} {'Tamaño':>10} {'%':>5} {'Nodos':>8} {'%':>5}")
+    rows = sorted(report['categories'].items(), key=lambda item: (-item[1]['bytes'], item[0]))
+    for name, entry in rows:
+        print(f"  {name:<28} {_format_size(entry['bytes']):>10} {100 * entry['bytes'] / max(report['bytes'], 1):>5.1f} "
+              f"{entry['nodes']:>8} {100 * entry['nodes'] / max(report['nodes'], 1):>5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Desglose del peso de las páginas generadas por categoría.')
+    parser.add_argument('paths', nargs='+', help='Páginas *_final.html o directorios (html_output, notes...)')
+    parser.add_argument('--json', metavar='ARCHIVO', help="Guardar el desglose en JSON ('-' para la salida estándar)")
+    parser.add_argument('--per-page', action='store_true', help='Mostrar también la tabla de cada página')
+    args = parser.parse_args()
+
+    pages = find_pages(args.paths)
+    if not pages:
+        print("No se encontraron páginas *_final.html.")
+        sys.exit(1)
+
+    reports = {str(page): analyze_page(page) for page in pages}
+    total = aggregate(reports.values())
+
+    if args.json == '-':
+        print(json.dumps({'pages': reports, 'total': total}, indent=2, ensure_ascii=False))
+        return
+    if args.per_page or len(pages) == 1:
+        for page, report in reports.items():
+            print_table(page, report)
+            print()
+    if len(pages) > 1:
+        print_table(f'Total: {len(pages)} páginas', total)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'pages': reports, 'total': total}, f, indent=2, ensure_ascii=False)
+        print(f"Desglose guardado en {args.json}")
+
+
+if __name__ == '__main__':
+    main()
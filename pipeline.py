@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+pipeline.py - In-memory version of the md2html.sh pipeline
+
+Runs the same stages as md2html.sh (md2html -> collapsible -> table of
+contents -> simplify_css -> inline_css) on strings, without temporary files
+and without starting a new interpreter per stage. The table of contents is
+built by a persistent node worker (add_content_table.js --stdio).
+
+A Pipeline object keeps the imports, the CSS files and the node worker warm,
+so it can be reused for many documents (see render_server.py).
+
+With --draft, the page is only a quick preview of the structure: code blocks
+are plain escaped <pre> (no Pygments), collapsible, simplify_css and
+inline_css (with its prettify) are skipped, and the styles are linked from
+shared stylesheets in <output dir>/assets/ instead of being inlined. Only
+md2html and the table of contents run, and the default output is
+html_output/<name>_draft.html (compress_output, search_index and precache
+only take *_final.html pages).
+
+With --defer-code, collapsed code blocks longer than the given number of
+lines keep only their visible lines in the DOM; the full highlighted body
+waits in a <template> until the first expand or copy (collapsible.py).
+
+With --stream, very large notes are converted one top-level section at a
+time and written as they are produced (memory bounded by the largest
+section). Only md2html and collapsible run in that mode: the table of
+contents, simplify_css and inline_css need the whole document, so the
+default output is html_output/<name>_stream.html, not the final page.
+
+Usage:
+    python pipeline.py input.md [-o output.html] [--skip-collapsible] [--skip-toc] [--critical-css | --textarea-css]
+                        [--themes monokai ...] [--stream] [--draft] [--defer-code [20]] [--no-optimize-svg]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+import subprocess
+import contextlib
+from pathlib import Path
+
+import build_metrics
+from md2html import render_markdown, stream_markdown, document_end, install_stylesheet, SectionCache
+from collapsible import collapse_html, collapse_fragment, collapse_skeleton, DEFAULT_DEFER_LINES, DEFAULT_MAX_LINES
+from simplify_css import simplify_styles
+from inline_css import inline_document
+from output_utils import write_if_changed, write_chunks_if_changed
+
+ROOT = Path(__file__).resolve().parent
+SYNTAX_CSS = ROOT / 'assets' / 'sintax.css'
+TOC_CSS = ROOT / 'assets' / 'toc.css'
+TOC_CSS_ASSET = 'toc.css'
+TOC_SCRIPT = ROOT / 'add_content_table.js'
+TOC_DEPTH = 2
+
+
+class TocWorker:
+    """Persistent `node add_content_table.js --stdio` process (one request at a time)."""
+
+    def __init__(self, script=TOC_SCRIPT):
+        self.script = str(script)
+        self.process = None
+        self.lock = threading.Lock()
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            ['node', self.script, '--stdio'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            text=True, encoding='utf-8', bufsize=1)
+
+    def build(self, html, depth=TOC_DEPTH, css=None):
+        with self.lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            self.process.stdin.write(json.dumps({'html': html, 'depth': depth, 'css': css}) + '\n')
+            self.process.stdin.flush()
+            line = self.process.stdout.readline()
+        if not line:
+            self.process = None
+            raise RuntimeError('El proceso de add_content_table.js terminó inesperadamente')
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(f"add_content_table.js: {response['error']}")
+        return response['html']
+
+    def close(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        self.process = None
+
+
+def default_output_path(md_path, kind='final'):
+    """
+    Same location as md2html.sh: <md dir>/html_output/<name>_<kind>.html.
+
+    Partial outputs (kind 'stream' or 'draft') get their own name, so they
+    never replace the final page that the later steps publish.
+    """
+    md_path = Path(md_path)
+    return md_path.parent / 'html_output' / f'{md_path.stem}_{kind}.html'
+
+
+class Pipeline:
+    """Warm, reusable renderer with the stages of md2html.sh."""
+
+    def __init__(self, skip_collapsible=False, skip_toc=False, highlight_style='default',
+                 max_lines=DEFAULT_MAX_LINES, quiet=False, compact_highlight=True, css_mode='static', themes=(),
+                 draft=False, defer_lines=None, optimize_svg=True):
+        self.skip_collapsible = skip_collapsible
+        self.draft = draft
+        self.themes = tuple(themes)
+        if self.themes and draft:
+            print("Warning: el modo borrador no resalta el código; se omiten los temas")
+            self.themes = ()
+        if self.themes and css_mode == 'static':
+            # Un atributo style no puede cambiar con el tema: se conserva una hoja de estilos
+            print("Warning: los temas de resaltado necesitan CSS en la página; se usa --critical-css")
+            css_mode = 'critical'
+        self.css_mode = css_mode
+        self.highlight_style = highlight_style
+        self.compact_highlight = compact_highlight
+        self.max_lines = max_lines
+        self.defer_lines = defer_lines
+        self.optimize_svg = optimize_svg
+        self.quiet = quiet
+        self.toc_css = TOC_CSS.read_text(encoding='utf-8') if TOC_CSS.exists() else None
+        self.toc = None
+        if not skip_toc:
+            if shutil.which('node'):
+                self.toc = TocWorker()
+            else:
+                print("Warning: node no está instalado; se omite la tabla de contenidos")
+        # Tiempo por etapa (segundos) del último render
+        self.last_timings = {}
+
+    def render(self, md_content, title='document', output_dir=None, cache=None):
+        """Return the final HTML for a Markdown string (cache: md2html.SectionCache)."""
+        timings = {}
+        stdout = io.StringIO() if self.quiet else sys.stdout
+        build_metrics.record('stage_bytes', len(md_content.encode('utf-8')), 'markdown')
+
+        def finish(stage, start, html):
+            timings[stage] = time.perf_counter() - start
+            build_metrics.record('stage_seconds', round(timings[stage], 6), stage)
+            build_metrics.record('stage_bytes', len(html.encode('utf-8')), stage)
+            return html
+
+        with contextlib.redirect_stdout(stdout):
+            start = time.perf_counter()
+            html = finish('md2html', start, render_markdown(md_content, title, SYNTAX_CSS, self.highlight_style,
+                                                            output_dir, cache, self.compact_highlight, self.themes,
+                                                            self.draft, self.optimize_svg, self.css_mode))
+
+            if not self.skip_collapsible and not self.draft:
+                start = time.perf_counter()
+                html = finish('collapsible', start, collapse_html(html, self.max_lines, self.defer_lines))
+
+            if self.toc is not None:
+                start = time.perf_counter()
+                if self.draft:
+                    # La hoja de la tabla de contenidos se enlaza, como la del borrador
+                    html = self.toc.build(html, TOC_DEPTH)
+                    if self.toc_css:
+                        link = install_stylesheet(TOC_CSS_ASSET, self.toc_css, output_dir)
+                        html = html.replace('</head>', f'{link}\n</head>', 1)
+                else:
+                    html = self.toc.build(html, TOC_DEPTH, self.toc_css)
+                html = finish('toc', start, html)
+
+            if not self.draft:
+                start = time.perf_counter()
+                html = finish('simplify_css', start, simplify_styles(html) or html)
+
+                start = time.perf_counter()
+                html = finish('inline_css', start, inline_document(html, self.css_mode)[0])
+
+        self.last_timings = timings
+        return html
+
+    def render_file(self, md_path, output_dir=None):
+        """
+        Render a Markdown file; output_dir defaults to <md dir>/html_output.
+
+        Unchanged sections are reused from the section cache in output_dir.
+        """
+        md_path = Path(md_path)
+        md_content = md_path.read_text(encoding='utf-8')
+        if output_dir is None:
+            output_dir = default_output_path(md_path).parent
+        cache = SectionCache.for_document(output_dir, md_path.stem)
+        html = self.render(md_content, md_path.stem, output_dir, cache)
+        cache.save()
+        return html
+
+    def stream_file(self, md_path, output_dir=None):
+        """
+        Yield the page for a Markdown file in chunks, one section at a time.
+
+        Runs md2html and collapsible only (see the module docstring); the
+        section cache is not used.
+        """
+        md_path = Path(md_path)
+        if output_dir is None:
+            output_dir = default_output_path(md_path).parent
+        start = None
+        processed = 0
+        # La página por partes conserva su hoja de estilos (no pasa por inline_css)
+        for part, html in stream_markdown(md_path, md_path.stem, SYNTAX_CSS, self.highlight_style, output_dir,
+                                          self.compact_highlight, self.themes, self.optimize_svg, None):
+            if self.skip_collapsible:
+                yield html
+            elif part == 'start':
+                start = html
+                yield collapse_skeleton(start, document_end(False))[0]
+            elif part == 'section':
+                html, count = collapse_fragment(html, self.max_lines, self.defer_lines)
+                processed += count
+                yield html
+            else:
+                yield collapse_skeleton(start, html)[1]
+        if not self.skip_collapsible and not self.quiet:
+            print(f"Procesados {processed} bloques <pre> con más de {self.max_lines} líneas")
+
+    def close(self):
+        if self.toc is not None:
+            self.toc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ejecuta el pipeline de md2html.sh en memoria.')
+    parser.add_argument('input', help='Archivo Markdown de entrada')
+    parser.add_argument('-o', '--output', help='HTML de salida (por defecto: html_output/<nombre>_final.html; '
+                                                 'con --stream o --draft, <nombre>_stream.html o _draft.html)')
+    parser.add_argument('--skip-collapsible', action='store_true', help='Omitir los bloques colapsables')
+    parser.add_argument('--skip-toc', action='store_true', help='Omitir la tabla de contenidos')
+    css_mode = parser.add_mutually_exclusive_group()
+    css_mode.add_argument('--critical-css', dest='css_mode', action='store_const', const='critical', default='static',
+                          help='CSS de la primera pantalla en el <head> y el resto después del primer pintado '
+                               '(páginas ~30%% más livianas que con atributos style, si el host conserva los <style>)')
+    css_mode.add_argument('--textarea-css', dest='css_mode', action='store_const', const='textarea',
+                          help='Alternativa: CSS en el <textarea> css-editor, inyectado con JS al cargar')
+    parser.add_argument('--themes', nargs='+', default=[], metavar='STYLE',
+                        help='Estilos de Pygments adicionales como temas alternativos (p. ej. --themes monokai)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Convertir y escribir sección por sección (solo md2html y colapsables)')
+    parser.add_argument('--draft', action='store_true',
+                        help='Vista previa rápida: código sin resaltar, sin colapsables ni CSS inline '
+                             '(estilos enlazados desde assets/)')
+    parser.add_argument('--defer-code', type=int, nargs='?', const=DEFAULT_DEFER_LINES, metavar='LÍNEAS',
+                        help='Bloques colapsados de más de LÍNEAS líneas: el cuerpo completo en un <template> '
+                             f'hasta el primer clic (por defecto: {DEFAULT_DEFER_LINES})')
+    parser.add_argument('--no-optimize-svg', action='store_true',
+                        help='Dejar el SVG de los bloques ```svg tal como está escrito (ver svg_optimize.py)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: El archivo '{args.input}' no existe.")
+        sys.exit(1)
+
+    # --stream y --draft no generan la página final (sin CSS inline, sin resaltado...)
+    kind = 'stream' if args.stream else 'draft' if args.draft else 'final'
+    output_path = Path(args.output) if args.output else default_output_path(args.input, kind)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    pipeline = Pipeline(args.skip_collapsible, args.skip_toc or args.stream,
+                        css_mode=args.css_mode, themes=args.themes, draft=args.draft,
+                        defer_lines=args.defer_code, optimize_svg=not args.no_optimize_svg)
+    try:
+        if args.stream:
+            start = time.perf_counter()
+            write_chunks_if_changed(output_path, pipeline.stream_file(args.input, output_path.parent))
+            print(f"Archivo generado por secciones: {output_path} ({(time.perf_counter() - start) * 1000:.0f} ms)")
+            return
+        html = pipeline.render_file(args.input, output_path.parent)
+    finally:
+        pipeline.close()
+    write_if_changed(output_path, html)
+
+    stages = ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in pipeline.last_timings.items())
+    print(f"Archivo final generado: {output_path} ({stages})")
+
+
+if __name__ == '__main__':
+    main()
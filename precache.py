@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+precache.py - Offline reading of the notes site with a service worker
+
+Writes two files at the root of the site (by default notes/):
+
+    precache-manifest.json   every final page, chapter fragment, shared asset
+                             and optimized image, with a hash of its content
+    sw.js                    the service worker
+
+The service worker answers the requests for the files of the manifest from
+its cache, falling back to the network for anything else. It downloads the
+whole manifest when it is installed. When the reader opens a page it checks
+the manifest again in the background (at most once a minute) and re-fetches
+only the entries whose hash changed. Entries that left the manifest are
+dropped. A download whose content does not match its hash is retried on the
+next check (a deploy caught halfway).
+
+Pages register the worker with a small script (registration_script, added by
+build.py --offline). Updates of the manifest are incremental: a file whose
+size and modification time did not change keeps the hash recorded in
+.precache_state.json and is not read again.
+
+Usage:
+    python precache.py [root]
+    python build.py notes --offline
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from urllib.parse import quote
+
+from compress_output import find_targets
+from optimize_images import IMAGE_DIR
+from output_utils import write_if_changed
+
+MANIFEST_FILE = 'precache-manifest.json'
+SERVICE_WORKER_FILE = 'sw.js'
+STATE_FILE = '.precache_state.json'
+REGISTER_SCRIPT_ID = 'service-worker-register'
+# Caracteres hexadecimales del SHA-256 que se guardan por entrada
+HASH_LENGTH = 16
+# Revisión del manifiesto como mucho una vez por intervalo (al abrir una página)
+CHECK_INTERVAL_MS = 60 * 1000
+# Descargas en paralelo al actualizar el caché
+FETCH_CONCURRENCY = 4
+
+SERVICE_WORKER_JS = """// Generado por precache.py: primero el caché, actualización en segundo plano
+var MANIFEST = '__MANIFEST__';
+var CACHE = 'notes-precache';
+var STATE = 'notes-precache-state';
+var CHECK_INTERVAL = __CHECK_INTERVAL__;
+var CONCURRENCY = __CONCURRENCY__;
+var lastCheck = 0;
+var updating = null;
+
+function scopeUrl(path) {
+  return new URL(path, self.registration.scope).href;
+}
+
+function hex(buffer) {
+  return Array.prototype.map.call(new Uint8Array(buffer), function (byte) {
+    return ('0' + byte.toString(16)).slice(-2);
+  }).join('');
+}
+
+// Lo que ya está en el caché: {version, entries: {ruta: hash}}
+function loadState() {
+  return caches.open(STATE).then(function (cache) {
+    return cache.match(MANIFEST);
+  }).then(function (response) {
+    return response ? response.json() : { version: null, entries: {} };
+  }).catch(function () {
+    return { version: null, entries: {} };
+  });
+}
+
+function saveState(state) {
+  return caches.open(STATE).then(function (cache) {
+    return cache.put(MANIFEST, new Response(JSON.stringify(state),
+                                            { headers: { 'Content-Type': 'application/json' } }));
+  });
+}
+
+function fetchEntry(cache, path, hash) {
+  var url = scopeUrl(path);
+  return fetch(url, { cache: 'no-cache' }).then(function (response) {
+    if (!response.ok) throw new Error(response.status + ' ' + url);
+    return response.clone().arrayBuffer().then(function (data) {
+      return crypto.subtle.digest('SHA-256', data);
+    }).then(function (digest) {
+      // A mitad de un deploy el archivo puede no ser el del manifiesto: se reintenta en la próxima revisión
+      if (hex(digest).slice(0, hash.length) !== hash) throw new Error('hash distinto: ' + url);
+      return cache.put(url, response);
+    });
+  });
+}
+
+// Ejecutar las tareas de a CONCURRENCY por vez; los errores no cortan las demás
+function runAll(tasks) {
+  var next = 0;
+  function worker() {
+    if (next >= tasks.length) return Promise.resolve();
+    var task = tasks[next++];
+    return task().catch(function (err) {
+      console.warn('precache:', err);
+    }).then(worker);
+  }
+  var workers = [];
+  for (var i = 0; i < CONCURRENCY; i++) workers.push(worker());
+  return Promise.all(workers);
+}
+
+function update() {
+  if (!updating) {
+    updating = Promise.all([
+      fetch(scopeUrl(MANIFEST), { cache: 'no-cache' }).then(function (response) {
+        if (!response.ok) throw new Error(response.status + ' ' + MANIFEST);
+        return response.json();
+      }),
+      loadState(),
+      caches.open(CACHE)
+    ]).then(function (results) {
+      var manifest = results[0], state = results[1], cache = results[2];
+      if (manifest.version === state.version) return;
+      var entries = manifest.entries;
+      var stored = state.entries;
+      var tasks = Object.keys(entries).filter(function (path) {
+        return stored[path] !== entries[path];
+      }).map(function (path) {
+        return function () {
+          return fetchEntry(cache, path, entries[path]).then(function () {
+            stored[path] = entries[path];
+          });
+        };
+      });
+      Object.keys(stored).forEach(function (path) {
+        if (!(path in entries)) {
+          tasks.push(function () {
+            return cache.delete(scopeUrl(path)).then(function () { delete stored[path]; });
+          });
+        }
+      });
+      return runAll(tasks).then(function () {
+        // La versión solo se da por aplicada si se descargó todo
+        var complete = Object.keys(entries).every(function (path) { return stored[path] === entries[path]; });
+        return saveState({ version: complete ? manifest.version : null, entries: stored });
+      });
+    }).catch(function (err) {
+      console.warn('precache:', err);
+    }).then(function () {
+      lastCheck = Date.now();
+      updating = null;
+    });
+  }
+  return updating;
+}
+
+self.addEventListener('install', function (event) {
+  event.waitUntil(update().then(function () { return self.skipWaiting(); }));
+});
+
+self.addEventListener('activate', function (event) {
+  event.waitUntil(self.clients.claim());
+});
+
+self.addEventListener('fetch', function (event) {
+  var request = event.request;
+  if (request.method !== 'GET' || !request.url.startsWith(self.registration.scope)) return;
+  // Live reload de serve.py y demás conexiones abiertas: nunca pasan por el caché
+  if ((request.headers.get('Accept') || '').indexOf('text/event-stream') !== -1) return;
+  event.respondWith(caches.open(CACHE).then(function (cache) {
+    return cache.match(request, { ignoreSearch: true });
+  }).then(function (cached) {
+    return cached || fetch(request);
+  }));
+  if (request.mode === 'navigate' && Date.now() - lastCheck > CHECK_INTERVAL) {
+    event.waitUntil(update());
+  }
+});
+"""
+
+REGISTER_JS = """(function () {
+  if (!('serviceWorker' in navigator) || location.protocol === 'file:') return;
+  window.addEventListener('load', function () {
+    navigator.serviceWorker.register('__SRC__').catch(function (err) {
+      console.warn('No se pudo registrar el service worker', err);
+    });
+  });
+})();"""
+
+
+def service_worker_js():
+    return (SERVICE_WORKER_JS.replace('__MANIFEST__', MANIFEST_FILE)
+            .replace('__CHECK_INTERVAL__', str(CHECK_INTERVAL_MS))
+            .replace('__CONCURRENCY__', str(FETCH_CONCURRENCY)))
+
+
+def site_root(paths):
+    """Common directory of the given files/directories (where sw.js goes)."""
+    directories = [os.path.abspath(p if os.path.isdir(p) else os.path.dirname(p) or '.') for p in paths]
+    return Path(os.path.commonpath(directories))
+
+
+def registration_script(page_path, root):
+    """<script> that registers the service worker of root from the page at page_path."""
+    src = os.path.relpath(Path(root) / SERVICE_WORKER_FILE, Path(page_path).parent).replace(os.sep, '/')
+    return f'<script id="{REGISTER_SCRIPT_ID}">{REGISTER_JS.replace("__SRC__", src)}</script>'
+
+
+def add_registration(html, page_path, root):
+    """The page with the registration script at the end of the <body>."""
+    script = registration_script(page_path, root)
+    index = html.rfind('</body>')
+    if index == -1:
+        return html + script + '\n'
+    return html[:index] + script + '\n' + html[index:]
+
+
+def find_entries(root):
+    """Files of the site to precache: pages, chapter fragments, shared assets and optimized images."""
+    root = Path(root)
+    files = set(find_targets([root]))
+    for image_dir in root.rglob(IMAGE_DIR):
+        if image_dir.is_dir():
+            files.update(p for p in image_dir.iterdir() if p.is_file() and not p.name.startswith('.'))
+    return sorted(files)
+
+
+def _load_state(path):
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return {}
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def update_manifest(root, verbose=True):
+    """
+    Write (or update) the precache manifest and the service worker of root.
+
+    Returns {'entries', 'hashed', 'changed', 'removed', 'bytes'}: hashed is
+    the number of files read again, changed/removed compare the manifest
+    with the previous one.
+    """
+    root = Path(root)
+    manifest_path = root / MANIFEST_FILE
+    state_path = root / STATE_FILE
+    state = _load_state(state_path)            # ruta -> [bytes, mtime_ns, hash]
+    previous = _load_state(manifest_path).get('entries', {})
+
+    entries = {}
+    new_state = {}
+    hashed = total_bytes = 0
+    for path in find_entries(root):
+        stat = path.stat()
+        relative = path.relative_to(root).as_posix()
+        known = state.get(relative)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            digest = known[2]
+        else:
+            digest = _file_hash(path)
+            hashed += 1
+        new_state[relative] = [stat.st_size, stat.st_mtime_ns, digest]
+        entries[quote(relative)] = digest
+        total_bytes += stat.st_size
+
+    version = hashlib.sha256(json.dumps(entries, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
+    write_if_changed(manifest_path, json.dumps({'version': version, 'entries': entries}, indent=1) + '\n')
+    write_if_changed(root / SERVICE_WORKER_FILE, service_worker_js())
+    write_if_changed(state_path, json.dumps(new_state, separators=(',', ':')))
+
+    stats = {
+        'entries': len(entries),
+        'hashed': hashed,
+        'changed': sum(previous.get(path) != digest for path, digest in entries.items()),
+        'removed': sum(path not in entries for path in previous),
+        'bytes': total_bytes,
+    }
+    if verbose:
+        print(f"Precache: {stats['entries']} archivos ({total_bytes / (1024 * 1024):.1f} MB), "
+              f"{stats['changed']} cambiados, {stats['removed']} eliminados, {hashed} releídos "
+              f"-> {manifest_path}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manifiesto de precarga y service worker para leer los apuntes sin conexión.')
+    parser.add_argument('root', nargs='?', default='notes', help='Raíz del sitio (por defecto: notes)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"Error: El directorio '{args.root}' no existe.")
+        sys.exit(1)
+    update_manifest(args.root)
+    print("Las páginas registran el service worker si se generan con build.py --offline.")
+
+
+if __name__ == '__main__':
+    main()
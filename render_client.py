@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+render_client.py - Command line client for render_server.py
+
+Sends a Markdown file (by path) or Markdown read from stdin to a running
+render server and writes the final HTML to a file or to stdout.
+
+Usage:
+    python render_client.py nota.md [-o html_output/nota_final.html]
+    cat fragmento.md | python render_client.py - > fragmento.html
+    python render_client.py --health | --metrics
+    python render_client.py nota.md --unix /tmp/md2html.sock
+"""
+
+import os
+import sys
+import json
+import socket
+import argparse
+import http.client
+from pathlib import Path
+
+from render_server import DEFAULT_PORT
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(host='127.0.0.1', port=DEFAULT_PORT, unix_path=None, timeout=120):
+    if unix_path:
+        return UnixHTTPConnection(unix_path, timeout=timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def request(connection, method, path, body=None, content_type=None):
+    """Send one request; returns (status, headers, body bytes)."""
+    headers = {'Content-Type': content_type} if content_type else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    return response.status, dict(response.getheaders()), response.read()
+
+
+def render(connection, path=None, markdown=None, title=None, output_dir=None):
+    """Render a file (path) or a Markdown string; returns the HTML or raises RuntimeError."""
+    payload = {'path': path} if path else {'markdown': markdown, 'title': title}
+    if output_dir:
+        payload['output_dir'] = str(output_dir)
+    status, _, body = request(connection, 'POST', '/render', json.dumps(payload).encode('utf-8'),
+                              'application/json')
+    if status != 200:
+        try:
+            message = json.loads(body)['error']
+        except (ValueError, KeyError):
+            message = body.decode('utf-8', errors='replace')
+        raise RuntimeError(f'{status}: {message}')
+    return body.decode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cliente del servidor de renderizado (render_server.py).')
+    parser.add_argument('input', nargs='?', help="Archivo Markdown, o '-' para leer de stdin")
+    parser.add_argument('-o', '--output', help='HTML de salida (por defecto: stdout)')
+    parser.add_argument('-t', '--title', help='Título para el Markdown leído de stdin')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help=f'Puerto (por defecto: {DEFAULT_PORT})')
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección (por defecto: 127.0.0.1)')
+    parser.add_argument('--unix', help='Conectarse por un socket Unix')
+    parser.add_argument('--health', action='store_true', help='Mostrar el estado del servidor')
+    parser.add_argument('--metrics', action='store_true', help='Mostrar las métricas del servidor')
+    args = parser.parse_args()
+
+    connection = connect(args.host, args.port, args.unix)
+    try:
+        if args.health or args.metrics:
+            status, _, body = request(connection, 'GET', '/health' if args.health else '/metrics')
+            print(json.dumps(json.loads(body), indent=2, ensure_ascii=False))
+            sys.exit(0 if status == 200 else 1)
+
+        if not args.input:
+            parser.error("the following arguments are required: input")
+
+        output_dir = Path(args.output).resolve().parent if args.output else None
+        if args.input == '-':
+            html = render(connection, markdown=sys.stdin.read(), title=args.title, output_dir=output_dir)
+        else:
+            if not os.path.exists(args.input):
+                print(f"Error: El archivo '{args.input}' no existe.")
+                sys.exit(1)
+            html = render(connection, path=os.path.abspath(args.input), output_dir=output_dir)
+    except (ConnectionError, FileNotFoundError, socket.timeout) as e:
+        print(f"Error: no se pudo conectar con el servidor de renderizado ({e}). "
+              f"¿Está corriendo render_server.py?", file=sys.stderr)
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        connection.close()
+
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(html, encoding='utf-8')
+        print(f"Archivo generado: {args.output}")
+    else:
+        sys.stdout.write(html)
+
+
+if __name__ == '__main__':
+    main()
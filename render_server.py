@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+render_server.py - Long-running render service with a warm interpreter
+
+Keeps a pool of worker processes with the pipeline (pipeline.py) already
+imported and warmed up, so rendering a note or a snippet does not pay the
+interpreter startup and the Markdown/Pygments/bs4 imports every time.
+
+Endpoints (HTTP/1.1 on localhost or on a Unix socket):
+    POST /render    body: Markdown text, or JSON {"markdown": ..., "title": ...}
+                    or {"path": "nota.md"}; optional "output_dir" (where the
+                    page will be written, for the Mermaid bundle). Returns the
+                    final HTML.
+    GET  /health    liveness and pool size
+    GET  /metrics   request counters, queue and latency percentiles
+
+Requests beyond the pool size wait in a bounded queue; when the queue is full
+the server answers 503.
+
+Usage:
+    python render_server.py [-p 8765] [--host 127.0.0.1] [--unix /tmp/md2html.sock] [-w 4] [-q 32] [--draft]
+    python render_client.py nota.md -o nota_final.html
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from collections import deque
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = os.cpu_count() or 2
+DEFAULT_QUEUE = 32
+MAX_BODY_SIZE = 10 * 1024 * 1024
+KEEPALIVE_TIMEOUT = 15
+LATENCY_WINDOW = 1000
+
+STATUS_TEXT = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+WARMUP_MARKDOWN = """# Warmup
+
+## Capítulo
+
+```js
+const x = 1;
+```
+
+```python
+print('hola')
+```
+"""
+
+# --- procesos de trabajo ---------------------------------------------------------
+
+_pipeline = None
+
+
+def _init_worker(options):
+    """Import the pipeline once per worker process and render a small document."""
+    global _pipeline
+    from pipeline import Pipeline
+    _pipeline = Pipeline(quiet=True, **options)
+    _pipeline.render(WARMUP_MARKDOWN, 'warmup')
+
+
+def _warmup():
+    return os.getpid()
+
+
+def _render_task(request):
+    """Render one request in a worker. Returns (html, stage_timings)."""
+    if request.get('path'):
+        html = _pipeline.render_file(request['path'], request.get('output_dir'))
+    else:
+        html = _pipeline.render(request['markdown'], request.get('title') or 'document',
+                                request.get('output_dir'))
+    return html, _pipeline.last_timings
+
+
+class RenderError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# --- servidor --------------------------------------------------------------------
+
+class RenderServer:
+    def __init__(self, workers=DEFAULT_WORKERS, max_queue=DEFAULT_QUEUE, pipeline_options=None,
+                 verbose=False):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pipeline_options = pipeline_options or {}
+        self.verbose = verbose
+        self.executor = None
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.counters = {'requests': 0, 'rendered': 0, 'errors': 0, 'rejected': 0}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.stage_totals = {}
+
+    # --- pool ------------------------------------------------------------------
+
+    async def warm_up(self):
+        """Start every worker process (each one renders a warm-up document)."""
+        loop = asyncio.get_running_loop()
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                            initargs=(self.pipeline_options,))
+        pids = await asyncio.gather(*(loop.run_in_executor(self.executor, _warmup)
+                                      for _ in range(self.workers)))
+        return len(set(pids))
+
+    def parse_render_request(self, headers, body):
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        if content_type == 'application/json':
+            try:
+                request = json.loads(body.decode('utf-8'))
+            except ValueError:
+                raise RenderError(400, 'JSON inválido')
+            if not isinstance(request, dict) or not (request.get('markdown') is not None or request.get('path')):
+                raise RenderError(400, 'Se esperaba {"markdown": ...} o {"path": ...}')
+        else:
+            request = {'markdown': body.decode('utf-8', errors='replace')}
+
+        if request.get('path'):
+            path = Path(request['path']).expanduser()
+            if not path.is_file():
+                raise RenderError(404, f"No existe el archivo: {request['path']}")
+            request['path'] = str(path.resolve())
+        return request
+
+    async def render(self, request):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.counters['rejected'] += 1
+            raise RenderError(503, 'Cola de renderizado llena')
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            html, timings = await loop.run_in_executor(self.executor, _render_task, request)
+        except Exception as e:
+            self.counters['errors'] += 1
+            raise RenderError(500, f'Error al renderizar: {e}')
+        finally:
+            self.in_flight -= 1
+
+        elapsed = time.perf_counter() - start
+        self.latencies.append(elapsed)
+        self.counters['rendered'] += 1
+        for stage, seconds in timings.items():
+            total = self.stage_totals.setdefault(stage, [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+        return html, elapsed
+
+    def metrics(self):
+        latencies = sorted(self.latencies)
+        p = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+        return {
+            **self.counters,
+            'workers': self.workers,
+            'in_flight': self.in_flight,
+            'queued': max(0, self.in_flight - self.workers),
+            'max_queue': self.max_queue,
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'latency_ms': ({
+                'mean': round(statistics.mean(latencies) * 1000, 2),
+                'p50': p(0.5), 'p95': p(0.95), 'p99': p(0.99), 'max': round(latencies[-1] * 1000, 2),
+                'window': len(latencies),
+            } if latencies else None),
+            'stage_mean_ms': {stage: round(total / count * 1000, 2)
+                              for stage, (total, count) in self.stage_totals.items()},
+        }
+
+    # --- HTTP ------------------------------------------------------------------
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.send(writer, 400, b'Bad Request')
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.send(writer, 400, b'Bad Request')
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.send(writer, 413, b'Payload Too Large')
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                await self.handle_request(writer, method, urlsplit(target).path, headers, body, keep_alive)
+                self.counters['requests'] += 1
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, writer, method, path, headers, body, keep_alive):
+        if path == '/health':
+            payload = {'status': 'ok', 'workers': self.workers, 'in_flight': self.in_flight}
+            await self.send_json(writer, 200, payload, keep_alive)
+        elif path == '/metrics':
+            await self.send_json(writer, 200, self.metrics(), keep_alive)
+        elif path == '/render':
+            if method != 'POST':
+                await self.send(writer, 405, b'Method Not Allowed', keep_alive=keep_alive)
+                return
+            try:
+                request = self.parse_render_request(headers, body)
+                html, elapsed = await self.render(request)
+            except RenderError as e:
+                await self.send_json(writer, e.status, {'error': str(e)}, keep_alive)
+                return
+            if self.verbose:
+                print(f"Render {request.get('path') or request.get('title') or 'snippet'}: {elapsed * 1000:.0f} ms")
+            await self.send(writer, 200, html.encode('utf-8'), 'text/html; charset=utf-8',
+                            {'X-Render-Time-Ms': f'{elapsed * 1000:.1f}'}, keep_alive)
+        else:
+            await self.send(writer, 404, b'Not Found', keep_alive=keep_alive)
+
+    async def send_json(self, writer, status, payload, keep_alive=False):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await self.send(writer, status, body, 'application/json; charset=utf-8', keep_alive=keep_alive)
+
+    async def send(self, writer, status, body, content_type='text/plain; charset=utf-8',
+                   extra_headers=None, keep_alive=False):
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "OK")}',
+                 f'Content-Type: {content_type}',
+                 f'Content-Length: {len(body)}',
+                 f'Connection: {"keep-alive" if keep_alive else "close"}']
+        for name, value in (extra_headers or {}).items():
+            lines.append(f'{name}: {value}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await writer.drain()
+
+    # --- ciclo de vida -----------------------------------------------------------
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT, unix_path=None):
+        await self.warm_up()
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            return await asyncio.start_unix_server(self.handle_client, unix_path)
+        return await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+
+async def _serve_forever(args):
+    options = {'skip_collapsible': args.skip_collapsible, 'skip_toc': args.skip_toc, 'draft': args.draft}
+    server_state = RenderServer(args.workers, args.queue, options, args.verbose)
+    start = time.perf_counter()
+    server = await server_state.start(args.host, args.port, args.unix)
+    where = (f"unix:{args.unix}" if args.unix
+             else f"http://{args.host}:{server.sockets[0].getsockname()[1]}/")
+    print(f"Servidor de renderizado en {where} ({args.workers} procesos, "
+          f"listo en {time.perf_counter() - start:.1f} s; Ctrl+C para salir)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        server_state.stop()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local que mantiene el pipeline de md2html caliente.')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help=f'Puerto (por defecto: {DEFAULT_PORT})')
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección (por defecto: 127.0.0.1)')
+    parser.add_argument('--unix', help='Escuchar en un socket Unix en lugar de TCP')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Procesos de renderizado (por defecto: {DEFAULT_WORKERS})')
+    parser.add_argument('-q', '--queue', type=int, default=DEFAULT_QUEUE,
+                        help=f'Peticiones en espera antes de responder 503 (por defecto: {DEFAULT_QUEUE})')
+    parser.add_argument('--skip-collapsible', action='store_true', help='Omitir los bloques colapsables')
+    parser.add_argument('--skip-toc', action='store_true', help='Omitir la tabla de contenidos')
+    parser.add_argument('--draft', action='store_true',
+                        help='Vista previa rápida (pipeline.py --draft): código sin resaltar, sin colapsables ni CSS inline')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Mostrar cada renderizado')
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        print("Error: se necesita al menos un proceso de renderizado.")
+        sys.exit(1)
+
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        print("\nServidor detenido.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+search_index.py - Full-text search index over the rendered notes
+
+Builds a compact inverted index over the headings, prose and code blocks of
+every *_final.html page under a root directory (by default notes/). Terms are
+accent-folded, Spanish stopwords are dropped and a light Spanish stemmer is
+applied. Postings point to sections (the heading anchors added by the table of
+contents), so results link to the right part of a note.
+
+The index is sharded by term prefix (search/terms-<prefix>.json) so the
+browser only downloads the shards of the query terms. Updates are incremental:
+pages whose content hash did not change are not re-tokenized and only the
+shards of the affected prefixes are rewritten.
+
+Usage:
+    python search_index.py [root] [-o root/search]
+    python search_index.py [root] --query "consultas cypher"
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import hashlib
+import argparse
+import unicodedata
+from pathlib import Path
+from collections import defaultdict
+from bs4 import BeautifulSoup, NavigableString, Comment
+
+from output_utils import write_if_changed
+from split_chapters import FRAGMENT_ATTR, expand_chapters
+
+INDEX_DIRNAME = 'search'
+STATE_FILE = 'state.json'
+DOCS_FILE = 'docs.json'
+PREFIX_LENGTH = 2
+
+# Peso de cada tipo de contenido en el ranking
+HEADING_WEIGHTS = {'h1': 8, 'h2': 6, 'h3': 5, 'h4': 4, 'h5': 3, 'h6': 3}
+PROSE_WEIGHT = 2
+CODE_WEIGHT = 1
+
+SKIP_TAGS = {'script', 'style', 'textarea', 'template', 'noscript', 'svg'}
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde
+durante e el ella ellas ellos en entre era es esa esas ese eso esos esta estas este
+esto estos fue ha hay la las le les lo los mas me mi mis mucho muy nada ni no nos o
+otra otro para pero poco por porque que quien se sea ser si sin sobre son su sus tambien
+te tiene tu un una unas uno unos y ya yo the of and to in is it for on with as an be
+""".split())
+
+
+def fold(text):
+    """Lowercase and remove accents (canción -> cancion)."""
+    decomposed = unicodedata.normalize('NFD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(word):
+    """Light Spanish stemmer (plural and gender endings), mirrored in search.js."""
+    n = len(word)
+    if n < 5:
+        return word
+    last = word[-1]
+    if last in 'oae':
+        return word[:-1]
+    if last == 's':
+        if word[-2] == 'e' and word[-3] == 's' and word[-4] == 'e':
+            return word[:-2]
+        if word[-2] == 'e' and word[-3] == 'c':
+            return word[:-3] + 'z'
+        if word[-2] in 'oae':
+            return word[:-2]
+    return word
+
+
+def tokenize(text):
+    """Split text into folded, stemmed terms without stopwords."""
+    return [stem(token) for token in TOKEN_RE.findall(fold(text))
+            if token not in STOPWORDS and len(token) > 1]
+
+
+def term_prefix(term):
+    return term[:PREFIX_LENGTH]
+
+
+# --- extracción ----------------------------------------------------------------
+
+def extract_document(html):
+    """
+    Return (title, sections, terms) for a rendered page.
+
+    sections is a list of [anchor, title]; terms maps term -> {section_index: score}.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    title_block = soup.find(id='main-title-block')
+    title = (title_block.get_text(' ', strip=True) if title_block
+             else (soup.title.get_text(strip=True) if soup.title else ''))
+    sections = [['', title]]
+    terms = defaultdict(lambda: defaultdict(int))
+    body = soup.body or soup
+
+    for node in body.descendants:
+        if not isinstance(node, NavigableString) or isinstance(node, Comment):
+            continue
+        text = str(node)
+        if not text.strip():
+            continue
+
+        parents = list(node.parents)
+        # Antes que nada: un <pre> dentro de <template> (collapsible.py --defer-code) no se ve
+        if any(p.name in SKIP_TAGS or p.get('id') == 'table-of-contents' for p in parents):
+            continue
+
+        # El encabezado se busca aparte del peso: un título que empieza con <code> también abre su sección
+        heading = next((p for p in parents if p.name in HEADING_WEIGHTS), None)
+        if heading is not None:
+            weight = HEADING_WEIGHTS[heading.name]
+            if heading.get('id') and sections[-1][0] != heading['id']:
+                sections.append([heading['id'], heading.get_text(' ', strip=True)])
+        elif any(p.name in ('pre', 'code') for p in parents):
+            weight = CODE_WEIGHT
+        else:
+            weight = PROSE_WEIGHT
+
+        section = len(sections) - 1
+        for term in tokenize(text):
+            terms[term][section] += weight
+
+    return title, sections, {t: dict(s) for t, s in terms.items()}
+
+
+# --- índice ----------------------------------------------------------------------
+
+def _load_json(path, default):
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            pass
+    return default
+
+
+def _write_json(path, data):
+    """Write data as compact JSON (untouched if the content is the same); True if written."""
+    return write_if_changed(path, json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+
+
+def build_index(root, index_dir=None, verbose=True):
+    """
+    Build or incrementally update the index of the pages under root.
+
+    Returns a dict with counters: pages, updated, removed, shards_written
+    (shards whose content changed; the others keep their file and mtime).
+    """
+    root = Path(root)
+    index_dir = Path(index_dir) if index_dir else root / INDEX_DIRNAME
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    state = _load_json(index_dir / STATE_FILE, {'next_id': 0, 'docs': {}})
+    docs = state['docs']
+    pages = sorted(p for p in root.rglob('*_final.html') if index_dir not in p.parents)
+    seen = set()
+    affected = set()
+    updated = 0
+
+    for page in pages:
+        rel = os.path.relpath(page, index_dir).replace(os.sep, '/')
+        seen.add(rel)
+        data = page.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        entry = docs.get(rel)
+        if entry and entry['hash'] == digest:
+            continue
+
+        html = data.decode('utf-8', errors='replace')
+        if FRAGMENT_ATTR in html:
+            html = expand_chapters(html, page.parent)
+        title, sections, terms = extract_document(html)
+        if entry:
+            affected.update(term_prefix(t) for t in entry['terms'])
+            doc_id = entry['id']
+        else:
+            doc_id = state['next_id']
+            state['next_id'] += 1
+        affected.update(term_prefix(t) for t in terms)
+        docs[rel] = {'id': doc_id, 'hash': digest, 'title': title, 'sections': sections, 'terms': terms}
+        updated += 1
+        if verbose:
+            print(f"Indexado: {rel} ({len(terms)} términos, {len(sections)} secciones)")
+
+    removed = [rel for rel in docs if rel not in seen]
+    for rel in removed:
+        affected.update(term_prefix(t) for t in docs[rel]['terms'])
+        del docs[rel]
+
+    # Reescribir solo los shards de los prefijos afectados
+    existing_shards = {p.stem[len('terms-'):] for p in index_dir.glob('terms-*.json')}
+    shards = defaultdict(lambda: defaultdict(list))
+    for entry in docs.values():
+        for term, section_scores in entry['terms'].items():
+            prefix = term_prefix(term)
+            if prefix not in affected and prefix in existing_shards:
+                continue
+            for section, score in section_scores.items():
+                shards[prefix][term].append([entry['id'], int(section), score])
+
+    written = 0
+    for prefix in affected | (set(shards) - existing_shards):
+        shard_path = index_dir / f'terms-{prefix}.json'
+        if prefix not in shards:
+            if shard_path.exists():
+                shard_path.unlink()
+            continue
+        postings = {t: sorted(p, key=lambda x: -x[2]) for t, p in sorted(shards[prefix].items())}
+        written += _write_json(shard_path, postings)
+
+    sections_total = sum(len(e['sections']) for e in docs.values())
+    _write_json(index_dir / DOCS_FILE, {
+        'prefix_length': PREFIX_LENGTH,
+        'sections_total': sections_total,
+        'docs': {str(e['id']): {'path': rel, 'title': e['title'], 'sections': e['sections']}
+                 for rel, e in sorted(docs.items())},
+    })
+    _write_json(index_dir / STATE_FILE, state)
+    write_client(index_dir)
+
+    return {'pages': len(pages), 'updated': updated, 'removed': len(removed), 'shards_written': written}
+
+
+# --- consultas -------------------------------------------------------------------
+
+class IndexReader:
+    """Query the sharded index, loading only the shards needed (like search.js)."""
+
+    def __init__(self, index_dir):
+        self.index_dir = Path(index_dir)
+        self.meta = _load_json(self.index_dir / DOCS_FILE, {'docs': {}, 'sections_total': 0})
+        self.shards = {}
+
+    def shard(self, prefix):
+        if prefix not in self.shards:
+            self.shards[prefix] = _load_json(self.index_dir / f'terms-{prefix}.json', {})
+        return self.shards[prefix]
+
+    def search(self, query, limit=10):
+        """Return [(score, path, section_anchor, section_title, doc_title)] sorted by score."""
+        scores = defaultdict(float)
+        total = max(self.meta['sections_total'], 1)
+        for term in set(tokenize(query)):
+            postings = self.shard(term_prefix(term)).get(term, [])
+            if not postings:
+                continue
+            idf = math.log(1 + total / len(postings))
+            for doc_id, section, score in postings:
+                scores[(doc_id, section)] += score * idf
+
+        results = []
+        for (doc_id, section), score in sorted(scores.items(), key=lambda x: -x[1])[:limit]:
+            doc = self.meta['docs'][str(doc_id)]
+            anchor, section_title = doc['sections'][section]
+            results.append((score, doc['path'], anchor, section_title, doc['title']))
+        return results
+
+
+# --- cliente ---------------------------------------------------------------------
+
+SEARCH_JS = """// Generado por search_index.py - búsqueda sobre el índice por shards
+(function () {
+  var STOPWORDS = new Set(__STOPWORDS__);
+  var PREFIX = __PREFIX__;
+  var base = (document.currentScript && document.currentScript.src) ?
+    document.currentScript.src.replace(/[^/]*$/, '') : '';
+  var meta = null;
+  var shards = {};
+
+  function fold(text) {
+    return text.toLowerCase().normalize('NFD').replace(/[\\u0300-\\u036f]/g, '');
+  }
+
+  function stem(w) {
+    var n = w.length;
+    if (n < 5) return w;
+    var last = w[n - 1];
+    if (last === 'o' || last === 'a' || last === 'e') return w.slice(0, -1);
+    if (last === 's') {
+      if (w[n - 2] === 'e' && w[n - 3] === 's' && w[n - 4] === 'e') return w.slice(0, -2);
+      if (w[n - 2] === 'e' && w[n - 3] === 'c') return w.slice(0, -3) + 'z';
+      if ('oae'.indexOf(w[n - 2]) !== -1) return w.slice(0, -2);
+    }
+    return w;
+  }
+
+  function tokenize(text) {
+    return (fold(text).match(/[a-z0-9]+/g) || [])
+      .filter(function (t) { return t.length > 1 && !STOPWORDS.has(t); })
+      .map(stem);
+  }
+
+  function load(url) {
+    return fetch(base + url).then(function (r) { return r.ok ? r.json() : {}; });
+  }
+
+  function shard(prefix) {
+    if (!shards[prefix]) shards[prefix] = load('terms-' + prefix + '.json');
+    return shards[prefix];
+  }
+
+  window.searchNotes = function (query, limit) {
+    var terms = Array.from(new Set(tokenize(query)));
+    var metaPromise = meta || (meta = load('__DOCS__'));
+    return Promise.all([metaPromise].concat(terms.map(function (t) { return shard(t.slice(0, PREFIX)); })))
+      .then(function (loaded) {
+        var info = loaded[0];
+        var total = Math.max(info.sections_total, 1);
+        var scores = {};
+        terms.forEach(function (term, i) {
+          var postings = loaded[i + 1][term] || [];
+          if (!postings.length) return;
+          var idf = Math.log(1 + total / postings.length);
+          postings.forEach(function (p) {
+            var key = p[0] + ':' + p[1];
+            scores[key] = (scores[key] || 0) + p[2] * idf;
+          });
+        });
+        return Object.keys(scores).sort(function (a, b) { return scores[b] - scores[a]; })
+          .slice(0, limit || 10).map(function (key) {
+            var parts = key.split(':');
+            var doc = info.docs[parts[0]];
+            var section = doc.sections[+parts[1]];
+            return {
+              score: scores[key], title: doc.title, section: section[1],
+              url: base + doc.path + (section[0] ? '#' + section[0] : '')
+            };
+          });
+      });
+  };
+})();
+"""
+
+SEARCH_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+  <meta charset="UTF-8">
+  <meta name="viewport" content="width=device-width, initial-scale=1.0">
+  <title>Buscar en los apuntes</title>
+  <script src="search.js"></script>
+</head>
+<body style="font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; padding: 20px;">
+  <input id="q" type="search" placeholder="Buscar..." autofocus
+         style="width: 100%; padding: 10px; font-size: 1.1em; box-sizing: border-box;">
+  <ol id="results"></ol>
+  <script>
+    var timer = null;
+    document.getElementById('q').addEventListener('input', function (e) {
+      clearTimeout(timer);
+      timer = setTimeout(function () {
+        searchNotes(e.target.value, 20).then(function (results) {
+          var list = document.getElementById('results');
+          list.innerHTML = '';
+          results.forEach(function (r) {
+            var li = document.createElement('li');
+            var a = document.createElement('a');
+            a.href = r.url;
+            a.textContent = r.title + (r.section && r.section !== r.title ? ' — ' + r.section : '');
+            li.appendChild(a);
+            list.appendChild(li);
+          });
+        });
+      }, 150);
+    });
+  </script>
+</body>
+</html>
+"""
+
+
+def write_client(index_dir):
+    """Write search.js and search.html next to the index."""
+    js = (SEARCH_JS
+          .replace('__STOPWORDS__', json.dumps(sorted(STOPWORDS)))
+          .replace('__PREFIX__', str(PREFIX_LENGTH))
+          .replace('__DOCS__', DOCS_FILE))
+    for name, content in (('search.js', js), ('search.html', SEARCH_HTML)):
+        write_if_changed(Path(index_dir) / name, content)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Índice de búsqueda sobre los apuntes generados.')
+    parser.add_argument('root', nargs='?', default='notes', help='Directorio con los html_output (por defecto: notes)')
+    parser.add_argument('-o', '--output', help='Directorio del índice (por defecto: <root>/search)')
+    parser.add_argument('-q', '--query', help='Buscar en el índice existente en lugar de construirlo')
+    parser.add_argument('-n', '--limit', type=int, default=10, help='Resultados a mostrar (por defecto: 10)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"Error: El directorio '{args.root}' no existe.")
+        sys.exit(1)
+    index_dir = args.output or os.path.join(args.root, INDEX_DIRNAME)
+
+    if args.query:
+        for score, path, anchor, section, title in IndexReader(index_dir).search(args.query, args.limit):
+            location = f"{path}#{anchor}" if anchor else path
+            print(f"{score:8.1f}  {title} — {section}\n          {location}")
+        return
+
+    stats = build_index(args.root, index_dir)
+    print(f"Páginas: {stats['pages']}, actualizadas: {stats['updated']}, eliminadas: {stats['removed']}, "
+          f"shards escritos: {stats['shards_written']}")
+    print(f"Índice guardado en {index_dir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+serve.py - Local preview server for the generated html_output trees
+
+Serves the notes directory over HTTP with asyncio:
+  - strong ETags (If-None-Match -> 304) and Cache-Control (immutable for
+    content-hashed assets, no-cache for everything else)
+  - precompressed .br/.gz siblings (compress_output.py) or on-the-fly gzip
+  - live reload: pages get a small script that listens to Server-Sent Events
+    and reloads when the hash of the page changes on disk (e.g. after
+    re-running md2html.sh)
+
+Usage:
+    python serve.py [root] [-p 8000] [--host 127.0.0.1] [--no-reload]
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import asyncio
+import hashlib
+import argparse
+import mimetypes
+from pathlib import Path
+from urllib.parse import unquote, urlsplit, parse_qs, quote
+
+DEFAULT_PORT = 8000
+RELOAD_ENDPOINT = '/__livereload'
+HASHED_ASSET_RE = re.compile(r'[.-][0-9a-f]{8,}\.[A-Za-z0-9]+$|-\d+\.\d+\.\d+(\.min)?\.js$')
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+MIN_GZIP_SIZE = 1024
+KEEPALIVE_TIMEOUT = 15
+
+STATUS_TEXT = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 403: 'Forbidden',
+    404: 'Not Found', 405: 'Method Not Allowed',
+}
+
+LIVE_RELOAD_JS = """<script>
+(function () {
+  if (!window.EventSource) return;
+  var source = new EventSource('__ENDPOINT__?path=' + encodeURIComponent(location.pathname));
+  source.addEventListener('reload', function () { location.reload(); });
+})();
+</script>
+"""
+
+
+class CachedFile:
+    """Body, validators and lazily computed gzip variant of a served file."""
+
+    def __init__(self, mtime_ns, size, body):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()
+        self.etag = f'"{self.digest[:20]}"'
+        self._gzip = None
+
+    def gzip_body(self):
+        if self._gzip is None:
+            self._gzip = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self._gzip
+
+
+class NotesServer:
+    """Asyncio HTTP server for the html_output trees."""
+
+    def __init__(self, root, live_reload=True, poll_interval=0.5, verbose=False):
+        self.root = Path(root).resolve()
+        self.live_reload = live_reload
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+        self.cache = {}
+        # pagina (Path) -> conjunto de colas de clientes SSE
+        self.subscribers = {}
+        self.page_hashes = {}
+        self.requests_served = 0
+        self._watcher = None
+
+    # --- archivos ----------------------------------------------------------
+
+    def resolve_path(self, url_path):
+        """Map a URL path to a file inside the root (None if outside or missing)."""
+        relative = unquote(url_path).lstrip('/')
+        path = (self.root / relative).resolve()
+        if path != self.root and self.root not in path.parents:
+            return None
+        if path.is_dir():
+            index = path / 'index.html'
+            return index if index.is_file() else path
+        return path if path.is_file() else None
+
+    def load(self, path):
+        """Return the CachedFile for a path, reloading it when it changed on disk."""
+        stat = path.stat()
+        cached = self.cache.get(path)
+        if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+        body = path.read_bytes()
+        if self.live_reload and path.suffix == '.html':
+            body = self._inject_reload_script(body)
+        cached = CachedFile(stat.st_mtime_ns, stat.st_size, body)
+        self.cache[path] = cached
+        return cached
+
+    def _inject_reload_script(self, body):
+        script = LIVE_RELOAD_JS.replace('__ENDPOINT__', RELOAD_ENDPOINT).encode('utf-8')
+        position = body.rfind(b'</body>')
+        if position == -1:
+            return body + script
+        return body[:position] + script + body[position:]
+
+    def directory_listing(self, path):
+        """HTML index of the final pages found under a directory."""
+        pages = sorted(p.relative_to(self.root) for p in path.rglob('*_final.html'))
+        items = '\n'.join(f'<li><a href="/{quote(p.as_posix())}">{p}</a></li>' for p in pages)
+        title = path.relative_to(self.root) if path != self.root else self.root.name
+        html = (f'<!DOCTYPE html><html><head><meta charset="UTF-8"><title>{title}</title></head>'
+                f'<body><h1>{title}</h1><ul>\n{items}\n</ul></body></html>')
+        return html.encode('utf-8')
+
+    # --- HTTP --------------------------------------------------------------
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self.send(writer, 400, b'Bad Request')
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close')
+                url = urlsplit(target)
+                if url.path == RELOAD_ENDPOINT and self.live_reload:
+                    await self.handle_events(writer, parse_qs(url.query).get('path', ['/'])[0])
+                    break
+                await self.handle_request(writer, method, url.path, headers, keep_alive)
+                self.requests_served += 1
+                if self.verbose:
+                    print(f"{method} {url.path}")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, writer, method, url_path, headers, keep_alive):
+        if method not in ('GET', 'HEAD'):
+            await self.send(writer, 405, b'Method Not Allowed', keep_alive=keep_alive)
+            return
+
+        path = self.resolve_path(url_path)
+        if path is None:
+            await self.send(writer, 404, b'Not Found', keep_alive=keep_alive)
+            return
+        if path.is_dir():
+            await self.send(writer, 200, self.directory_listing(path), 'text/html; charset=utf-8',
+                            keep_alive=keep_alive)
+            return
+
+        content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/') or content_type == 'application/javascript':
+            content_type += '; charset=utf-8'
+        extra = {
+            'Cache-Control': ('public, max-age=31536000, immutable' if HASHED_ASSET_RE.search(path.name)
+                              else 'no-cache'),
+            'Vary': 'Accept-Encoding',
+        }
+
+        cached = self.load(path)
+        if path.suffix == '.html':
+            self.page_hashes.setdefault(path, cached.digest)
+
+        accepted = {e.split(';')[0].strip() for e in headers.get('accept-encoding', '').split(',')}
+        body, etag, encoding = cached.body, cached.etag, None
+        for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+            sibling = path.with_name(path.name + suffix)
+            # Solo usar la versión precomprimida si es tan reciente como el original
+            # (y si el original no fue modificado al servirlo)
+            if (name in accepted and not (self.live_reload and path.suffix == '.html')
+                    and sibling.exists() and sibling.stat().st_mtime_ns >= cached.mtime_ns):
+                compressed = self.load(sibling)
+                body, etag, encoding = compressed.body, f'"{compressed.digest[:20]}-{name}"', name
+                break
+        else:
+            if ('gzip' in accepted and cached.size >= MIN_GZIP_SIZE
+                    and content_type.startswith(COMPRESSIBLE_TYPES)):
+                body, etag, encoding = cached.gzip_body(), f'"{cached.digest[:20]}-gzip"', 'gzip'
+
+        extra['ETag'] = etag
+        if encoding:
+            extra['Content-Encoding'] = encoding
+
+        if etag in [t.strip() for t in headers.get('if-none-match', '').split(',')]:
+            await self.send(writer, 304, b'', None, extra, keep_alive=keep_alive, head_only=True)
+            return
+        await self.send(writer, 200, body, content_type, extra, keep_alive=keep_alive,
+                        head_only=(method == 'HEAD'))
+
+    async def send(self, writer, status, body, content_type='text/plain; charset=utf-8',
+                   extra_headers=None, keep_alive=False, head_only=False):
+        lines = [f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "OK")}']
+        if content_type:
+            lines.append(f'Content-Type: {content_type}')
+        lines.append(f'Content-Length: {len(body) if status != 304 else 0}')
+        lines.append(f'Connection: {"keep-alive" if keep_alive else "close"}')
+        for name, value in (extra_headers or {}).items():
+            lines.append(f'{name}: {value}')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if not head_only and status != 304:
+            writer.write(body)
+        await writer.drain()
+
+    # --- live reload -------------------------------------------------------
+
+    async def handle_events(self, writer, page_url):
+        """Keep a Server-Sent Events stream open for one page."""
+        page = self.resolve_path(page_url)
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n'
+                     b'Cache-Control: no-cache\r\nConnection: keep-alive\r\n\r\n')
+        writer.write(b'retry: 1000\n\n')
+        await writer.drain()
+        if page is None or page.is_dir():
+            return
+
+        if page not in self.page_hashes:
+            self.page_hashes[page] = self.load(page).digest
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(page, set()).add(queue)
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE_TIMEOUT)
+                    writer.write(f'event: reload\ndata: {json.dumps(event)}\n\n'.encode('utf-8'))
+                except asyncio.TimeoutError:
+                    writer.write(b': ping\n\n')
+                await writer.drain()
+        finally:
+            self.subscribers[page].discard(queue)
+
+    def check_pages(self):
+        """Notify subscribers of the pages whose content hash changed."""
+        for page, queues in list(self.subscribers.items()):
+            if not queues or not page.exists():
+                continue
+            digest = self.load(page).digest
+            if digest != self.page_hashes.get(page):
+                self.page_hashes[page] = digest
+                for queue in queues:
+                    queue.put_nowait({'path': str(page.relative_to(self.root)), 'hash': digest[:20]})
+                print(f"Recargando: {page.relative_to(self.root)}")
+
+    async def watch(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.check_pages()
+
+    # --- ciclo de vida -----------------------------------------------------
+
+    async def start(self, host='127.0.0.1', port=DEFAULT_PORT):
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+        if self.live_reload:
+            self._watcher = asyncio.ensure_future(self.watch())
+        return server
+
+    def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+
+
+async def _serve_forever(args):
+    server_state = NotesServer(args.root, live_reload=not args.no_reload, verbose=args.verbose)
+    server = await server_state.start(args.host, args.port)
+    port = server.sockets[0].getsockname()[1]
+    print(f"Sirviendo {server_state.root} en http://{args.host}:{port}/ (Ctrl+C para salir)")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local para previsualizar los html_output.')
+    parser.add_argument('root', nargs='?', default='notes', help='Directorio a servir (por defecto: notes)')
+    parser.add_argument('-p', '--port', type=int, default=DEFAULT_PORT, help=f'Puerto (por defecto: {DEFAULT_PORT})')
+    parser.add_argument('--host', default='127.0.0.1', help='Dirección (por defecto: 127.0.0.1)')
+    parser.add_argument('--no-reload', action='store_true', help='Desactivar la recarga automática')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Mostrar cada respuesta')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"Error: El directorio '{args.root}' no existe.")
+        sys.exit(1)
+
+    try:
+        asyncio.run(_serve_forever(args))
+    except KeyboardInterrupt:
+        print("\nServidor detenido.")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,9 @@ import argparse
 import re
 from collections import defaultdict
 
+import build_metrics
+from output_utils import write_if_changed
+
 HELP_TEXT = '''
 CSS Simplifier (desagrupando y fusionando reglas)
 --------------------------------------------------
@@ -59,22 +62,27 @@ def fusionar_reglas(reglas):
                     propiedades[prop] = (val, es_important)
         reglas_finales[selector] = propiedades
 
+    build_metrics.record('css_rules_before', len(reglas))
+    build_metrics.record('css_rules_after', len(reglas_finales))
+
     resultado = []
     for selector, props in reglas_finales.items():
         cuerpo = '; '.join(f"{k}: {v}" for k, (v, _) in props.items())
         resultado.append(f"{selector} {{{cuerpo};}}")
     return '\n\n'.join(resultado)
 
-def combine_styles(html_file_path, output_file_path=None):
-    with open(html_file_path, 'r', encoding='utf-8') as file:
-        html_content = file.read()
+def simplify_styles(html_content):
+    """
+    Merge the <style> blocks of an HTML document (in memory).
 
+    Returns the new document, or None when there is nothing to simplify.
+    """
     soup = BeautifulSoup(html_content, 'html.parser')
     style_blocks = soup.find_all('style')
 
     if len(style_blocks) == 0:
         print("No style blocks found.")
-        return
+        return None
 
     reglas = []
     # Bloques que se deben simplificar (NO dentro de <defs>)
@@ -90,7 +98,7 @@ def combine_styles(html_file_path, output_file_path=None):
 
     if not reglas:
         print("No simplifiable style blocks found (only defs styles?).")
-        return
+        return None
 
     css_fusionado = fusionar_reglas(reglas)
 
@@ -107,12 +115,21 @@ def combine_styles(html_file_path, output_file_path=None):
     else:
         soup.insert(0, new_style_tag)
 
+    return str(soup)
+
+def combine_styles(html_file_path, output_file_path=None):
+    with open(html_file_path, 'r', encoding='utf-8') as file:
+        html_content = file.read()
+
+    simplified = simplify_styles(html_content)
+    if simplified is None:
+        return
+
     if not output_file_path:
         file_name, file_ext = os.path.splitext(html_file_path)
         output_file_path = f"{file_name}_simplify{file_ext}"
 
-    with open(output_file_path, 'w', encoding='utf-8') as file:
-        file.write(str(soup))
+    write_if_changed(output_file_path, simplified)
 
     print(f"Style blocks successfully simplified and saved to {output_file_path}")
     return output_file_path
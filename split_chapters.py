@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+split_chapters.py - Split a final page into lazily loaded chapter fragments
+
+md2html.py groups the content of every <h2> into a <div class="chapter-container">.
+This stage keeps the title, the table of contents, everything before the first
+chapter and the first chapter in the page, and moves the body of every later
+chapter (everything after its <h2>) into a fragment file next to the page:
+
+    <name>_final.html              main page (chapter headings stay for the TOC)
+    <name>_final.chapter-02.html   body of the second chapter
+    ...
+
+A small loader fetches a chapter when its heading nears the viewport or when a
+link points to an id inside it, and inserts the fragment verbatim, so the
+document is identical to the unsplit page once every chapter is loaded.
+
+Usage:
+    python split_chapters.py page_final.html [-o output.html] [--min-chapters 3]
+"""
+
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+from bs4 import BeautifulSoup, Tag
+
+from output_utils import write_if_changed
+
+LOADER_ID = 'chapter-loader'
+FRAGMENT_ATTR = 'data-chapter-src'
+IDS_ATTR = 'data-chapter-ids'
+DEFAULT_MIN_CHAPTERS = 3
+
+CHAPTER_LOADER_JS = """(function () {
+  var loaded = {};
+
+  function placeholders() {
+    return Array.prototype.slice.call(document.querySelectorAll('[data-chapter-src]'));
+  }
+
+  function loadChapter(container) {
+    var src = container.getAttribute('data-chapter-src');
+    if (!loaded[src]) {
+      loaded[src] = fetch(src).then(function (response) {
+        if (!response.ok) throw new Error(response.status);
+        return response.text();
+      }).then(function (html) {
+        container.insertAdjacentHTML('beforeend', html);
+        container.removeAttribute('data-chapter-src');
+        // Restaurar saltos de línea de los diagramas (ver inline_css.py)
+        container.querySelectorAll('div.mermaid').forEach(function (div) {
+          div.innerHTML = div.innerHTML.replace(/#10/g, '\\n');
+        });
+        if (window.initCollapsibles) window.initCollapsibles(container);
+        if (window.observeMermaid) window.observeMermaid(container);
+      }).catch(function (err) {
+        console.error('No se pudo cargar el capítulo', src, err);
+        var link = document.createElement('a');
+        link.href = src;
+        link.textContent = 'Abrir el contenido de este capítulo';
+        container.appendChild(link);
+      });
+    }
+    return loaded[src];
+  }
+
+  function chapterFor(id) {
+    return placeholders().filter(function (container) {
+      return JSON.parse(container.getAttribute('data-chapter-ids') || '[]').indexOf(id) !== -1;
+    })[0];
+  }
+
+  function reveal(id) {
+    if (!id || document.getElementById(id)) return false;
+    var container = chapterFor(id);
+    if (!container) return false;
+    loadChapter(container).then(function () {
+      var target = document.getElementById(id);
+      if (target) target.scrollIntoView();
+    });
+    return true;
+  }
+
+  document.addEventListener('click', function (e) {
+    var link = e.target.closest && e.target.closest('a[href^="#"]');
+    if (link && reveal(decodeURIComponent(link.getAttribute('href').slice(1)))) {
+      history.pushState(null, '', link.getAttribute('href'));
+      e.preventDefault();
+    }
+  });
+
+  function start() {
+    if (location.hash) reveal(decodeURIComponent(location.hash.slice(1)));
+    var pending = placeholders();
+    if (!('IntersectionObserver' in window)) {
+      pending.forEach(loadChapter);
+      return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+      entries.forEach(function (entry) {
+        if (entry.isIntersecting) {
+          observer.unobserve(entry.target);
+          loadChapter(entry.target);
+        }
+      });
+    }, { rootMargin: '1000px 0px' });
+    pending.forEach(function (container) { observer.observe(container); });
+  }
+
+  if (document.readyState === 'loading') {
+    document.addEventListener('DOMContentLoaded', start);
+  } else {
+    start();
+  }
+})();"""
+
+
+def _chapters(soup):
+    """Top-level chapter containers (not nested in another chapter)."""
+    return [div for div in soup.find_all('div', class_='chapter-container')
+            if not div.find_parent('div', class_='chapter-container')]
+
+
+def split_chapters(input_path, output_path, min_chapters=DEFAULT_MIN_CHAPTERS):
+    """
+    Write the main page and one fragment per chapter after the first.
+
+    Returns the list of fragment paths written.
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f.read(), 'html.parser')
+
+    chapters = _chapters(soup)
+    output_path = Path(output_path)
+    fragments = []
+
+    if len(chapters) < min_chapters or soup.find(attrs={FRAGMENT_ATTR: True}):
+        print(f"Capítulos: {len(chapters)}; no se divide el documento.")
+    else:
+        for number, chapter in enumerate(chapters[1:], start=2):
+            heading = chapter.find('h2')
+            if heading is None:
+                continue
+            # Todo lo que sigue al <h2> (incluido el espacio en blanco) va al fragmento
+            moved = list(heading.next_siblings)
+            if not moved:
+                continue
+            fragment_html = ''.join(str(node) for node in moved)
+            ids = [element['id'] for node in moved if isinstance(node, Tag)
+                   for element in [node] + node.find_all(id=True) if element.get('id')]
+            for node in moved:
+                node.extract()
+
+            fragment_name = f"{output_path.stem}.chapter-{number:02d}{output_path.suffix}"
+            fragment_path = output_path.with_name(fragment_name)
+            write_if_changed(fragment_path, fragment_html)
+            fragments.append(fragment_path)
+
+            chapter[FRAGMENT_ATTR] = fragment_name
+            chapter[IDS_ATTR] = json.dumps(ids, ensure_ascii=False)
+
+        if fragments:
+            loader = soup.new_tag('script', id=LOADER_ID)
+            loader.string = CHAPTER_LOADER_JS
+            (soup.body or soup).append(loader)
+        print(f"Capítulos: {len(chapters)}; fragmentos escritos: {len(fragments)}")
+
+    write_if_changed(output_path, str(soup))
+    return fragments
+
+
+def expand_chapters(html, page_dir):
+    """
+    Return the page HTML with every chapter fragment inserted back in place.
+
+    Used by tools that need the whole document (search index, checks).
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    for container in soup.find_all(attrs={FRAGMENT_ATTR: True}):
+        fragment = Path(page_dir) / container[FRAGMENT_ATTR]
+        if fragment.exists():
+            container.append(BeautifulSoup(fragment.read_text(encoding='utf-8'), 'html.parser'))
+        del container[FRAGMENT_ATTR]
+        del container[IDS_ATTR]
+    loader = soup.find('script', id=LOADER_ID)
+    if loader:
+        loader.decompose()
+    return str(soup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Divide un HTML final en fragmentos por capítulo cargados bajo demanda.')
+    parser.add_argument('input', help='HTML final de entrada')
+    parser.add_argument('-o', '--output', help='HTML de salida (por defecto: sobrescribe la entrada)')
+    parser.add_argument('-m', '--min-chapters', type=int, default=DEFAULT_MIN_CHAPTERS,
+                        help=f'Mínimo de capítulos para dividir (por defecto: {DEFAULT_MIN_CHAPTERS})')
+    parser.add_argument('--verify', action='store_true',
+                        help='Comprobar que al reinsertar los fragmentos se obtiene el documento original')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"Error: El archivo '{args.input}' no existe.")
+        sys.exit(1)
+
+    if args.verify:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            original = str(BeautifulSoup(f.read(), 'html.parser'))
+
+    output_path = args.output or args.input
+    split_chapters(args.input, output_path, args.min_chapters)
+
+    if args.verify:
+        with open(output_path, 'r', encoding='utf-8') as f:
+            expanded = expand_chapters(f.read(), os.path.dirname(output_path) or '.')
+        if expanded != original:
+            print("✗ El documento reconstruido no coincide con el original")
+            sys.exit(1)
+        print("✓ El documento reconstruido coincide con el original")
+
+
+if __name__ == '__main__':
+    main()
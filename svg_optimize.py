@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+"""
+svg_optimize.py - Build-time optimization of the inline SVG of ```svg blocks
+
+The diagrams drawn by hand in the notes carry editor metadata, comments,
+full-precision coordinates and the same inline style on many elements.
+optimize_svg() rewrites them smaller:
+
+  - removes comments, <metadata>, editor elements and attributes (Inkscape,
+    Sodipodi, Illustrator, Sketch...) and the whitespace between elements
+  - rounds coordinates to 5 significant digits of the drawing size (the
+    width/height of the viewBox; 784 -> 2 decimals) and opacities to 3
+    decimals; transforms are kept as they are
+  - collapses redundant groups: <g> without attributes are replaced by their
+    children, and a <g> with a single child and only inherited presentation
+    attributes (or a transform) moves them to the child
+  - hoists the style="..." attributes repeated on several elements into
+    classes scoped to the drawing (.svg-<hash> .sN, in a <style> of the svg).
+    Not for pages whose styles are resolved into style attributes (the
+    static CSS mode of inline_css.py): there the classes would be written
+    back on every element, so SvgOptimizer(hoist=False) keeps the styles
+    where they are
+
+The result is only used if it renders the same: both versions are reduced to
+a normalized structure (drawn elements in order, with their geometry, their
+computed presentation properties and the transforms and group properties
+above them) and compared. If they differ, or the SVG is not well-formed XML,
+the original is kept.
+
+Results are cached by content hash, in memory and (md2html.py) in
+<output dir>/.md2html_cache/svg.json (see SvgCache). inline_svg_bytes()
+measures the SVG of a finished page (inline_css.py reports it as the
+svg_bytes{kind="final"} metric).
+
+Usage:
+    python svg_optimize.py diagrama.svg [-o diagrama.min.svg] [--no-hoist]
+
+    optimizer = SvgOptimizer(SvgCache('html_output/.md2html_cache/svg.json'))
+    markup = optimizer.optimize(markup)
+    optimizer.cache.save()
+"""
+
+import re
+import sys
+import json
+import hashlib
+import argparse
+import warnings
+from pathlib import Path
+from collections import OrderedDict
+import xml.etree.ElementTree as ET
+
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+
+import build_metrics
+from css_cascade import ElementIndex, match_selector, parse_css_rules, parse_declarations, selector_specificity
+from output_utils import write_if_changed
+
+SVG_NS = 'http://www.w3.org/2000/svg'
+XLINK_NS = 'http://www.w3.org/1999/xlink'
+XML_NS = 'http://www.w3.org/XML/1998/namespace'
+NAMESPACE_PREFIXES = {XLINK_NS: 'xlink', XML_NS: 'xml'}
+# Metadatos de editores: se eliminan los elementos y atributos de estos espacios de nombres
+EDITOR_NAMESPACES = {
+    'http://www.inkscape.org/namespaces/inkscape',
+    'http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd',
+    'http://ns.adobe.com/AdobeIllustrator/10.0/',
+    'http://ns.adobe.com/AdobeSVGViewerExtensions/3.0/',
+    'http://ns.adobe.com/Extensibility/1.0/',
+    'http://ns.adobe.com/Flows/1.0/',
+    'http://ns.adobe.com/GenericCustomNamespace/1.0/',
+    'http://ns.adobe.com/Graphs/1.0/',
+    'http://ns.adobe.com/ImageReplacement/1.0/',
+    'http://ns.adobe.com/SaveForWeb/1.0/',
+    'http://ns.adobe.com/Variables/1.0/',
+    'http://ns.adobe.com/XPath/1.0/',
+    'http://www.bohemiancoding.com/sketch/ns',
+    'http://www.serif.com/',
+    'http://www.vector.evaxdesign.sk',
+    'http://purl.org/dc/elements/1.1/',
+    'http://creativecommons.org/ns#',
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+}
+
+DEFAULT_PRECISION = 5  # dígitos significativos respecto del tamaño del dibujo
+UNIT_DECIMALS = 3      # opacidades y offsets (valores entre 0 y 1)
+CACHE_FILENAME = 'svg.json'
+CACHE_ENTRIES = 256
+SCOPE_PREFIX = 'svg-'
+
+# Cambia cuando cambia este archivo: invalida los resultados guardados
+_SOURCE_DIGEST = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:16]
+
+COORDINATE_ATTRIBUTES = {
+    'x', 'y', 'x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'r', 'rx', 'ry', 'fx', 'fy', 'dx', 'dy', 'width', 'height',
+    'd', 'points', 'viewBox', 'stroke-width', 'stroke-dasharray', 'stroke-dashoffset', 'font-size',
+    'letter-spacing', 'word-spacing', 'refX', 'refY', 'markerWidth', 'markerHeight', 'textLength',
+}
+UNIT_ATTRIBUTES = {'opacity', 'fill-opacity', 'stroke-opacity', 'stop-opacity', 'flood-opacity', 'offset'}
+# Listas de números: los espacios son solo separadores
+LIST_ATTRIBUTES = {'d', 'points', 'viewBox', 'transform', 'gradientTransform', 'patternTransform',
+                   'stroke-dasharray'}
+# El HTML pasa los nombres a minúsculas (viewBox -> viewbox)
+_ATTRIBUTE_NAMES = {name.lower(): name for name in COORDINATE_ATTRIBUTES | UNIT_ATTRIBUTES | LIST_ATTRIBUTES}
+
+INHERITED_PROPERTIES = {
+    'clip-rule', 'color', 'color-interpolation', 'color-interpolation-filters', 'color-rendering', 'cursor',
+    'direction', 'dominant-baseline', 'fill', 'fill-opacity', 'fill-rule', 'font', 'font-family', 'font-size',
+    'font-size-adjust', 'font-stretch', 'font-style', 'font-variant', 'font-weight', 'image-rendering',
+    'letter-spacing', 'marker', 'marker-end', 'marker-mid', 'marker-start', 'paint-order', 'pointer-events',
+    'shape-rendering', 'stroke', 'stroke-dasharray', 'stroke-dashoffset', 'stroke-linecap', 'stroke-linejoin',
+    'stroke-miterlimit', 'stroke-opacity', 'stroke-width', 'text-anchor', 'text-rendering', 'visibility',
+    'word-spacing', 'writing-mode',
+}
+NON_INHERITED_PROPERTIES = {
+    'alignment-baseline', 'baseline-shift', 'clip', 'clip-path', 'display', 'filter', 'flood-color',
+    'flood-opacity', 'lighting-color', 'mask', 'opacity', 'overflow', 'stop-color', 'stop-opacity',
+    'text-decoration', 'transform-origin', 'unicode-bidi', 'mix-blend-mode', 'isolation',
+}
+PRESENTATION_ATTRIBUTES = INHERITED_PROPERTIES | NON_INHERITED_PROPERTIES
+
+# Elementos cuyo texto se dibuja (o se lee): sus espacios importan
+TEXT_ELEMENTS = {'text', 'tspan', 'textPath', 'title', 'desc', 'style', 'script'}
+# Contenedores que no dibujan nada por sí mismos (en la estructura normalizada)
+CONTAINER_ELEMENTS = {'svg', 'g', 'a', 'switch'}
+IGNORED_ELEMENTS = {'metadata', 'style', 'script'}
+
+NUMBER_RE = re.compile(r'[-+]?(?:\d+\.\d*|\.\d+|\d+)(?:[eE][-+]?\d+)?')
+TRANSFORM_RE = re.compile(r'[a-zA-Z]+\s*\([^)]*\)')
+
+
+class SvgNotSupported(Exception):
+    """The markup cannot be rewritten faithfully (not XML, unknown namespaces...)."""
+
+
+def _split_name(name):
+    """'{namespace}local' -> (namespace, local); no namespace -> (None, name)."""
+    if name.startswith('{'):
+        namespace, _, local = name[1:].partition('}')
+        return namespace, local
+    return None, name
+
+
+def _decimals(root, precision):
+    """Decimals that keep precision significant digits of the drawing size."""
+    size = 0.0
+    viewbox = NUMBER_RE.findall(root.get('viewBox', ''))
+    if len(viewbox) == 4:
+        size = max(abs(float(viewbox[2])), abs(float(viewbox[3])))
+    else:
+        for name in ('width', 'height'):
+            match = NUMBER_RE.match(root.get(name, '').strip())
+            if match:
+                size = max(size, abs(float(match.group(0))))
+    digits = len(str(int(size))) if size >= 1 else 1
+    return max(0, precision - digits)
+
+
+def _format_number(value, decimals):
+    text = f'{round(value, decimals):.{decimals}f}'
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    if text in ('-0', ''):
+        text = '0'
+    # Sin el cero inicial: '0.5' -> '.5', '-0.5' -> '-.5'
+    if text.startswith('0.'):
+        text = text[1:]
+    elif text.startswith('-0.'):
+        text = '-' + text[2:]
+    return text
+
+
+def round_numbers(value, decimals):
+    """Round the decimal numbers of an attribute value (integers and numbers like '011.5' are kept)."""
+    output = []
+    last = 0
+    previous = ''  # último carácter escrito
+    for match in NUMBER_RE.finditer(value):
+        token = match.group(0)
+        between = value[last:match.start()]
+        output.append(between)
+        previous = between[-1:] or previous
+        last = match.end()
+        digits = token.lstrip('+-')
+        # Banderas de arco pegadas al número siguiente ('a1 1 0 011.5 2'): no se tocan
+        if ('.' not in token and 'e' not in token.lower()) or (len(digits) > 1 and digits[0] == '0'
+                                                              and digits[1].isdigit()):
+            number = token
+        else:
+            number = _format_number(float(token), decimals)
+            # Sin separador, un número que ahora empieza con dígito se pegaría al anterior
+            if (previous.isdigit() or previous == '.') and number[0].isdigit():
+                number = ' ' + number
+        output.append(number)
+        previous = number[-1]
+    output.append(value[last:])
+    return ''.join(output)
+
+
+def _round_attribute(name, value, decimals):
+    if name in LIST_ATTRIBUTES:
+        value = ' '.join(value.split())
+    if name in COORDINATE_ATTRIBUTES:
+        return round_numbers(value, decimals)
+    if name in UNIT_ATTRIBUTES:
+        return round_numbers(value, UNIT_DECIMALS)
+    return value
+
+
+def _compact_style(style, decimals):
+    """A style attribute as 'prop:value;...' with its numbers rounded like the attributes."""
+    parts = []
+    for prop, value, important in parse_declarations(style):
+        value = _round_attribute(prop, ' '.join(value.split()), decimals)
+        parts.append(f"{prop}:{value}{'!important' if important else ''}")
+    return ';'.join(parts)
+
+
+# --- reescritura -----------------------------------------------------------------
+
+def _clean(element, decimals, preserve=False):
+    """Remove editor metadata and insignificant whitespace, round numbers (recursively, in place)."""
+    for name in list(element.attrib):
+        namespace, local = _split_name(name)
+        if namespace in EDITOR_NAMESPACES:
+            del element.attrib[name]
+        elif namespace is not None and namespace not in NAMESPACE_PREFIXES:
+            raise SvgNotSupported(f'atributo en un espacio de nombres desconocido: {namespace}')
+        elif namespace is None and local == 'style':
+            style = _compact_style(element.attrib[name], decimals)
+            if style:
+                element.attrib[name] = style
+            else:
+                del element.attrib[name]
+        elif namespace is None:
+            element.attrib[name] = _round_attribute(local, element.attrib[name], decimals)
+
+    preserve = preserve or element.get(f'{{{XML_NS}}}space') == 'preserve'
+    keep_text = preserve or _split_name(element.tag)[1] in TEXT_ELEMENTS
+    if _split_name(element.tag)[1] == 'style' and element.text:
+        # Los espacios del CSS solo separan
+        element.text = ' '.join(element.text.split())
+    if not keep_text and element.text is not None and not element.text.strip():
+        element.text = None
+    for child in list(element):
+        if not isinstance(child.tag, str):
+            # Comentarios e instrucciones de procesamiento (si el parser los conservó)
+            _remove(element, child)
+            continue
+        namespace, local = _split_name(child.tag)
+        if namespace in EDITOR_NAMESPACES or (namespace in (SVG_NS, None) and local == 'metadata'):
+            _remove(element, child)
+            continue
+        if namespace not in (SVG_NS, None):
+            raise SvgNotSupported(f'elemento en un espacio de nombres desconocido: {namespace}')
+        _clean(child, decimals, preserve)
+        if not keep_text and child.tail is not None and not child.tail.strip():
+            child.tail = None
+
+
+def _remove(parent, child):
+    """Remove child keeping its tail text."""
+    if child.tail and child.tail.strip():
+        index = list(parent).index(child)
+        if index:
+            previous = parent[index - 1]
+            previous.tail = (previous.tail or '') + child.tail
+        else:
+            parent.text = (parent.text or '') + child.tail
+    parent.remove(child)
+
+
+def _is_group(element):
+    return _split_name(element.tag)[1] == 'g'
+
+
+def _mergeable_attributes(group):
+    """The group attributes can move to its only child: inherited presentation attributes and transform."""
+    return all(_split_name(name)[0] is None and (name in INHERITED_PROPERTIES or name == 'transform')
+               for name in group.attrib)
+
+
+def _collapse_groups(element):
+    """Unwrap groups without attributes and push the attributes of single-child groups down (in place)."""
+    index = 0
+    while index < len(element):
+        child = element[index]
+        _collapse_groups(child)
+        if not _is_group(child) or (child.text and child.text.strip()):
+            index += 1
+            continue
+        children = list(child)
+        if not children and not child.attrib:
+            _remove(element, child)
+            continue
+        if not child.attrib:
+            # <g> sin atributos: sus hijos ocupan su lugar
+            element.remove(child)
+            for offset, grandchild in enumerate(children):
+                element.insert(index + offset, grandchild)
+            if children:
+                children[-1].tail = child.tail
+            continue
+        if len(children) == 1 and _mergeable_attributes(child) and not (children[0].tail or '').strip():
+            only = children[0]
+            for name, value in child.attrib.items():
+                if name == 'transform':
+                    # La transformación del grupo se aplica antes que la del hijo
+                    own = only.get('transform')
+                    only.set('transform', f'{value} {own}' if own else value)
+                elif name not in only.attrib:
+                    # El valor propio del hijo ya ganaba al heredado
+                    only.set(name, value)
+            only.tail = child.tail
+            element.remove(child)
+            element.insert(index, only)
+            continue
+        index += 1
+
+
+def _hoist_styles(root, scope):
+    """Move the style attributes repeated on several elements to classes (.scope .sN). Returns the rules."""
+    counts = {}
+    for element in root.iter():
+        style = element.get('style')
+        if style:
+            counts[style] = counts.get(style, 0) + 1
+    rules = []
+    classes = {}
+    for style, count in counts.items():
+        if count < 2:
+            continue
+        class_name = f's{len(classes)}'
+        rule = f'.{scope} .{class_name}{{{style}}}'
+        # Cada elemento deja ' style="..."' y gana ' class="sN"' (o ' sN' si ya tenía clases)
+        saved = count * (len(style) + len(' style=""')) - count * len(f' class="{class_name}"') - len(rule)
+        if saved <= 0:
+            continue
+        classes[style] = class_name
+        rules.append(rule)
+    if not rules:
+        return []
+    for element in root.iter():
+        class_name = classes.get(element.get('style'))
+        if class_name:
+            del element.attrib['style']
+            existing = element.get('class')
+            element.set('class', f'{existing} {class_name}' if existing else class_name)
+    existing = root.get('class')
+    root.set('class', f'{existing} {scope}' if existing else scope)
+    style = ET.Element(f'{{{SVG_NS}}}style' if root.tag.startswith('{') else 'style')
+    style.text = ''.join(rules)
+    root.insert(0, style)
+    return rules
+
+
+def _escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _escape_attribute(value):
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('"', '&quot;')
+
+
+def _qualified(name, used):
+    namespace, local = _split_name(name)
+    if namespace in (None, SVG_NS):
+        return local
+    used.add(namespace)
+    return f'{NAMESPACE_PREFIXES[namespace]}:{local}'
+
+
+def _serialize(element, parts, used):
+    tag = _qualified(element.tag, used)
+    parts.append(f'<{tag}')
+    for name, value in element.attrib.items():
+        parts.append(f' {_qualified(name, used)}="{_escape_attribute(value)}"')
+    if element.text is None and not len(element):
+        parts.append('/>')
+        return
+    parts.append('>')
+    if element.text:
+        if tag == 'style' and ('<' in element.text or '&' in element.text):
+            # El CSS no se escapa: CDATA (válido en el SVG dentro del HTML)
+            parts.append(f'<![CDATA[{element.text}]]>')
+        else:
+            parts.append(_escape_text(element.text))
+    for child in element:
+        _serialize(child, parts, used)
+        if child.tail:
+            parts.append(_escape_text(child.tail))
+    parts.append(f'</{tag}>')
+
+
+def serialize(root):
+    """Compact markup of an SVG tree (svg elements without prefix, xlink:/xml: attributes)."""
+    parts = []
+    used = set()
+    _serialize(root, parts, used)
+    declarations = ''
+    if root.tag.startswith(f'{{{SVG_NS}}}'):
+        declarations += f' xmlns="{SVG_NS}"'
+    if XLINK_NS in used:
+        declarations += f' xmlns:xlink="{XLINK_NS}"'
+    # Las declaraciones van justo después del nombre del elemento raíz
+    head = parts[0]
+    parts[0] = head + declarations
+    return ''.join(parts)
+
+
+def rewrite_svg(markup, precision=DEFAULT_PRECISION, collapse=True, hoist=True):
+    """
+    The optimized markup of one SVG (without the equivalence check).
+
+    Returns (markup, decimals). Raises SvgNotSupported when the markup cannot
+    be rewritten faithfully.
+    """
+    try:
+        root = ET.fromstring(markup.strip())
+    except ET.ParseError as e:
+        raise SvgNotSupported(f'no es XML válido: {e}')
+    if _split_name(root.tag) not in ((SVG_NS, 'svg'), (None, 'svg')):
+        raise SvgNotSupported('el elemento raíz no es <svg>')
+    decimals = _decimals(root, precision)
+    _clean(root, decimals)
+    if collapse:
+        _collapse_groups(root)
+    if hoist:
+        scope = SCOPE_PREFIX + hashlib.sha256(markup.encode('utf-8')).hexdigest()[:8]
+        _hoist_styles(root, scope)
+    return serialize(root), decimals
+
+
+# --- equivalencia ----------------------------------------------------------------
+
+def _normalize_value(name, value, decimals):
+    return _round_attribute(_ATTRIBUTE_NAMES.get(name, name), ' '.join(value.split()), decimals).lower()
+
+
+def _transforms(value):
+    return [' '.join(t.split()).replace(' (', '(') for t in TRANSFORM_RE.findall(value or '')]
+
+
+def normalized_structure(markup, decimals):
+    """
+    What the SVG draws: one entry per drawn element in document order with its
+    tag, geometry attributes, computed presentation properties, the
+    transforms above and including it, the non-inherited properties of the
+    groups above it, and its text.
+    """
+    with warnings.catch_warnings():
+        # El prólogo <?xml ...?> de un archivo .svg no cambia lo que se dibuja
+        warnings.simplefilter('ignore', XMLParsedAsHTMLWarning)
+        soup = BeautifulSoup(markup, 'html.parser')
+    root = soup.find('svg')
+    if root is None:
+        return None
+
+    # Cascada: atributos de presentación < reglas del <style> del svg < atributo style
+    index = ElementIndex(root)
+    winners = {}
+    order = 0
+
+    def offer(element, key, prop, value):
+        props = winners.setdefault(id(element), {})
+        if prop not in props or key >= props[prop][0]:
+            props[prop] = (key, value)
+
+    for element in index.elements:
+        for name, value in element.attrs.items():
+            if name in PRESENTATION_ATTRIBUTES:
+                order += 1
+                offer(element, (False, 0, (-1, 0, 0), order), name, value)
+    css = '\n'.join(style.get_text() for style in root.find_all('style'))
+    for selector, declarations in parse_css_rules(css):
+        try:
+            elements = match_selector(index, selector)
+        except Exception:
+            continue
+        specificity = selector_specificity(selector)
+        for prop, value, important in declarations:
+            order += 1
+            for element in elements:
+                offer(element, (important, 0, specificity, order), prop, value)
+    for element in index.elements:
+        for prop, value, important in parse_declarations(element.get('style') or ''):
+            order += 1
+            offer(element, (important, 1, (0, 0, 0), order), prop, value)
+
+    entries = []
+
+    def walk(element, inherited, transforms, groups):
+        name = element.name
+        if name in IGNORED_ELEMENTS or ':' in name:
+            return
+        specified = {prop: _normalize_value(prop, value, decimals)
+                     for prop, (_, value) in winners.get(id(element), {}).items()}
+        computed = dict(inherited)
+        computed.update({prop: value for prop, value in specified.items() if prop in INHERITED_PROPERTIES})
+        own = {prop: value for prop, value in specified.items() if prop not in INHERITED_PROPERTIES}
+        transforms = transforms + _transforms(element.get('transform'))
+        if name in CONTAINER_ELEMENTS:
+            geometry = {attr: _normalize_value(attr, value, decimals) for attr, value in element.attrs.items()
+                        if attr in ('id', 'href', 'xlink:href') or (name == 'svg' and attr not in ('class', 'style')
+                                                                      and ':' not in attr and 'xmlns' not in attr
+                                                                      and attr not in PRESENTATION_ATTRIBUTES)}
+            if own or geometry:
+                groups = groups + ((name, tuple(sorted(own.items())), tuple(sorted(geometry.items()))),)
+            for child in element.find_all(True, recursive=False):
+                walk(child, computed, transforms, groups)
+            return
+        geometry = {attr: _normalize_value(attr, value, decimals) for attr, value in element.attrs.items()
+                    if attr not in PRESENTATION_ATTRIBUTES and attr not in ('class', 'style', 'transform')
+                    and ':' not in attr.replace('xlink:href', '')}
+        text = ' '.join(''.join(element.find_all(string=True, recursive=False)).split())
+        entries.append((name, tuple(sorted(geometry.items())), tuple(sorted(computed.items())),
+                        tuple(sorted(own.items())), tuple(transforms), groups, text))
+        for child in element.find_all(True, recursive=False):
+            walk(child, computed, transforms, groups + ((name,),))
+
+    walk(root, {}, [], ())
+    return entries
+
+
+def equivalent(original, optimized, decimals):
+    """Both markups draw the same (see normalized_structure)."""
+    before = normalized_structure(original, decimals)
+    return before is not None and before == normalized_structure(optimized, decimals)
+
+
+# --- caché -----------------------------------------------------------------------
+
+class SvgCache:
+    """Optimized SVG by hash of the source (the most recently used CACHE_ENTRIES are kept)."""
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.entries = OrderedDict()
+        self.changed = False
+        self.hits = 0
+        if self.path and self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding='utf-8'))
+                if data.get('version') == _SOURCE_DIGEST:
+                    self.entries.update(data.get('svg', {}))
+            except (OSError, ValueError):
+                pass
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > CACHE_ENTRIES:
+            self.entries.popitem(last=False)
+        self.changed = True
+
+    def save(self):
+        if self.path is None or not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_if_changed(self.path, json.dumps({'version': _SOURCE_DIGEST, 'svg': self.entries},
+                                               ensure_ascii=False))
+        self.changed = False
+
+
+class SvgOptimizer:
+    """optimize_svg with a cache by content hash and byte counters."""
+
+    def __init__(self, cache=None, precision=DEFAULT_PRECISION, hoist=True):
+        self.cache = cache if cache is not None else SvgCache()
+        self.precision = precision
+        self.hoist = hoist
+        self.settings = f'{_SOURCE_DIGEST}:{precision}:{hoist}'
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.count = 0
+
+    def optimize(self, markup):
+        key = hashlib.sha256(f'{self.settings}\n{markup}'.encode('utf-8')).hexdigest()
+        optimized = self.cache.get(key)
+        if optimized is None:
+            optimized, _ = optimize_svg(markup, self.precision, self.hoist)
+            self.cache.put(key, optimized)
+        before, after = len(markup.encode('utf-8')), len(optimized.encode('utf-8'))
+        self.count += 1
+        self.bytes_before += before
+        self.bytes_after += after
+        build_metrics.incr('svg_bytes', 'before', amount=before)
+        build_metrics.incr('svg_bytes', 'after', amount=after)
+        return optimized
+
+    def summary(self):
+        saved = self.bytes_before - self.bytes_after
+        return (f"SVG: {self.count} optimizados ({self.cache.hits} desde caché), "
+                f"{self.bytes_before} -> {self.bytes_after} bytes "
+                f"({100 * saved / max(self.bytes_before, 1):.0f}% menos)")
+
+
+def optimize_svg(markup, precision=DEFAULT_PRECISION, hoist=True):
+    """
+    Optimized markup of one SVG if it draws the same, else the original.
+
+    hoist=False never moves the repeated styles into classes (pages in the
+    static CSS mode). Returns (markup, reason); reason is None when the
+    optimized version is used, or why the original was kept.
+    """
+    # Si el resultado no es equivalente, se reintenta sin mover estilos y después sin tocar los grupos
+    attempts = ((True, True), (True, False), (False, False)) if hoist else ((True, False), (False, False))
+    for collapse, hoist_styles in attempts:
+        try:
+            optimized, decimals = rewrite_svg(markup, precision, collapse, hoist_styles)
+        except SvgNotSupported as e:
+            return markup, str(e)
+        if len(optimized) >= len(markup.strip()):
+            return markup, 'sin ahorro'
+        if equivalent(markup, optimized, decimals):
+            return optimized, None
+    print("Warning: el SVG optimizado no dibuja lo mismo que el original; se conserva el original")
+    return markup, 'no equivalente'
+
+
+_SVG_TAG_RE = re.compile(r'<(/?)svg\b[^>]*>', re.IGNORECASE)
+
+
+def inline_svg_bytes(html):
+    """UTF-8 bytes of the <svg> elements of a page (an svg nested in another counts once)."""
+    total = depth = 0
+    start = None
+    for match in _SVG_TAG_RE.finditer(html):
+        if not match.group(1):
+            if match.group(0).endswith('/>'):
+                if depth == 0:
+                    total += len(match.group(0).encode('utf-8'))
+                continue
+            if depth == 0:
+                start = match.start()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                total += len(html[start:match.end()].encode('utf-8'))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Optimiza un SVG (metadatos, precisión, grupos y estilos repetidos).')
+    parser.add_argument('input', help='Archivo SVG de entrada')
+    parser.add_argument('-o', '--output', help='Archivo de salida (por defecto: <input>.min.svg)')
+    parser.add_argument('-p', '--precision', type=int, default=DEFAULT_PRECISION,
+                        help=f'Dígitos significativos respecto del tamaño del dibujo (por defecto: {DEFAULT_PRECISION})')
+    parser.add_argument('--no-hoist', action='store_true',
+                        help='No mover los estilos repetidos a clases (páginas con el CSS resuelto en atributos style)')
+    args = parser.parse_args()
+
+    source = Path(args.input)
+    if not source.exists():
+        print(f"Error: El archivo '{args.input}' no existe.")
+        sys.exit(1)
+    markup = source.read_text(encoding='utf-8')
+    optimized, reason = optimize_svg(markup, args.precision, not args.no_hoist)
+    output = Path(args.output) if args.output else source.with_suffix('.min.svg')
+    write_if_changed(output, optimized + '\n')
+    before, after = len(markup.encode('utf-8')), len(optimized.encode('utf-8'))
+    print(f"{source}: {before} -> {after} bytes ({100 * (before - after) / max(before, 1):.0f}% menos)"
+          f"{f'; se conservó el original: {reason}' if reason else ''}")
+    print(f"✓ Se guardó correctamente el archivo: \"{output}\"")
+
+
+if __name__ == '__main__':
+    main()